@@ -1,5 +1,16 @@
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
+
+class ModelRoute(BaseModel):
+    """Rota de uma etapa das chamadas à OpenAI (ver app/services/model_router.py)"""
+    model: Optional[str] = None  # padrão: o modelo da requisição ou openai_default_model
+    temperature: Optional[float] = None  # padrão: a temperatura do prompt da etapa
+    max_tokens: Optional[int] = None
+    fallbacks: List[str] = []  # modelos tentados, em ordem, se o anterior falhar
+    timeout: Optional[float] = None  # segundos por modelo antes de passar ao próximo
+    canary_model: Optional[str] = None
+    canary_percent: float = 0.0  # % das chamadas que usam canary_model primeiro
 
 class Settings(BaseSettings):
     openai_api_key: str
@@ -8,6 +19,143 @@ class Settings(BaseSettings):
     supabase_storage_bucket: str = "audio-sessions"
     api_key: str  # API_KEY para autenticação da API
     
+    # Pool de conexões HTTP compartilhado por upstream (OpenAI e Supabase)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0  # segundos que uma conexão ociosa fica aberta
+    http_http2: bool = True  # requer o pacote h2; sem ele usa HTTP/1.1
+    http_connect_timeout: float = 10.0
+    supabase_timeout: float = 30.0  # segundos por requisição ao PostgREST
+    
+    # Métricas Prometheus em /metrics e header Server-Timing
+    metrics_enabled: bool = True
+    event_loop_lag_interval: float = 0.25  # segundos entre amostras do atraso do event loop
+    
+    # Análises da sessão: "separate" (uma chamada por campo) ou "combined" (uma chamada estruturada)
+    openai_analysis_mode: str = "separate"
+    openai_combined_model: str = "gpt-4o"  # precisa suportar structured outputs (json_schema)
+    
+    # Modelo e parâmetros por etapa (operation das métricas), em JSON. Ex:
+    # OPENAI_MODEL_ROUTES='{"patient_demand": {"model": "gpt-4o-mini", "fallbacks": ["gpt-4"]},
+    #   "ia_analysis": {"model": "gpt-4", "canary_model": "gpt-4o", "canary_percent": 10}}'
+    openai_default_model: str = "gpt-4"
+    openai_model_routes: Dict[str, ModelRoute] = {}
+    
+    # Templates de prompt (app/prompts.py): versão por etapa, em JSON (padrão: a mais recente).
+    # Ex: PROMPT_VERSIONS='{"conclusion": 1}'
+    prompt_versions: Dict[str, int] = {}
+    openai_prompt_cache_key: bool = True  # envia prompt_cache_key (template e versão) à OpenAI
+    
+    # Agendador das chamadas assíncronas à OpenAI: concorrência adaptativa por modelo,
+    # orçamento pelos headers x-ratelimit-* e retentativas com backoff e Retry-After
+    openai_scheduler_enabled: bool = True
+    openai_max_concurrency: int = 8  # teto de chamadas simultâneas por modelo
+    openai_max_retries: int = 5
+    openai_retry_base_delay: float = 1.0  # segundos
+    openai_retry_max_delay: float = 60.0  # segundos
+    
+    # Transcrições que não cabem no contexto do modelo são resumidas por trechos (map-reduce)
+    openai_output_reserve_tokens: int = 2000  # tokens reservados para a resposta
+    openai_map_chunk_tokens: int = 3000  # teto de tokens por trecho; o modelo pode exigir menos
+    openai_map_model: Optional[str] = None  # modelo dos resumos por trecho (padrão: o da análise)
+    openai_max_reduce_rounds: int = 3
+    
+    # Conclusão da sessão: "compact" usa as análises salvas e trechos da transcrição escolhidos
+    # por busca local (BM25) com as perguntas e respostas; "full" envia a transcrição inteira
+    conclusion_mode: str = "compact"
+    conclusion_max_input_tokens: int = 6000  # teto de tokens do prompt no modo compact
+    conclusion_excerpt_tokens: int = 200  # tamanho dos trechos indexados
+    
+    # Execução concorrente das análises da sessão (process_session)
+    openai_concurrent_analyses: bool = True
+    openai_analysis_max_workers: int = 5
+    openai_analysis_timeout: float = 300.0  # segundos por análise, contados a partir do início de cada uma
+    
+    # Upload de áudio (copiado em blocos para disco, sem carregar o arquivo inteiro em memória)
+    max_upload_mb: int = 500
+    upload_chunk_size: int = 1024 * 1024  # bytes
+    
+    # Pré-processamento do áudio antes da transcrição (requer ffmpeg com libopus): mono,
+    # 16 kHz, sem o silêncio do começo e do fim e recodificado em Opus
+    audio_preprocessing_enabled: bool = True
+    audio_preprocess_sample_rate: int = 16000
+    audio_preprocess_bitrate: str = "24k"  # Opus em modo voz
+    audio_preprocess_silence_db: float = -50.0
+    audio_preprocess_min_silence: float = 1.0  # silêncios de borda mais curtos são mantidos
+    audio_preprocess_padding: float = 0.3  # silêncio mantido em volta da fala, em segundos
+    audio_preprocess_workers: int = 0  # conversões simultâneas (0: núcleos disponíveis)
+
+    # Motor de transcrição: "openai" (whisper-1) ou "local" (faster-whisper na CPU, requer o
+    # pacote faster-whisper). Também pode ser escolhido por requisição (campo transcription_backend)
+    transcription_backend: str = "openai"
+    transcription_local_enabled: bool = False  # carrega o motor local mesmo quando não é o padrão
+    local_whisper_model: str = "small"  # tiny, base, small, medium, large-v3 ou diretório de um modelo
+    local_whisper_compute_type: str = "int8"  # quantização do CTranslate2
+    local_whisper_cpu_threads: int = 4  # threads por processo
+    local_whisper_workers: int = 0  # processos do pool (0: núcleos disponíveis / local_whisper_cpu_threads)
+    local_whisper_beam_size: int = 5
+    local_whisper_vad_filter: bool = True  # pula trechos sem fala
+    local_whisper_preload: bool = True  # carrega o modelo em todos os processos no startup
+    local_whisper_download_root: Optional[str] = None  # cache dos modelos baixados (padrão do Hugging Face)
+
+    # Transcrição em trechos paralelos para áudios longos (requer ffmpeg)
+    transcription_chunking_enabled: bool = True
+    transcription_chunk_seconds: float = 600.0  # tamanho alvo de cada trecho
+    transcription_chunk_overlap: float = 2.0  # sobreposição entre trechos, em segundos
+    transcription_max_concurrency: int = 4
+    transcription_max_file_mb: float = 24.0  # acima disso sempre divide (limite do Whisper: 25 MB)
+    transcription_silence_db: float = -35.0
+    transcription_min_silence: float = 0.5  # duração mínima de um silêncio usado como corte
+
+    # Transcrição ao vivo (WebSocket /sessions/{id}/stream): o áudio PCM é cortado na primeira
+    # pausa após live_segment_min_seconds (ou em live_segment_max_seconds) e transcrito na hora
+    live_segment_min_seconds: float = 20.0
+    live_segment_max_seconds: float = 90.0
+    live_silence_db: float = -40.0  # nível abaixo do qual uma janela de 100 ms é silêncio
+    live_min_silence: float = 0.7  # duração mínima da pausa usada como corte, em segundos
+    # Limites por stream: acima deles a conexão é encerrada com 1008 (o que já chegou é processado)
+    live_max_pending_segments: int = 8  # segmentos recebidos e ainda não transcritos
+    live_max_message_mb: float = 16.0  # mensagem com um arquivo completo (o uvicorn também corta em 16 MB)
+    live_max_pcm_message_kb: int = 64  # mensagem PCM (um bloco de áudio; 64 KB = 2 s a 16 kHz)
+    
+    # Anonimização da transcrição: "local" (nomes conhecidos + NER opcional) ou "llm" (GPT-4)
+    anonymization_mode: str = "local"
+    anonymization_llm_fallback: bool = False  # usa o GPT-4 se a anonimização local falhar
+    anonymization_ner_enabled: bool = False  # requer spaCy e o modelo abaixo instalados
+    anonymization_ner_model: str = "pt_core_news_sm"
+    
+    # Cache em memória de pacientes e psicólogos lidos do Supabase (0 desativa)
+    entity_cache_ttl: int = 300  # segundos
+    entity_cache_max_mb: int = 16
+    
+    # Paginação das listagens (GET /sessions/, /patients/, /psychologists/)
+    list_default_limit: int = 50
+    list_max_limit: int = 200
+    
+    # Busca textual nas sessões (GET /sessions/search); cada item gera trechos destacados
+    search_default_limit: int = 20
+    search_max_limit: int = 50
+    
+    # Cache de transcrições e respostas da OpenAI: "memory", "disk", "supabase" ou "none"
+    cache_backend: str = "memory"
+    cache_ttl: int = 7 * 24 * 3600  # segundos
+    cache_memory_max_mb: int = 256
+    cache_dir: str = ".cache/psiapi"
+    cache_supabase_table: str = "llm_cache"
+    
+    # Processamento assíncrono de sessões (POST /sessions/ com async_processing)
+    session_job_workers: int = 4
+    session_job_ttl: int = 3600  # segundos que o status de um job finalizado fica disponível
+    session_job_dir: Optional[str] = None  # diretório temporário dos áudios enviados (padrão do sistema)
+    
+    # Lotes de sessões (POST /sessions/batch): "openai" usa a Batch API; "local" faz chamadas
+    # normais com o mesmo fluxo (testes e desenvolvimento)
+    openai_batch_backend: str = "openai"
+    openai_batch_poll_interval: float = 30.0  # segundos entre consultas ao lote
+    openai_batch_completion_window: str = "24h"
+    session_batch_max_items: int = 100
+    session_batch_concurrency: int = 4  # áudios baixados/transcritos simultaneamente
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -0,0 +1,31 @@
+from fastapi import Depends
+from starlette.requests import HTTPConnection
+from app.services.audio_service import AudioService
+from app.services.batch_service import SessionBatchService
+from app.services.container import ServiceContainer
+from app.services.job_service import JobService
+from app.services.openai_service import OpenAIService
+from app.services.pipeline_service import SessionPipeline
+from app.services.supabase_service import SupabaseService
+
+def get_services(connection: HTTPConnection) -> ServiceContainer:
+    """Container criado no startup da aplicação (ver app/main.py), em requisições e WebSockets"""
+    return connection.app.state.services
+
+def get_supabase_service(services: ServiceContainer = Depends(get_services)) -> SupabaseService:
+    return services.supabase_service
+
+def get_openai_service(services: ServiceContainer = Depends(get_services)) -> OpenAIService:
+    return services.openai_service
+
+def get_audio_service(services: ServiceContainer = Depends(get_services)) -> AudioService:
+    return services.audio_service
+
+def get_session_pipeline(services: ServiceContainer = Depends(get_services)) -> SessionPipeline:
+    return services.session_pipeline
+
+def get_job_service(services: ServiceContainer = Depends(get_services)) -> JobService:
+    return services.job_service
+
+def get_batch_service(services: ServiceContainer = Depends(get_services)) -> SessionBatchService:
+    return services.batch_service
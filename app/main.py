@@ -1,15 +1,41 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.config import settings
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.upload_limit import MaxUploadSizeMiddleware
 from app.routes import sessions, psychologists, patients
+from app.services.container import ServiceContainer
+from app.utils.metrics import monitor_event_loop_lag
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serviços e pools de conexões compartilhados por todas as rotas
+    app.state.services = ServiceContainer()
+    lag_monitor = (
+        asyncio.create_task(monitor_event_loop_lag(settings.event_loop_lag_interval))
+        if settings.metrics_enabled else None
+    )
+    try:
+        yield
+    finally:
+        if lag_monitor:
+            lag_monitor.cancel()
+            with suppress(asyncio.CancelledError):
+                await lag_monitor
+        await app.state.services.aclose()
+
 app = FastAPI(
     title="PSI AI API",
     description="API para processamento de sessões de psicoterapia com IA",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -20,6 +46,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Limita o tamanho do corpo enquanto ele é recebido (uploads de áudio). Um lote pode ter
+# até `session_batch_max_items` arquivos do tamanho máximo (mais 1 MB para os demais campos)
+app.add_middleware(
+    MaxUploadSizeMiddleware,
+    max_bytes=settings.max_upload_mb * 1024 * 1024,
+    path_limits={"/sessions/batch": (settings.max_upload_mb * settings.session_batch_max_items + 1) * 1024 * 1024}
+)
+
+# Métricas Prometheus e header Server-Timing (mais externo, mede também os outros middlewares)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(sessions.router)
 app.include_router(psychologists.router)
 app.include_router(patients.router)
@@ -36,3 +74,9 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas no formato de texto do Prometheus"""
+    if not settings.metrics_enabled:
+        return Response(status_code=404)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
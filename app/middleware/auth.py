@@ -1,6 +1,7 @@
-from fastapi import HTTPException, Security
+from fastapi import HTTPException, Query, Security, WebSocket, WebSocketException, status
 from fastapi.security import APIKeyHeader
 from app.config import settings
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,3 +29,17 @@ async def verify_api_key(api_key: str = Security(api_key_header)):
         )
     
     return api_key
+
+async def verify_websocket_api_key(
+    websocket: WebSocket,
+    api_key: Optional[str] = Query(None, description="Alternativa ao header X-API-Key (navegadores não enviam headers no WebSocket)")
+):
+    """
+    Verifica a API_KEY de uma conexão WebSocket, enviada no header 'X-API-Key'
+    ou no parâmetro de query 'api_key'. Fecha a conexão com o código 1008 se inválida.
+    """
+    api_key = websocket.headers.get("X-API-Key") or api_key
+    if api_key != settings.api_key:
+        logger.warning("Tentativa de conexão WebSocket sem API_KEY válida")
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="API_KEY ausente ou inválida")
+    return api_key
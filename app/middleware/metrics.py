@@ -0,0 +1,56 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils import metrics
+from typing import Any, Dict
+import time
+
+class MetricsMiddleware:
+    """Mede cada requisição HTTP e envia os tempos no header Server-Timing
+
+    Os tempos vêm das etapas do processamento, das chamadas à OpenAI e das consultas
+    ao Supabase feitas durante a requisição (ver app/utils/metrics.py); chamadas
+    simultâneas contam uma vez só. Em respostas
+    em stream o header só inclui o que aconteceu antes do primeiro byte.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_paths: Dict[Any, str] = {}
+
+    def _route(self, scope: Scope) -> str:
+        """Caminho com parâmetros da rota (ex: /sessions/{session_id}) para limitar os rótulos"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self._route_paths:
+            paths = [route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint]
+            self._route_paths[endpoint] = paths[0] if paths else getattr(endpoint, "__name__", "unknown")
+        return self._route_paths[endpoint]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        in_progress = metrics.HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        timings = metrics.start_server_timing()
+        started_at = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", metrics.server_timing_header(timings, time.perf_counter() - started_at))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            in_progress.dec()
+            metrics.HTTP_REQUEST_SECONDS.labels(method, self._route(scope), str(status_code)).observe(
+                time.perf_counter() - started_at
+            )
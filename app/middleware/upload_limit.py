@@ -0,0 +1,52 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MaxUploadSizeMiddleware:
+    """Rejeita com 413 corpos de requisição maiores que `max_bytes`
+    
+    Verifica o Content-Length antes de ler o corpo e conta os bytes recebidos enquanto
+    o corpo é transmitido, interrompendo o upload assim que o limite é ultrapassado.
+    `path_limits` define outro limite para rotas que recebem vários arquivos (ex: lotes),
+    que continuam verificando o tamanho de cada arquivo ao salvá-lo.
+    """
+    
+    def __init__(self, app: ASGIApp, max_bytes: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+    
+    def _detail(self, max_bytes: int) -> str:
+        return f"Arquivo excede o tamanho máximo permitido de {max_bytes // (1024 * 1024)} MB"
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+        
+        max_bytes = self.path_limits.get(scope["path"].rstrip("/"), self.max_bytes)
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            logger.warning(f"Upload rejeitado: Content-Length {int(content_length)} acima do limite")
+            response = JSONResponse(status_code=413, content={"detail": self._detail(max_bytes)})
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # HTTPException é repassada pelo FastAPI durante a leitura do formulário
+                    raise HTTPException(status_code=413, detail=self._detail(max_bytes))
+            return message
+        
+        await self.app(scope, limited_receive, send)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional, Union
 from datetime import datetime
 from uuid import UUID
 
@@ -15,3 +15,13 @@ class PatientResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class PatientPartial(BaseModel):
+    """PatientResponse com todos os campos opcionais, para listas com `fields=`"""
+    id: Optional[UUID] = None
+    name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class PatientPage(BaseModel):
+    items: List[Union[PatientResponse, PatientPartial]]
+    next_cursor: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional, Union
 from datetime import datetime
 from uuid import UUID
 
@@ -17,3 +17,14 @@ class PsychologistResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class PsychologistPartial(BaseModel):
+    """PsychologistResponse com todos os campos opcionais, para listas com `fields=`"""
+    id: Optional[UUID] = None
+    name: Optional[str] = None
+    email: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class PsychologistPage(BaseModel):
+    items: List[Union[PsychologistResponse, PsychologistPartial]]
+    next_cursor: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Optional, List, Dict, Union
 from datetime import datetime
 from uuid import UUID
 
@@ -39,3 +39,79 @@ class SessionUpdate(BaseModel):
     answers: Optional[List[str]] = None
     conclusion: Optional[str] = None
 
+
+class SessionJobResponse(BaseModel):
+    job_id: str
+    session_id: UUID
+    status: str
+    status_url: str
+
+class SessionLiveResponse(BaseModel):
+    session_id: UUID
+    stream_url: str
+
+class SessionStageStatus(BaseModel):
+    status: str
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class SessionStatusResponse(BaseModel):
+    session_id: UUID
+    job_id: Optional[str] = None
+    status: str
+    stages: Dict[str, SessionStageStatus]
+    error: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+class SessionBatchResponse(BaseModel):
+    batch_id: str
+    session_ids: List[UUID]
+    status: str
+    status_url: str
+
+class SessionBatchItemStatus(BaseModel):
+    status: str
+    error: Optional[str] = None
+
+class SessionBatchStatusResponse(BaseModel):
+    batch_id: str
+    status: str
+    stages: Dict[str, SessionStageStatus]
+    items: Dict[str, SessionBatchItemStatus]
+    error: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+class SessionPartial(BaseModel):
+    """SessionResponse com todos os campos opcionais, para listas com `fields=`"""
+    id: Optional[UUID] = None
+    psychologist_id: Optional[UUID] = None
+    patient_id: Optional[UUID] = None
+    audio_url: Optional[str] = None
+    transcription: Optional[str] = None
+    full_summary: Optional[str] = None
+    anonymous_summary: Optional[str] = None
+    patient_demand: Optional[str] = None
+    context: Optional[str] = None
+    analise_da_ia: Optional[str] = None
+    questions: Optional[List[str]] = None
+    answers: Optional[List[str]] = None
+    conclusion: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class SessionPage(BaseModel):
+    items: List[Union[SessionResponse, SessionPartial]]
+    next_cursor: Optional[str] = None
+
+class SessionSearchResult(BaseModel):
+    id: UUID
+    psychologist_id: UUID
+    patient_id: UUID
+    created_at: datetime
+    rank: float
+    # Campo (full_summary, context, transcription) -> trechos com os termos em <mark>
+    highlights: Dict[str, str]
+
+class SessionSearchPage(BaseModel):
+    items: List[SessionSearchResult]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,363 @@
+# Templates versionados dos prompts enviados à OpenAI
+#
+# Cada template separa o conteúdo fixo (mensagem de sistema e instruções) dos dados da
+# chamada (transcrição, nomes, análises), que ficam sempre no final da mensagem do usuário.
+# Assim chamadas da mesma etapa começam com o mesmo prefixo, que a OpenAI reaproveita do
+# cache de prompts (prefixos a partir de 1024 tokens) com menor latência e preço de entrada.
+# Alterar o texto fixo de um template exige registrá-lo com uma nova versão.
+from app.config import settings
+from typing import Any, Dict, List
+
+class PromptTemplate:
+    """Prompt de uma etapa: `system` e `instructions` fixos, `tail` com os campos da chamada
+
+    `instructions` é usado como está (chaves literais são permitidas); apenas `tail` passa
+    por str.format com os valores de render.
+    """
+
+    def __init__(self, name: str, version: int, system: str, instructions: str, tail: str):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.instructions = instructions
+        self.tail = tail
+
+    @property
+    def cache_key(self) -> str:
+        """Valor de `prompt_cache_key`: agrupa no mesmo servidor as chamadas com o mesmo prefixo"""
+        return f"psiapi-{self.name}-v{self.version}"
+
+    def render(self, **values: Any) -> List[Dict[str, str]]:
+        """Mensagens do chat: prefixo fixo primeiro, dados da chamada no final"""
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": f"{self.instructions}\n\n{self.tail.format(**values)}"}
+        ]
+
+PROMPTS: Dict[str, Dict[int, PromptTemplate]] = {}
+
+def register_prompt(template: PromptTemplate) -> PromptTemplate:
+    versions = PROMPTS.setdefault(template.name, {})
+    if template.version in versions:
+        raise ValueError(f"Prompt {template.name} v{template.version} já registrado")
+    versions[template.version] = template
+    return template
+
+def get_prompt(name: str) -> PromptTemplate:
+    """Versão do template fixada em `prompt_versions` ou, sem ela, a mais recente"""
+    versions = PROMPTS[name]
+    version = settings.prompt_versions.get(name)
+    if version is None:
+        return versions[max(versions)]
+    if version not in versions:
+        raise ValueError(f"Versão {version} do prompt {name} não existe (disponíveis: {sorted(versions)})")
+    return versions[version]
+
+# Persona e contexto do sistema da análise FAP
+FAP_SYSTEM_MESSAGE = """Persona: Você é um(a) supervisor(a) clínico(a) sênior, especialista em Psicoterapia Analítica Funcional (FAP), cujo conhecimento e prática são estritamente baseados na metodologia, princípios e linguagem apresentados no livro "FAP Descomplicada" (cujo conteúdo relevante foi fornecido anteriormente). Seu papel é me orientar na elaboração de evoluções de caso FAP que sejam clinicamente úteis, concisas e funcionalmente precisas, refletindo a aplicação prática da teoria do livro.
+
+Contexto Teórico e Estrutura de Conhecimento (Baseado em "FAP Descomplicada"):
+
+Sua análise e orientação devem derivar exclusivamente das seguintes informações e estruturas conceituais extraídas do livro "FAP Descomplicada":
+
+Objetivo Central: Ajudar o terapeuta a ser consciente, corajoso e habilidoso na interação momento a momento com o cliente, utilizando a relação terapêutica como veículo principal para a mudança comportamental, fundamentado na análise funcional e na Ciência Comportamental Contextual (CBS).
+
+Base Teórica: Behaviorismo Radical, Análise do Comportamento, com forte ênfase na Ciência Comportamental Contextual (CBS), vendo o comportamento como aprendido e funcionalmente determinado pelo contexto (histórico e presente).
+
+Estrutura do Livro: Organizado em Teoria (Parte 1: Ideias - Caps 1-5) e Prática (Parte 2: A Prática - Caps 6-13), com foco na aplicação clínica dos princípios.
+
+Conceitos Teóricos Essenciais (a aplicar):
+
+Análise Funcional: Aplicada primordialmente à relação terapêutica in vivo para entender a função dos comportamentos (antecedentes, respostas, consequências na interação).
+
+Comportamentos Clinicamente Relevantes (CCRs):
+- CCR1: Comportamentos-problema do cliente que ocorrem em sessão, funcionalmente ligados aos problemas fora dela.
+- CCR2: Comportamentos de melhora/progresso do cliente em sessão.
+- Classes Funcionais (FIAT adaptado): Identificar CCRs relacionados à Asserção de Necessidades (A), Comunicação Bidirecional (B), Conflito (C), Autorrevelação/Proximidade (D).
+
+Comportamentos do Terapeuta:
+- T1: Comportamentos do terapeuta que interferem no progresso.
+- T2: Comportamentos do terapeuta que facilitam o progresso (incluindo aplicação habilidosa das 5 regras).
+
+Modelo Consciência, Coragem e Amor (ACL): Usar como ferramenta de análise funcional da conexão social e guia para a postura terapêutica (avaliar/promover esses aspectos na interação).
+
+As 5 Regras da FAP: Aplicar como guia do processo terapêutico momento a momento: 1. Observar CCRs; 2. Evocar CCRs; 3. Reforçar CCR2; 4. Observar o efeito; 5. Generalizar.
+
+Princípios da CBS: Aplicar conceitos como comportamento aprendido, função do comportamento (apetitivo/aversivo), reforçamento/punição, flexibilidade psicológica (vs. rigidez por regras/história), e o papel da linguagem (RFT brevemente).
+
+Instruções Essenciais de Execução:
+- Pergunte Sempre que Necessário: Se informações cruciais para realizar uma análise FAP robusta estiverem faltando ou ambíguas, interrompa a geração da evolução e faça perguntas claras e direcionadas. Não preencha lacunas com suposições.
+- Exclusividade FAP (Livro): Sua base de conhecimento e análise é unicamente o conteúdo e a metodologia do livro "FAP Descomplicada" fornecido. Não introduza conceitos ou técnicas de outras abordagens terapêuticas.
+- Linguagem FAP (Livro): Utilize consistentemente a terminologia técnica da FAP (CCR1, CCR2, T1, T2, 5 Regras, ACL, Análise Funcional, Evocar, Reforçar, Generalizar, etc.) conforme definida e utilizada no livro.
+- Foco Funcional e Relacional: Mantenha o foco na função do comportamento dentro da interação terapêutica. A relação terapêutica é o principal motor da mudança.
+- Concisão e Precisão Funcional: Seja sucinto, mas garanta que a análise funcional FAP seja o núcleo da evolução, não apenas uma descrição superficial."""
+
+# Formato da evolução FAP (usado na análise da IA e no modo combinado)
+FAP_EVOLUTION_FORMAT = """FORMATO DA EVOLUÇÃO FAP:
+
+1. Resumo da Sessão:
+Gere um breve resumo (2-3 frases) dos principais eventos e processos FAP da sessão.
+
+2. Demanda Trazida e Contexto Inicial:
+- Relatos do paciente (eventos privados, comportamentos observáveis fora da sessão, objetivos para a sessão).
+- Identifique Antecedentes (A) relevantes para os comportamentos relatados fora da sessão.
+- Análise FAP Inicial: Com base na demanda e na conceituação de caso FAP (se disponível), aponte possíveis CCR1s que podem estar funcionalmente relacionados.
+
+3. Intervenção Clínica (FAP in vivo):
+- Descreva as ações específicas do terapeuta (perguntas, observações, evocações, reforçamentos, uso de exercícios, etc.).
+- Análise Funcional da Intervenção (FAP): Justifique CADA ação principal do terapeuta usando a FAP:
+  * Qual(is) das 5 Regras da FAP está(ão) sendo aplicada(s)?
+  * Como a intervenção visa observar/evocar/reforçar um CCR específico?
+  * Análise ACL: A ação promove Consciência, Coragem ou Amor? É uma resposta de Amor a uma Coragem do cliente?
+  * Classifique a intervenção como potencial T1 ou T2 e justifique funcionalmente.
+
+4. Resposta do Paciente (Observação de CCRs - Regra 1):
+- Descreva as reações observáveis (comportamento motor, expressões) e os relatos verbais do paciente à intervenção. Diferencie claramente.
+- Análise FAP da Resposta: Identifique explicitamente os comportamentos do paciente como potenciais CCR1s ou CCR2s ocorrendo em resposta à intervenção. Explique a função (o que o comportamento busca obter ou evitar naquele momento da interação).
+- Análise ACL: A resposta demonstrou Consciência, Coragem, Amor (ou dificuldades nessas áreas)?
+
+5. Análise Funcional ABC Principal da Interação:
+Sintetize a principal contingência de três termos (A-B-C) observada durante a interação terapêutica chave da sessão.
+- A (Antecedente): Qual ação do terapeuta (T2 ou T1) ou evento imediato precedeu o CCR principal?
+- B (Behavior/Comportamento): Qual foi o CCR1 ou CCR2 mais significativo do paciente observado em resposta a A?
+- C (Consequência): Qual foi a resposta imediata do terapeuta (potencialmente reforçadora - Regra 3/T2, ou não - T1) e/ou o efeito observado no paciente (Regra 4)?
+
+IMPORTANTE: Se as informações fornecidas não permitirem identificar claramente A, B ou C para esta análise, você DEVE fazer perguntas específicas para obter os detalhes necessários ANTES de tentar completar esta seção ou fazer suposições.
+
+6. Planejamento (Próxima Sessão e Generalização - Regra 5):
+- Objetivos FAP específicos para a próxima sessão (Ex: focar em evocar CCR2 de assertividade, observar T1 específico).
+- Tarefas de casa (se houver) explicitamente ligadas à prática de CCR2s em contextos externos relevantes (generalização). Descreva a tarefa e sua justificativa funcional FAP, baseando-se nos princípios do Cap. 12 do livro.
+- Ações futuras do terapeuta ou ajustes nas estratégias FAP (Ex: variar forma de reforçar, usar exercício específico).
+
+7. Correlação com Sessão Anterior (Opcional):
+Breve comparação FAP (progresso em CCR2s específicos, mudanças na frequência de CCR1s, evolução na aplicação das regras, T1s/T2s recorrentes). Adicionar apenas se informações da sessão anterior forem fornecidas."""
+
+# Mensagens de sistema compartilhadas por mais de um template
+ANALYSIS_SYSTEM_MESSAGE = "Você é um assistente especializado em análise de sessões de psicoterapia."
+CONCLUSION_SYSTEM_MESSAGE = "Você é um assistente especializado em análise FAP de sessões de psicoterapia. Você elabora conclusões detalhadas seguindo rigorosamente a metodologia FAP, usando apenas 'Paciente' e 'você' para se referir às pessoas. NUNCA use nomes próprios ou identificadores pessoais."
+
+register_prompt(PromptTemplate(
+    name="full_summary",
+    version=1,
+    system=ANALYSIS_SYSTEM_MESSAGE,
+    instructions="Analise a transcrição de uma sessão de psicoterapia apresentada ao final e gere um resumo completo e detalhado.",
+    tail="""Transcrição:
+{transcription}
+
+Resumo completo:"""
+))
+
+register_prompt(PromptTemplate(
+    name="anonymous_summary",
+    version=1,
+    system="Você é um assistente especializado em anonimização de dados clínicos, garantindo privacidade e conformidade ética.",
+    instructions="""Analise a transcrição de uma sessão de psicoterapia apresentada ao final e gere um resumo anonimizado que:
+1. Remova todos os nomes próprios
+2. Remova dados pessoais identificáveis (endereços, telefones, etc.)
+3. Seja mais superficial e genérico
+4. Pode ser compartilhado com outros profissionais sem expor o paciente
+5. Mantenha apenas informações clínicas relevantes de forma genérica""",
+    tail="""Transcrição:
+{transcription}
+
+Resumo anonimizado:"""
+))
+
+register_prompt(PromptTemplate(
+    name="patient_demand",
+    version=1,
+    system="Você é um assistente especializado em identificar demandas e necessidades em sessões de psicoterapia.",
+    instructions="Analise a transcrição de uma sessão de psicoterapia apresentada ao final e identifique qual foi a demanda principal trazida pelo paciente nesta sessão.",
+    tail="""Transcrição:
+{transcription}
+
+Demanda do paciente:"""
+))
+
+register_prompt(PromptTemplate(
+    name="context",
+    version=1,
+    system="Você é um assistente especializado em análise contextual de sessões de psicoterapia.",
+    instructions="""Analise a transcrição de uma sessão de psicoterapia apresentada ao final e gere um resumo do contexto da sessão, incluindo:
+- Situação atual do paciente
+- Temas principais discutidos
+- Dinâmica da sessão
+- Observações relevantes""",
+    tail="""Transcrição:
+{transcription}
+
+Contexto:"""
+))
+
+register_prompt(PromptTemplate(
+    name="ia_analysis",
+    version=1,
+    system=FAP_SYSTEM_MESSAGE,
+    instructions=f"""Analise a transcrição de uma sessão de psicoterapia apresentada ao final e gere uma evolução FAP completa seguindo rigorosamente o formato abaixo, aplicando o conhecimento do livro "FAP Descomplicada" para uma análise funcional precisa e clinicamente útil.
+
+{FAP_EVOLUTION_FORMAT}""",
+    tail="""TRANSCRIÇÃO DA SESSÃO:
+{transcription}"""
+))
+
+register_prompt(PromptTemplate(
+    name="anonymize_names",
+    version=1,
+    system="Você é um assistente especializado em anonimização de transcrições, substituindo nomes por letras.",
+    instructions="""Analise a transcrição de uma sessão de psicoterapia apresentada ao final e substitua todos os nomes próprios de pessoas por letras do alfabeto.
+
+Regras:
+- O nome do paciente (informado ao final) deve ser substituído pela primeira letra do nome (ex: Pedro -> P, Rafael -> R, Maria -> M)
+- O nome da psicóloga (informado ao final) deve ser substituído pela primeira letra do nome
+- Outros nomes próprios mencionados devem ser substituídos pela primeira letra do nome
+- Mantenha o resto do texto exatamente como está
+- Preserve a formatação e pontuação""",
+    tail="""Nome do paciente: "{patient_name}"
+Nome da psicóloga: "{psychologist_name}"
+
+Transcrição:
+{transcription}
+
+Transcrição com nomes substituídos por letras:"""
+))
+
+register_prompt(PromptTemplate(
+    name="session_questions",
+    version=1,
+    system="Você é um assistente especializado em análise de sessões de psicoterapia. Você gera perguntas reflexivas direcionadas à psicóloga, usando APENAS 'Paciente' para o paciente e 'você' para a psicóloga. NUNCA use nomes próprios, letras ou identificadores pessoais.",
+    instructions="""Você é um assistente que gera perguntas reflexivas para psicólogos sobre suas sessões de terapia.
+
+REGRAS OBRIGATÓRIAS:
+- Use APENAS "Paciente" para se referir ao paciente
+- Use "você" para se referir à psicóloga (a pessoa que vai responder as perguntas)
+- NUNCA use nomes próprios, letras (como P, R, etc.) ou qualquer identificador pessoal
+- Se a transcrição mencionar nomes ou letras, ignore-os completamente e use apenas "Paciente" e "você"
+
+As perguntas devem ser direcionadas à psicóloga, usando "você" quando apropriado. Exemplos:
+- "Como você percebeu que o Paciente reagiu quando..."
+- "O que você observou sobre a reação do Paciente diante de..."
+- "Como você interveio quando o Paciente mencionou..."
+
+Gere entre 3 a 5 perguntas objetivas e específicas baseadas no conteúdo da transcrição apresentada ao final.
+As perguntas devem ajudar a psicóloga a refletir sobre:
+- Reações e comportamentos do Paciente
+- Suas próprias intervenções e observações
+- Dinâmicas da sessão
+- Aspectos importantes que podem ter passado despercebidos
+
+Retorne APENAS as perguntas, uma por linha, sem numeração ou marcadores.
+NUNCA mencione nomes próprios, letras ou identificadores pessoais.""",
+    tail="""Transcrição:
+{transcription}
+
+Perguntas:"""
+))
+
+register_prompt(PromptTemplate(
+    name="conclusion",
+    version=1,
+    system=CONCLUSION_SYSTEM_MESSAGE,
+    instructions="""Você é um assistente especializado em elaborar conclusões de sessões de psicoterapia seguindo a metodologia FAP (Functional Analytic Psychotherapy).
+
+IMPORTANTE: Use APENAS "Paciente" para se referir ao paciente e "você" para se referir à psicóloga. NUNCA use nomes próprios, letras ou identificadores pessoais.
+
+Elabore uma conclusão completa da sessão seguindo RIGOROSAMENTE a estrutura abaixo. Use as informações da sessão apresentadas ao final e as respostas da psicóloga às perguntas reflexivas.
+
+ESTRUTURA OBRIGATÓRIA:
+
+0. Resumo da Sessão:
+[Breve resumo (2-3 frases) dos principais eventos e processos FAP da sessão]
+
+1. Demanda Trazida e Contexto Inicial:
+- Relatos do Paciente: [Descrição dos relatos do paciente]
+- Antecedentes (A) Relevantes: [Contexto histórico e imediato]
+- Análise FAP Inicial: [CCR1s e CCR2s potenciais identificados]
+
+2. Intervenção Clínica (FAP in vivo):
+[Descrição das ações específicas do terapeuta com análise funcional FAP de cada intervenção principal]
+
+3. Resposta do Paciente (Observação de CCRs - Regra 1):
+[Descrição das reações e comportamentos do paciente com análise FAP]
+
+4. Análise Funcional ABC Principal da Interação:
+[Análise da contingência A-B-C principal observada]
+
+5. Planejamento (Próxima Sessão e Generalização - Regra 5):
+- Objetivos FAP Próxima Sessão: [Objetivos específicos]
+- Tarefas de Casa: [Se houver, com justificativa FAP]
+- Ações Futuras Terapeuta: [Ações e ajustes]
+
+6. Correlação com Sessão Anterior:
+[Breve comparação FAP com sessões anteriores, se aplicável]
+
+Elabore a conclusão completa seguindo EXATAMENTE a estrutura acima, usando apenas "Paciente" e "você" para se referir às pessoas envolvidas.""",
+    tail="""INFORMAÇÕES DA SESSÃO:
+
+{transcription_section}
+
+Contexto:
+{context}
+
+Demanda do Paciente:
+{patient_demand}
+
+Análise da IA (FAP):
+{analise_da_ia}
+
+Respostas da Psicóloga às Perguntas Reflexivas:
+{answers}"""
+))
+
+register_prompt(PromptTemplate(
+    name="combined_analysis",
+    version=1,
+    system=FAP_SYSTEM_MESSAGE,
+    instructions=f"""Analise a transcrição de uma sessão de psicoterapia apresentada ao final e gere, em uma única resposta JSON, os campos abaixo.
+
+full_summary: resumo completo e detalhado da sessão.
+
+anonymous_summary: resumo anonimizado que remova todos os nomes próprios e dados pessoais identificáveis (endereços, telefones, etc.), seja mais superficial e genérico, possa ser compartilhado com outros profissionais sem expor o paciente e mantenha apenas informações clínicas relevantes de forma genérica.
+
+patient_demand: a demanda principal trazida pelo paciente nesta sessão.
+
+context: contexto da sessão, incluindo situação atual do paciente, temas principais discutidos, dinâmica da sessão e observações relevantes.
+
+analise_da_ia: evolução FAP completa seguindo rigorosamente o formato abaixo.
+
+{FAP_EVOLUTION_FORMAT}
+
+questions: lista com 3 a 5 perguntas reflexivas, objetivas e específicas, direcionadas à psicóloga, sobre reações e comportamentos do Paciente, suas próprias intervenções e observações, dinâmicas da sessão e aspectos importantes que podem ter passado despercebidos. Nas perguntas use APENAS "Paciente" para se referir ao paciente e "você" para se referir à psicóloga. NUNCA use nomes próprios, letras ou identificadores pessoais.""",
+    tail="""Transcrição:
+{transcription}"""
+))
+
+register_prompt(PromptTemplate(
+    name="map_summary",
+    version=1,
+    system=ANALYSIS_SYSTEM_MESSAGE,
+    instructions="""O texto ao final é um trecho da transcrição de uma sessão de psicoterapia longa demais para ser analisada de uma vez.
+
+Resuma o trecho em ordem cronológica, preservando:
+- Relatos, falas e comportamentos do paciente e do terapeuta (com citações curtas quando relevantes)
+- Intervenções do terapeuta e as reações do paciente a elas
+- Emoções, temas, eventos e qualquer informação clínica mencionada
+
+Não interprete nem conclua; o resumo substituirá o trecho original nas análises da sessão.""",
+    tail="""Trecho {index}/{total}:
+{chunk}
+
+Resumo do trecho:"""
+))
+
+register_prompt(PromptTemplate(
+    name="reduce_summary",
+    version=1,
+    system=ANALYSIS_SYSTEM_MESSAGE,
+    instructions="""Os textos ao final são resumos de trechos consecutivos da transcrição de uma sessão de psicoterapia.
+
+Combine-os em um único resumo cronológico, mais curto, preservando relatos e falas relevantes, intervenções do terapeuta, reações do paciente, emoções e informações clínicas. Não interprete nem conclua.""",
+    tail="""Resumos:
+{summaries}
+
+Resumo combinado:"""
+))
@@ -1,18 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends
-from app.models.patient import PatientCreate, PatientResponse
+from fastapi import APIRouter, HTTPException, Depends, Query
+from app.config import settings
+from app.models.patient import PatientCreate, PatientResponse, PatientPage, PatientPartial
 from app.services.supabase_service import SupabaseService
+from app.dependencies import get_supabase_service
 from app.middleware.auth import verify_api_key
+from app.utils.pagination import build_page, parse_fields
+from typing import Optional
 from uuid import UUID
 import logging
 
 router = APIRouter(prefix="/patients", tags=["patients"])
 logger = logging.getLogger(__name__)
 
-supabase_service = SupabaseService()
-
 @router.post("/", response_model=PatientResponse)
 async def create_patient(
     patient: PatientCreate,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
     api_key: str = Depends(verify_api_key)
 ):
     """Cria um novo paciente"""
@@ -20,7 +23,7 @@ async def create_patient(
         patient_data = {
             "name": patient.name
         }
-        result = supabase_service.create_patient(patient_data)
+        result = await supabase_service.create_patient_async(patient_data)
         if not result:
             raise HTTPException(status_code=500, detail="Erro ao criar paciente")
         return PatientResponse(**result)
@@ -31,17 +34,27 @@ async def create_patient(
 @router.get("/{patient_id}", response_model=PatientResponse)
 async def get_patient(
     patient_id: UUID,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
     api_key: str = Depends(verify_api_key)
 ):
     """Busca um paciente por ID"""
-    result = supabase_service.get_patient(str(patient_id))
+    result = await supabase_service.get_patient_async(str(patient_id))
     if not result:
         raise HTTPException(status_code=404, detail="Paciente não encontrado")
     return PatientResponse(**result)
 
-@router.get("/", response_model=list[PatientResponse])
-async def list_patients(api_key: str = Depends(verify_api_key)):
-    """Lista todos os pacientes"""
-    patients = supabase_service.list_patients()
-    return [PatientResponse(**p) for p in patients]
+@router.get("/", response_model=PatientPage, response_model_exclude_unset=True)
+async def list_patients(
+    limit: int = Query(settings.list_default_limit, ge=1, le=settings.list_max_limit),
+    cursor: Optional[str] = Query(None, description="`next_cursor` da página anterior"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula"),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Lista pacientes, do mais recente para o mais antigo, paginados por cursor
 
+    Com `fields`, cada item traz só os campos pedidos (PatientPartial).
+    """
+    columns = parse_fields(fields, PatientResponse.model_fields)
+    patients = await supabase_service.list_patients_async(limit=limit, cursor=cursor, columns=columns)
+    return build_page(patients, limit, model=PatientPartial if fields else PatientResponse)
@@ -1,18 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends
-from app.models.psychologist import PsychologistCreate, PsychologistResponse
+from fastapi import APIRouter, HTTPException, Depends, Query
+from app.config import settings
+from app.models.psychologist import PsychologistCreate, PsychologistResponse, PsychologistPage, PsychologistPartial
 from app.services.supabase_service import SupabaseService
+from app.dependencies import get_supabase_service
 from app.middleware.auth import verify_api_key
+from app.utils.pagination import build_page, parse_fields
+from typing import Optional
 from uuid import UUID
 import logging
 
 router = APIRouter(prefix="/psychologists", tags=["psychologists"])
 logger = logging.getLogger(__name__)
 
-supabase_service = SupabaseService()
-
 @router.post("/", response_model=PsychologistResponse)
 async def create_psychologist(
     psychologist: PsychologistCreate,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
     api_key: str = Depends(verify_api_key)
 ):
     """Cria um novo psicólogo"""
@@ -21,7 +24,7 @@ async def create_psychologist(
             "name": psychologist.name,
             "email": psychologist.email
         }
-        result = supabase_service.create_psychologist(psychologist_data)
+        result = await supabase_service.create_psychologist_async(psychologist_data)
         if not result:
             raise HTTPException(status_code=500, detail="Erro ao criar psicólogo")
         return PsychologistResponse(**result)
@@ -32,17 +35,27 @@ async def create_psychologist(
 @router.get("/{psychologist_id}", response_model=PsychologistResponse)
 async def get_psychologist(
     psychologist_id: UUID,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
     api_key: str = Depends(verify_api_key)
 ):
     """Busca um psicólogo por ID"""
-    result = supabase_service.get_psychologist(str(psychologist_id))
+    result = await supabase_service.get_psychologist_async(str(psychologist_id))
     if not result:
         raise HTTPException(status_code=404, detail="Psicólogo não encontrado")
     return PsychologistResponse(**result)
 
-@router.get("/", response_model=list[PsychologistResponse])
-async def list_psychologists(api_key: str = Depends(verify_api_key)):
-    """Lista todos os psicólogos"""
-    psychologists = supabase_service.list_psychologists()
-    return [PsychologistResponse(**p) for p in psychologists]
+@router.get("/", response_model=PsychologistPage, response_model_exclude_unset=True)
+async def list_psychologists(
+    limit: int = Query(settings.list_default_limit, ge=1, le=settings.list_max_limit),
+    cursor: Optional[str] = Query(None, description="`next_cursor` da página anterior"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula"),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Lista psicólogos, do mais recente para o mais antigo, paginados por cursor
 
+    Com `fields`, cada item traz só os campos pedidos (PsychologistPartial).
+    """
+    columns = parse_fields(fields, PsychologistResponse.model_fields)
+    psychologists = await supabase_service.list_psychologists_async(limit=limit, cursor=cursor, columns=columns)
+    return build_page(psychologists, limit, model=PsychologistPartial if fields else PsychologistResponse)
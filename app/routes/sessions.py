@@ -1,30 +1,158 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Body
-from app.models.session import SessionCreate, SessionResponse, SessionUpdate
-from app.services.audio_service import AudioService
+from fastapi import (
+    APIRouter, UploadFile, File, HTTPException, Form, Depends, Body, Query, WebSocket, WebSocketDisconnect,
+    WebSocketException, status
+)
+from fastapi.responses import JSONResponse
+from app.config import settings
+from app.models.session import (
+    SessionCreate, SessionResponse, SessionUpdate, SessionJobResponse, SessionStatusResponse, SessionPage,
+    SessionBatchResponse, SessionBatchStatusResponse, SessionLiveResponse, SessionPartial, SessionSearchPage
+)
 from app.services.openai_service import OpenAIService
 from app.services.supabase_service import SupabaseService
-from app.middleware.auth import verify_api_key
-from uuid import UUID
+from app.services.pipeline_service import SessionPipeline
+from app.services.job_service import JobService
+from app.services.batch_service import OpenAIBatchBackend, SessionBatchService
+from app.services.live_transcription import LiveStreamLimitError, LiveTranscription
+from app.dependencies import (
+    get_batch_service, get_job_service, get_openai_service, get_session_pipeline, get_supabase_service
+)
+from app.middleware.auth import verify_api_key, verify_websocket_api_key
+from app.utils.live_audio import PcmSegmenter, pcm_to_wav
+from app.utils.pagination import build_page, encode_rank_cursor, parse_fields
+from app.utils.sse import sse_event, sse_response
+from app.utils.uploads import save_upload_to_tempfile
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+import asyncio
+import html
+import json
 import logging
+import os
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 logger = logging.getLogger(__name__)
 
-audio_service = AudioService()
-openai_service = OpenAIService()
-supabase_service = SupabaseService()
+async def _get_participant_names(supabase_service: SupabaseService, patient_id: str, psychologist_id: str) -> Tuple[str, str]:
+    """Nomes do paciente e do psicólogo usados na anonimização (buscados em paralelo)"""
+    patient, psychologist = await asyncio.gather(
+        supabase_service.get_patient_async(patient_id),
+        supabase_service.get_psychologist_async(psychologist_id)
+    )
+    
+    if not patient:
+        raise HTTPException(status_code=404, detail="Paciente não encontrado")
+    if not psychologist:
+        raise HTTPException(status_code=404, detail="Psicólogo não encontrado")
+    
+    return patient.get("name", ""), psychologist.get("name", "")
+
+def _enqueue_session_job(
+    job_service: JobService,
+    session_pipeline: SessionPipeline,
+    session_id: str,
+    audio_path: Optional[str],
+    filename: Optional[str],
+    patient_name: str,
+    psychologist_name: str,
+    session: Optional[Dict[str, Any]] = None,
+    transcription_backend: Optional[str] = None
+) -> JSONResponse:
+    """Enfileira o processamento da sessão e responde 202 com o id do job
+    
+    O worker remove o áudio ao terminar.
+    """
+    job = _submit_session_job(
+        job_service, session_pipeline, session_id, audio_path, filename, patient_name, psychologist_name, session,
+        transcription_backend
+    )
+    return JSONResponse(status_code=202, content=job.model_dump(mode="json"))
+
+def _submit_session_job(
+    job_service: JobService,
+    session_pipeline: SessionPipeline,
+    session_id: str,
+    audio_path: Optional[str],
+    filename: Optional[str],
+    patient_name: str,
+    psychologist_name: str,
+    session: Optional[Dict[str, Any]] = None,
+    transcription_backend: Optional[str] = None
+) -> SessionJobResponse:
+    """Cria o job de processamento da sessão e o envia ao worker"""
+    job_id = session_id
+    job_service.create_job(job_id, session_id, SessionPipeline.STAGES)
+    job_service.submit(
+        job_id,
+        session_pipeline.run_from_file,
+        session_id,
+        audio_path,
+        filename,
+        patient_name,
+        psychologist_name,
+        on_stage=lambda stage, status: job_service.update_stage(job_id, stage, status),
+        session=session,
+        transcription_backend=transcription_backend
+    )
+    logger.info(f"Sessão {session_id} enfileirada para processamento assíncrono")
+    
+    return SessionJobResponse(
+        job_id=job_id,
+        session_id=session_id,
+        status="queued",
+        status_url=f"/sessions/{session_id}/status"
+    )
+
+# Campo dos formulários que escolhe o motor de transcrição da requisição
+TRANSCRIPTION_BACKEND_FORM = Form(
+    None, description="Motor de transcrição: `openai` ou `local` (padrão: o configurado em TRANSCRIPTION_BACKEND)"
+)
 
-@router.post("/", response_model=SessionResponse)
+def _check_transcription_backend(session_pipeline: SessionPipeline, transcription_backend: Optional[str]):
+    """Rejeita com 400 um motor de transcrição que não está disponível nesta implantação"""
+    if transcription_backend and transcription_backend not in session_pipeline.audio_service.backends:
+        available = ", ".join(session_pipeline.audio_service.backends)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Motor de transcrição indisponível: {transcription_backend} (disponíveis: {available})"
+        )
+
+@router.post(
+    "/",
+    response_model=SessionResponse,
+    responses={202: {"model": SessionJobResponse, "description": "Sessão aceita para processamento assíncrono"}}
+)
 async def create_session(
     psychologist_id: UUID = Form(...),
     patient_id: UUID = Form(...),
     audio: UploadFile = File(...),
+    async_processing: bool = Form(False),
+    transcription_backend: Optional[str] = TRANSCRIPTION_BACKEND_FORM,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    session_pipeline: SessionPipeline = Depends(get_session_pipeline),
+    job_service: JobService = Depends(get_job_service),
     api_key: str = Depends(verify_api_key)
 ):
-    """Cria uma nova sessão e processa o áudio completamente antes de retornar"""
+    """Cria uma nova sessão e processa o áudio
+    
+    Por padrão processa tudo antes de retornar. Com `async_processing=true` retorna 202
+    com o id do job e o processamento segue em segundo plano (ver GET /sessions/{id}/status).
+    """
+    _check_transcription_backend(session_pipeline, transcription_backend)
+    audio_path = None
     try:
-        # Lê arquivo de áudio
-        audio_content = await audio.read()
+        # Copia o áudio para disco em blocos, sem carregar o arquivo inteiro em memória
+        audio_path = await save_upload_to_tempfile(
+            audio,
+            max_bytes=settings.max_upload_mb * 1024 * 1024,
+            chunk_size=settings.upload_chunk_size,
+            directory=settings.session_job_dir
+        )
+        
+        # Busca nomes do paciente e psicólogo para anonimização (antes de criar a sessão)
+        patient_name, psychologist_name = await _get_participant_names(
+            supabase_service, str(patient_id), str(psychologist_id)
+        )
         
         # Não salva o áudio no bucket - apenas processa diretamente
         # Cria sessão no banco sem audio_url
@@ -33,7 +161,7 @@ async def create_session(
             "patient_id": str(patient_id),
             "audio_url": None
         }
-        session = supabase_service.create_session(session_data)
+        session = await supabase_service.create_session_async(session_data)
         
         if not session:
             raise HTTPException(status_code=500, detail="Erro ao criar sessão no banco de dados")
@@ -41,62 +169,26 @@ async def create_session(
         session_id = session["id"]
         logger.info(f"Iniciando processamento completo da sessão {session_id}")
         
+        if async_processing:
+            response = _enqueue_session_job(
+                job_service, session_pipeline, str(session_id), audio_path, audio.filename, patient_name, psychologist_name,
+                transcription_backend=transcription_backend
+            )
+            # O worker remove o áudio ao terminar
+            audio_path = None
+            return response
+        
         # Processa tudo síncronamente antes de retornar
         try:
-            # Busca nomes do paciente e psicólogo para anonimização
-            patient = supabase_service.get_patient(str(patient_id))
-            psychologist = supabase_service.get_psychologist(str(psychologist_id))
-            
-            if not patient:
-                raise HTTPException(status_code=404, detail="Paciente não encontrado")
-            if not psychologist:
-                raise HTTPException(status_code=404, detail="Psicólogo não encontrado")
-            
-            patient_name = patient.get("name", "")
-            psychologist_name = psychologist.get("name", "")
-            
-            # 1. Transcreve áudio
-            logger.info(f"Transcrevendo áudio da sessão {session_id}")
-            raw_transcription = audio_service.transcribe_audio(audio_content, audio.filename)
-            
-            # 2. Anonimiza transcrição substituindo nomes por letras
-            logger.info(f"Anonimizando transcrição da sessão {session_id}")
-            transcription = openai_service.anonymize_names_in_transcription(
-                raw_transcription, 
-                patient_name, 
-                psychologist_name
-            )
-            
-            # 3. Atualiza sessão com transcrição anonimizada
-            logger.info(f"Salvando transcrição da sessão {session_id}")
-            supabase_service.update_session(session_id, {"transcription": transcription})
-            
-            # 4. Gera perguntas sobre a sessão
-            logger.info(f"Gerando perguntas sobre a sessão {session_id}")
-            questions = openai_service.generate_session_questions(
-                transcription,
+            updated_session = await session_pipeline.run(
+                str(session_id),
+                audio_path,
+                audio.filename,
                 patient_name,
-                psychologist_name
+                psychologist_name,
+                transcription_backend=transcription_backend
             )
             
-            # 5. Processa com OpenAI (resumos, demandas, contexto)
-            logger.info(f"Processando com OpenAI a sessão {session_id}")
-            results = openai_service.process_session(transcription)
-            
-            # 6. Atualiza sessão com todos os resultados (incluindo análise da IA e perguntas)
-            logger.info(f"Salvando resultados do processamento da sessão {session_id}")
-            updated_session = supabase_service.update_session(session_id, {
-                "full_summary": results["full_summary"],
-                "anonymous_summary": results["anonymous_summary"],
-                "patient_demand": results["patient_demand"],
-                "context": results["context"],
-                "analise_da_ia": results["analise_da_ia"],
-                "questions": questions,
-                "answers": None  # Inicializa como None, será preenchido depois
-            })
-            
-            logger.info(f"Sessão {session_id} processada com sucesso - todos os dados salvos")
-            
             # Retorna a sessão atualizada com todos os dados processados
             return SessionResponse(**updated_session)
             
@@ -115,40 +207,536 @@ async def create_session(
     except Exception as e:
         logger.error(f"Erro ao criar sessão: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if audio_path:
+            await asyncio.to_thread(os.remove, audio_path)
+
+@router.post("/live", status_code=201, response_model=SessionLiveResponse)
+async def create_live_session(
+    psychologist_id: UUID = Form(...),
+    patient_id: UUID = Form(...),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Cria uma sessão sem áudio para ser transcrita ao vivo (ver WebSocket /sessions/{id}/stream)"""
+    await _get_participant_names(supabase_service, str(patient_id), str(psychologist_id))
+    
+    session = await supabase_service.create_session_async({
+        "psychologist_id": str(psychologist_id),
+        "patient_id": str(patient_id),
+        "audio_url": None
+    })
+    if not session:
+        raise HTTPException(status_code=500, detail="Erro ao criar sessão no banco de dados")
+    
+    return SessionLiveResponse(session_id=session["id"], stream_url=f"/sessions/{session['id']}/stream")
+
+@router.post("/batch", status_code=202, response_model=SessionBatchResponse)
+async def create_session_batch(
+    psychologist_id: UUID = Form(...),
+    patient_ids: List[UUID] = Form(..., description="Um paciente por gravação: primeiro os de `audio`, depois os de `audio_urls`"),
+    audio: List[UploadFile] = File(default=[]),
+    audio_urls: List[str] = Form(default=[], description="URLs de áudios no Supabase Storage"),
+    transcription_backend: Optional[str] = TRANSCRIPTION_BACKEND_FORM,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    batch_service: SessionBatchService = Depends(get_batch_service),
+    job_service: JobService = Depends(get_job_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Cria várias sessões de uma vez e processa todas em segundo plano
+    
+    As perguntas e análises vão em um único lote para a Batch API da OpenAI (mais barato,
+    resultado em até 24h). Responde 202; o progresso fica em GET /sessions/batch/{batch_id}.
+    """
+    _check_transcription_backend(batch_service.session_pipeline, transcription_backend)
+    total = len(audio) + len(audio_urls)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="Envie ao menos um arquivo em `audio` ou uma URL em `audio_urls`")
+    if total > settings.session_batch_max_items:
+        raise HTTPException(status_code=400, detail=f"O lote aceita no máximo {settings.session_batch_max_items} gravações")
+    if len(patient_ids) != total:
+        raise HTTPException(
+            status_code=400,
+            detail=f"O número de pacientes ({len(patient_ids)}) deve corresponder ao número de gravações ({total})"
+        )
+    
+    storage_prefix = f"{settings.supabase_url.rstrip('/')}/storage/v1/object/"
+    invalid_urls = [url for url in audio_urls if not url.startswith(storage_prefix)]
+    if invalid_urls:
+        raise HTTPException(status_code=400, detail=f"URLs fora do Supabase Storage: {', '.join(invalid_urls)}")
+    
+    # Nomes para anonimização: o psicólogo e todos os pacientes em duas consultas
+    psychologist, patients = await asyncio.gather(
+        supabase_service.get_psychologist_async(str(psychologist_id)),
+        supabase_service.get_many_async("patients", [str(patient_id) for patient_id in patient_ids])
+    )
+    if not psychologist:
+        raise HTTPException(status_code=404, detail="Psicólogo não encontrado")
+    missing = sorted({str(patient_id) for patient_id in patient_ids} - set(patients))
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Pacientes não encontrados: {', '.join(missing)}")
+    
+    items: List[Dict[str, Any]] = []
+    try:
+        sources = [{"upload": upload} for upload in audio] + [{"audio_url": url} for url in audio_urls]
+        for source, patient_id in zip(sources, patient_ids):
+            upload = source.get("upload")
+            item = {
+                "psychologist_id": str(psychologist_id),
+                "patient_id": str(patient_id),
+                "patient_name": patients[str(patient_id)].get("name", ""),
+                "psychologist_name": psychologist.get("name", ""),
+                "audio_url": source.get("audio_url"),
+                "audio_path": None,
+                "filename": upload.filename if upload else source["audio_url"].rsplit("/", 1)[-1],
+                "transcription_backend": transcription_backend
+            }
+            items.append(item)
+            if upload:
+                item["audio_path"] = await save_upload_to_tempfile(
+                    upload,
+                    max_bytes=settings.max_upload_mb * 1024 * 1024,
+                    chunk_size=settings.upload_chunk_size,
+                    directory=settings.session_job_dir
+                )
+        
+        sessions = await supabase_service.create_sessions_async([
+            {"psychologist_id": item["psychologist_id"], "patient_id": item["patient_id"], "audio_url": item["audio_url"]}
+            for item in items
+        ])
+        if len(sessions) != len(items):
+            raise HTTPException(status_code=500, detail="Erro ao criar sessões no banco de dados")
+        for item, session in zip(items, sessions):
+            item["session_id"] = str(session["id"])
+        
+        batch_id = str(uuid4())
+        job_service.create_job(
+            batch_id,
+            None,
+            SessionBatchService.STAGES,
+            metadata={"items": {item["session_id"]: {"status": "pending", "error": None} for item in items}}
+        )
+        job_service.submit(
+            batch_id,
+            batch_service.run,
+            items,
+            on_stage=lambda stage, status: job_service.update_stage(batch_id, stage, status),
+            on_item=lambda session_id, status, error: job_service.update_item(batch_id, session_id, status, error)
+        )
+        logger.info(f"Lote {batch_id} com {len(items)} sessões enfileirado")
+        
+        # O job remove os áudios ao terminar
+        batch_items, items = items, []
+        return SessionBatchResponse(
+            batch_id=batch_id,
+            session_ids=[item["session_id"] for item in batch_items],
+            status="queued",
+            status_url=f"/sessions/batch/{batch_id}"
+        )
+    finally:
+        for item in items:
+            if item["audio_path"]:
+                await asyncio.to_thread(os.remove, item["audio_path"])
+
+@router.post("/batch/resume", status_code=202, response_model=SessionBatchResponse)
+async def resume_session_batch(
+    session_id: UUID = Form(..., description="Qualquer sessão do lote que ainda aguarda os resultados"),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    batch_service: SessionBatchService = Depends(get_batch_service),
+    job_service: JobService = Depends(get_job_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Retoma um lote interrompido (ex: a API reiniciou enquanto aguardava a Batch API)
+    
+    Busca o lote da OpenAI já registrado na sessão em vez de criar outro e salva os
+    resultados de todas as sessões que ainda aguardam por ele.
+    """
+    if not isinstance(batch_service.batch_backend, OpenAIBatchBackend):
+        raise HTTPException(status_code=400, detail="O executor de lotes configurado não permite retomar lotes")
+    session = await supabase_service.get_session_async(str(session_id))
+    if not session:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    openai_batch_id = session.get("openai_batch_id")
+    if not openai_batch_id:
+        raise HTTPException(status_code=400, detail="A sessão não aguarda o resultado de nenhum lote")
+    
+    sessions = await supabase_service.get_sessions_by_batch_async(openai_batch_id)
+    session_ids = [str(row["id"]) for row in sessions]
+    batch_id = str(uuid4())
+    job_service.create_job(
+        batch_id,
+        None,
+        SessionBatchService.STAGES,
+        metadata={"items": {row_id: {"status": "pending", "error": None} for row_id in session_ids}}
+    )
+    job_service.submit(
+        batch_id,
+        batch_service.resume,
+        openai_batch_id,
+        on_stage=lambda stage, status: job_service.update_stage(batch_id, stage, status),
+        on_item=lambda item_id, status, error: job_service.update_item(batch_id, item_id, status, error)
+    )
+    logger.info(f"Lote {openai_batch_id} retomado no job {batch_id} com {len(session_ids)} sessões")
+    return SessionBatchResponse(
+        batch_id=batch_id,
+        session_ids=session_ids,
+        status="queued",
+        status_url=f"/sessions/batch/{batch_id}"
+    )
+
+@router.get("/batch/{batch_id}", response_model=SessionBatchStatusResponse)
+async def get_session_batch_status(
+    batch_id: str,
+    job_service: JobService = Depends(get_job_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Retorna o progresso de um lote por etapa e o status de cada sessão"""
+    job = job_service.get_job(batch_id)
+    if not job or "items" not in job:
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    return SessionBatchStatusResponse(batch_id=batch_id, **job)
+
+@router.get("/{session_id}/status", response_model=SessionStatusResponse)
+async def get_session_status(
+    session_id: UUID,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    job_service: JobService = Depends(get_job_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Retorna o progresso do processamento da sessão por etapa"""
+    job = job_service.get_job(str(session_id))
+    if job:
+        return SessionStatusResponse(**job)
+    
+    # Sem job em memória (processamento síncrono ou reinício da API): deduz pelo banco
+    session = await supabase_service.get_session_async(str(session_id))
+    if not session:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    
+    pending = SessionPipeline.pending_stages(session)
+    stages = {
+        stage: {"status": "pending" if stage in pending else "completed"}
+        for stage in SessionPipeline.STAGES
+    }
+    completed = all(stage["status"] == "completed" for stage in stages.values())
+    return SessionStatusResponse(
+        session_id=session_id,
+        status="completed" if completed else "unknown",
+        stages=stages,
+        updated_at=session.get("updated_at")
+    )
+
+# Formatos aceitos no stream: PCM 16 bits mono (cortado em silêncios pela API) ou arquivos
+# completos por mensagem, em um dos formatos que o Whisper aceita
+LIVE_FILE_FORMATS = ("wav", "webm", "ogg", "oga", "mp3", "mpeg", "mpga", "m4a", "mp4", "flac")
+
+@router.websocket("/{session_id}/stream")
+async def stream_session(
+    websocket: WebSocket,
+    session_id: UUID,
+    format: str = Query("pcm16", description=f"pcm16 ou formato de arquivo ({', '.join(LIVE_FILE_FORMATS)})"),
+    sample_rate: int = Query(16000, ge=8000, le=48000, description="Taxa de amostragem do PCM"),
+    transcription_backend: Optional[str] = Query(None, description="Motor de transcrição: `openai` ou `local`"),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    session_pipeline: SessionPipeline = Depends(get_session_pipeline),
+    job_service: JobService = Depends(get_job_service),
+    api_key: str = Depends(verify_websocket_api_key)
+):
+    """Transcreve a sessão enquanto ela acontece
+    
+    Mensagens binárias trazem o áudio: com `format=pcm16`, amostras PCM 16 bits mono
+    little-endian em qualquer tamanho de bloco (a API corta os segmentos nas pausas); com
+    outro formato, cada mensagem é um arquivo completo (ex: um blob do MediaRecorder) e vira
+    um segmento. Cada segmento é transcrito, anonimizado e anexado à transcrição salva, e o
+    texto é enviado ao cliente (`segment`). A mensagem de texto {"type": "end"} (ou a
+    desconexão) encerra o stream: o último segmento é transcrito e as perguntas e análises
+    vão para um job (`completed`, com a URL de status). Mensagens acima de `live_max_pcm_message_kb`
+    (PCM) ou `live_max_message_mb` (arquivos) ou mais de `live_max_pending_segments` segmentos
+    na fila encerram a conexão com 1008; o áudio já recebido é processado como em uma desconexão.
+    """
+    if format != "pcm16" and format not in LIVE_FILE_FORMATS:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=f"Formato não suportado: {format}")
+    try:
+        _check_transcription_backend(session_pipeline, transcription_backend)
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+    
+    session = await supabase_service.get_session_async(str(session_id))
+    if not session:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Sessão não encontrada")
+    job = job_service.get_job(str(session_id))
+    if job and job["status"] in ("queued", "running"):
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="A sessão já está sendo processada")
+    try:
+        patient_name, psychologist_name = await _get_participant_names(
+            supabase_service, session["patient_id"], session["psychologist_id"]
+        )
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+    
+    await websocket.accept()
+    connected = True
+    
+    async def send(event: Dict[str, Any]):
+        if connected:
+            await websocket.send_json(event)
+    
+    live = LiveTranscription(
+        session,
+        session_pipeline.audio_service,
+        session_pipeline.anonymization_service,
+        supabase_service,
+        patient_name,
+        psychologist_name,
+        on_segment=send,
+        transcription_backend=transcription_backend
+    )
+    segmenter = PcmSegmenter(
+        sample_rate,
+        settings.live_segment_min_seconds,
+        settings.live_segment_max_seconds,
+        settings.live_silence_db,
+        settings.live_min_silence
+    ) if format == "pcm16" else None
+    
+    def add_pcm_segment(segment):
+        live.add_segment(pcm_to_wav(segment.pcm, sample_rate), f"segment_{live.segments:05d}.wav", segment.start)
+    
+    if segmenter:
+        max_message_bytes = settings.live_max_pcm_message_kb * 1024
+    else:
+        max_message_bytes = int(settings.live_max_message_mb * 1024 * 1024)
+    limit_exceeded = False
+    
+    try:
+        async with live:
+            await send({"type": "ready", "session_id": str(session_id), "format": format})
+            logger.info(f"Transmissão ao vivo da sessão {session_id} iniciada ({format})")
+            try:
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    size = len(message["bytes"]) if message.get("bytes") is not None else len(message.get("text") or "")
+                    if size > max_message_bytes:
+                        raise LiveStreamLimitError(f"Mensagem excede o tamanho máximo de {max_message_bytes // 1024} KB")
+                    if message.get("bytes") is not None:
+                        if segmenter:
+                            # O nível de cada janela é calculado em Python puro: fora do event loop
+                            for segment in await asyncio.to_thread(segmenter.feed, message["bytes"]):
+                                add_pcm_segment(segment)
+                        elif message["bytes"]:
+                            live.add_segment(message["bytes"], f"segment_{live.segments:05d}.{format}")
+                        continue
+                    try:
+                        command = json.loads(message.get("text") or "")
+                    except ValueError:
+                        command = None
+                    if isinstance(command, dict) and command.get("type") == "end":
+                        break
+                    await send({"type": "error", "detail": 'Mensagem de texto inválida; use {"type": "end"} para encerrar'})
+            except WebSocketDisconnect:
+                # A sessão terminou sem "end" (ex: aba fechada): processa o que foi recebido
+                connected = False
+                logger.info(f"Cliente desconectou da transmissão da sessão {session_id}")
+            except LiveStreamLimitError as e:
+                # Encerra a conexão e processa o que foi recebido; o trecho ainda não cortado é descartado
+                logger.warning(f"Transmissão da sessão {session_id} encerrada: {str(e)}")
+                limit_exceeded = True
+                await send({"type": "error", "detail": str(e)})
+                connected = False
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Limite do stream excedido")
+            
+            if segmenter and not limit_exceeded:
+                final_segment = segmenter.flush()
+                if final_segment:
+                    add_pcm_segment(final_segment)
+            session = await live.finish()
+        
+        if not session.get("transcription"):
+            await send({"type": "error", "detail": "Nenhuma fala foi transcrita"})
+        else:
+            job = _submit_session_job(
+                job_service, session_pipeline, str(session_id), None, None, patient_name, psychologist_name, session
+            )
+            await send({
+                "type": "completed",
+                "segments": live.segments,
+                "failed_segments": live.failed_segments,
+                **job.model_dump(mode="json")
+            })
+    except Exception as e:
+        logger.error(f"Erro na transmissão ao vivo da sessão {session_id}: {str(e)}")
+        await send({"type": "error", "detail": str(e)})
+    finally:
+        if connected:
+            await websocket.close()
+
+@router.post(
+    "/{session_id}/reprocess",
+    response_model=SessionResponse,
+    responses={202: {"model": SessionJobResponse, "description": "Reprocessamento aceito para execução assíncrona"}}
+)
+async def reprocess_session(
+    session_id: UUID,
+    audio: Optional[UploadFile] = File(None),
+    async_processing: bool = Form(False),
+    transcription_backend: Optional[str] = TRANSCRIPTION_BACKEND_FORM,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    session_pipeline: SessionPipeline = Depends(get_session_pipeline),
+    job_service: JobService = Depends(get_job_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Executa apenas as etapas que faltam ou falharam no processamento da sessão
+    
+    Transcrição, perguntas e cada análise já salvas são mantidas. O áudio só é
+    necessário se a sessão ainda não tiver transcrição.
+    """
+    _check_transcription_backend(session_pipeline, transcription_backend)
+    session = await supabase_service.get_session_async(str(session_id))
+    if not session:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    
+    job = job_service.get_job(str(session_id))
+    if job and job["status"] in ("queued", "running"):
+        raise HTTPException(status_code=409, detail="A sessão já está sendo processada")
+    
+    pending = SessionPipeline.pending_stages(session)
+    if not pending:
+        return SessionResponse(**session)
+    if "transcription" in pending and not audio:
+        raise HTTPException(status_code=400, detail="Esta sessão não possui transcrição; envie o áudio para reprocessá-la")
+    
+    audio_path = None
+    try:
+        if audio:
+            audio_path = await save_upload_to_tempfile(
+                audio,
+                max_bytes=settings.max_upload_mb * 1024 * 1024,
+                chunk_size=settings.upload_chunk_size,
+                directory=settings.session_job_dir
+            )
+        
+        patient_name, psychologist_name = await _get_participant_names(
+            supabase_service, session["patient_id"], session["psychologist_id"]
+        )
+        
+        logger.info(f"Reprocessando etapas {', '.join(pending)} da sessão {session_id}")
+        if async_processing:
+            response = _enqueue_session_job(
+                job_service,
+                session_pipeline,
+                str(session_id),
+                audio_path,
+                audio.filename if audio else None,
+                patient_name,
+                psychologist_name,
+                session=session,
+                transcription_backend=transcription_backend
+            )
+            audio_path = None
+            return response
+        
+        try:
+            updated_session = await session_pipeline.run(
+                str(session_id),
+                audio_path,
+                audio.filename if audio else None,
+                patient_name,
+                psychologist_name,
+                session=session,
+                transcription_backend=transcription_backend
+            )
+            return SessionResponse(**updated_session)
+        except Exception as process_error:
+            logger.error(f"Erro ao reprocessar sessão {session_id}: {str(process_error)}")
+            raise HTTPException(status_code=500, detail=f"Erro ao reprocessar sessão: {str(process_error)}")
+    finally:
+        if audio_path:
+            await asyncio.to_thread(os.remove, audio_path)
+
+# Delimitadores dos termos encontrados nos trechos de search_sessions (supabase/migrations)
+HIGHLIGHT_START, HIGHLIGHT_STOP = "\x02", "\x03"
+
+def _escape_highlight(snippet: str) -> str:
+    """Escapa o HTML do trecho e troca os delimitadores dos termos encontrados por <mark>"""
+    escaped = html.escape(snippet, quote=False)
+    return escaped.replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+@router.get("/search", response_model=SessionSearchPage)
+async def search_sessions(
+    q: str = Query(..., min_length=2, max_length=200, description='Termos da busca; aceita "frases", OR e -exclusão'),
+    psychologist_id: UUID = None,
+    patient_id: UUID = None,
+    limit: int = Query(settings.search_default_limit, ge=1, le=settings.search_max_limit),
+    cursor: Optional[str] = Query(None, description="`next_cursor` da página anterior"),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Busca sessões pela transcrição, resumo e contexto, da mais relevante para a menos relevante
+    
+    Usa o índice de texto em português do banco (supabase/migrations); termos são comparados
+    pelo radical, então "trabalho" também encontra "trabalhando".
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Informe os termos da busca")
+    results = await supabase_service.search_sessions_async(
+        q.strip(),
+        psychologist_id=str(psychologist_id) if psychologist_id else None,
+        patient_id=str(patient_id) if patient_id else None,
+        limit=limit,
+        cursor=cursor
+    )
+    for result in results:
+        result["highlights"] = {field: _escape_highlight(snippet) for field, snippet in (result.get("highlights") or {}).items()}
+    return build_page(results, limit, encode=encode_rank_cursor)
 
 @router.get("/{session_id}", response_model=SessionResponse)
 async def get_session(
     session_id: UUID,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
     api_key: str = Depends(verify_api_key)
 ):
     """Busca uma sessão por ID"""
-    session = supabase_service.get_session(str(session_id))
+    session = await supabase_service.get_session_async(str(session_id))
     if not session:
         raise HTTPException(status_code=404, detail="Sessão não encontrada")
     return SessionResponse(**session)
 
-@router.get("/", response_model=list[SessionResponse])
+@router.get("/", response_model=SessionPage, response_model_exclude_unset=True)
 async def list_sessions(
     psychologist_id: UUID = None,
     patient_id: UUID = None,
+    limit: int = Query(settings.list_default_limit, ge=1, le=settings.list_max_limit),
+    cursor: Optional[str] = Query(None, description="`next_cursor` da página anterior"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula (ex: id,created_at,anonymous_summary)"),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
     api_key: str = Depends(verify_api_key)
 ):
-    """Lista sessões com filtros opcionais"""
-    sessions = supabase_service.list_sessions(
+    """Lista sessões com filtros opcionais, da mais recente para a mais antiga, paginadas por cursor
+
+    Com `fields`, cada item traz só os campos pedidos (SessionPartial).
+    """
+    columns = parse_fields(fields, SessionResponse.model_fields)
+    sessions = await supabase_service.list_sessions_async(
         psychologist_id=str(psychologist_id) if psychologist_id else None,
-        patient_id=str(patient_id) if patient_id else None
+        patient_id=str(patient_id) if patient_id else None,
+        limit=limit,
+        cursor=cursor,
+        columns=columns
     )
-    return [SessionResponse(**session) for session in sessions]
+    return build_page(sessions, limit, model=SessionPartial if fields else SessionResponse)
 
 @router.patch("/{session_id}/answers", response_model=SessionResponse)
 async def update_session_answers(
     session_id: UUID,
     answers: list[str] = Body(...),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
     api_key: str = Depends(verify_api_key)
 ):
     """Atualiza as respostas às perguntas da sessão"""
     # Verifica se a sessão existe
-    session = supabase_service.get_session(str(session_id))
+    session = await supabase_service.get_session_async(str(session_id))
     if not session:
         raise HTTPException(status_code=404, detail="Sessão não encontrada")
     
@@ -165,21 +753,95 @@ async def update_session_answers(
         )
     
     # Atualiza as respostas
-    updated_session = supabase_service.update_session(str(session_id), {"answers": answers})
+    updated_session = await supabase_service.update_session_async(str(session_id), {"answers": answers})
     
     if not updated_session:
         raise HTTPException(status_code=500, detail="Erro ao atualizar respostas")
     
     return SessionResponse(**updated_session)
 
-@router.post("/{session_id}/conclusion", response_model=SessionResponse)
+async def _stream_session_field(
+    supabase_service: SupabaseService,
+    session_id: str,
+    field: str,
+    chunks: AsyncIterator[str]
+) -> AsyncIterator[str]:
+    """Repassa o texto gerado como eventos SSE e salva o texto completo na sessão ao final
+    
+    Eventos: `delta` ({"text": ...}) a cada trecho, `done` com a sessão atualizada ou
+    `error` ({"detail": ...}), já que o status HTTP foi enviado antes da geração.
+    """
+    parts = []
+    try:
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield sse_event("delta", {"text": chunk})
+        
+        updated_session = await supabase_service.update_session_async(session_id, {field: "".join(parts)})
+        if not updated_session:
+            raise Exception(f"Erro ao salvar {field}")
+        
+        logger.info(f"Campo {field} gerado (stream) e salvo para a sessão {session_id}")
+        yield sse_event("done", SessionResponse(**updated_session).model_dump(mode="json"))
+    except Exception as e:
+        logger.error(f"Erro ao gerar {field} (stream) para sessão {session_id}: {str(e)}")
+        yield sse_event("error", {"detail": str(e)})
+
+SSE_RESPONSES = {200: {"content": {"text/event-stream": {}}, "description": "Eventos SSE quando `stream=true`"}}
+
+@router.post("/{session_id}/analysis", response_model=SessionResponse, responses=SSE_RESPONSES)
+async def generate_session_analysis(
+    session_id: UUID,
+    stream: bool = Query(False, description="Envia o texto em eventos SSE à medida que é gerado"),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    openai_service: OpenAIService = Depends(get_openai_service),
+    api_key: str = Depends(verify_api_key)
+):
+    """Gera novamente a análise FAP da IA (analise_da_ia) a partir da transcrição da sessão"""
+    session = await supabase_service.get_session_async(str(session_id))
+    if not session:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    
+    transcription = session.get("transcription")
+    if not transcription:
+        raise HTTPException(status_code=400, detail="Esta sessão não possui transcrição")
+    
+    logger.info(f"Gerando análise da IA para a sessão {session_id}")
+    if stream:
+        return sse_response(
+            _stream_session_field(
+                supabase_service, str(session_id), "analise_da_ia", openai_service.stream_ia_analysis(transcription)
+            )
+        )
+    
+    try:
+        analise_da_ia = await openai_service.generate_ia_analysis_async(transcription)
+        updated_session = await supabase_service.update_session_async(str(session_id), {"analise_da_ia": analise_da_ia})
+        
+        if not updated_session:
+            raise HTTPException(status_code=500, detail="Erro ao salvar análise")
+        
+        return SessionResponse(**updated_session)
+        
+    except Exception as e:
+        logger.error(f"Erro ao gerar análise para sessão {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar análise: {str(e)}")
+
+@router.post("/{session_id}/conclusion", response_model=SessionResponse, responses=SSE_RESPONSES)
 async def generate_session_conclusion(
     session_id: UUID,
+    stream: bool = Query(False, description="Envia o texto em eventos SSE à medida que é gerado"),
+    mode: Optional[str] = Query(
+        None,
+        description="\"compact\" (análises + trechos relevantes da transcrição) ou \"full\" (transcrição inteira); padrão: CONCLUSION_MODE"
+    ),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    openai_service: OpenAIService = Depends(get_openai_service),
     api_key: str = Depends(verify_api_key)
 ):
     """Gera a conclusão final da sessão baseada no contexto, análise e respostas do psicólogo"""
     # Verifica se a sessão existe
-    session = supabase_service.get_session(str(session_id))
+    session = await supabase_service.get_session_async(str(session_id))
     if not session:
         raise HTTPException(status_code=404, detail="Sessão não encontrada")
     
@@ -200,19 +862,36 @@ async def generate_session_conclusion(
     if not transcription:
         raise HTTPException(status_code=400, detail="Esta sessão não possui transcrição")
     
+    if mode not in (None, "compact", "full"):
+        raise HTTPException(status_code=400, detail="mode deve ser \"compact\" ou \"full\"")
+    
     # Gera a conclusão
     logger.info(f"Gerando conclusão para a sessão {session_id}")
+    if stream:
+        chunks = openai_service.stream_conclusion(
+            transcription=transcription or "",
+            context=context or "",
+            patient_demand=patient_demand or "",
+            analise_da_ia=analise_da_ia or "",
+            answers=answers,
+            questions=session.get("questions"),
+            mode=mode
+        )
+        return sse_response(_stream_session_field(supabase_service, str(session_id), "conclusion", chunks))
+    
     try:
-        conclusion = openai_service.generate_conclusion(
+        conclusion = await openai_service.generate_conclusion_async(
             transcription=transcription or "",
             context=context or "",
             patient_demand=patient_demand or "",
             analise_da_ia=analise_da_ia or "",
-            answers=answers
+            answers=answers,
+            questions=session.get("questions"),
+            mode=mode
         )
         
         # Atualiza a sessão com a conclusão
-        updated_session = supabase_service.update_session(str(session_id), {"conclusion": conclusion})
+        updated_session = await supabase_service.update_session_async(str(session_id), {"conclusion": conclusion})
         
         if not updated_session:
             raise HTTPException(status_code=500, detail="Erro ao salvar conclusão")
@@ -0,0 +1,173 @@
+from app.config import settings
+from app.services.openai_service import OpenAIService
+from app.utils.sync import run_sync
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Partículas de sobrenomes que não identificam a pessoa sozinhas
+NAME_PARTICLES = {"de", "da", "do", "das", "dos", "di", "du", "e", "del", "van", "von"}
+
+# Nomes que também são palavras comuns; em minúsculas (e sozinhos) são mantidos
+COMMON_WORD_NAMES = {
+    "amor", "aurora", "bela", "branco", "campos", "clara", "costa", "cruz", "dores", "esperanca",
+    "fe", "flor", "franco", "gloria", "graca", "leao", "leite", "lima", "luz", "mar", "mota",
+    "neves", "paz", "pedra", "pinto", "prado", "ramos", "reis", "rocha", "rosa", "santos",
+    "serra", "sol", "vitoria"
+}
+
+# Variantes acentuadas aceitas para cada letra base
+ACCENT_VARIANTS = {
+    "a": "aáàâãä",
+    "e": "eéèêë",
+    "i": "iíìîï",
+    "o": "oóòôõö",
+    "u": "uúùûü",
+    "c": "cç",
+    "n": "nñ"
+}
+
+def strip_accents(text: str) -> str:
+    """Remove acentos mantendo as letras base"""
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if unicodedata.category(char) != "Mn")
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", strip_accents(text).lower()).strip()
+
+def _variant_pattern(variant: str) -> str:
+    """Expressão que casa o nome com ou sem acentos e com espaços variáveis"""
+    parts = []
+    for char in _normalize(variant):
+        if char in ACCENT_VARIANTS:
+            parts.append(f"[{ACCENT_VARIANTS[char]}]")
+        elif char == " ":
+            parts.append(r"\s+")
+        else:
+            parts.append(re.escape(char))
+    return "".join(parts)
+
+def _initial(name: str) -> str:
+    normalized = strip_accents(name).strip()
+    return normalized[0].upper() if normalized else ""
+
+def name_variants(name: str) -> List[str]:
+    """Nome completo, combinações usuais (nome composto, nome + último sobrenome) e cada parte do nome"""
+    tokens = name.split()
+    if not tokens:
+        return []
+    meaningful = [token for token in tokens if token.lower() not in NAME_PARTICLES and len(token) > 1]
+    variants = [" ".join(tokens)]
+    if len(meaningful) > 2:
+        variants.append(f"{meaningful[0]} {meaningful[1]}")
+        variants.append(f"{meaningful[0]} {meaningful[-1]}")
+    variants.extend(meaningful)
+    return variants
+
+@lru_cache(maxsize=256)
+def _compile_matcher(names: Tuple[str, ...]) -> Tuple[Optional["re.Pattern[str]"], Dict[str, str]]:
+    """Compila uma única expressão para todos os nomes e mapeia cada variante à inicial"""
+    replacements: Dict[str, str] = {}
+    for name in names:
+        initial = _initial(name)
+        for variant in name_variants(name):
+            # A primeira pessoa com a variante prevalece (paciente antes do psicólogo)
+            replacements.setdefault(_normalize(variant), initial)
+    if not replacements:
+        return None, replacements
+
+    # Variantes mais longas primeiro para o nome completo ter prioridade sobre as partes
+    alternatives = sorted(replacements, key=len, reverse=True)
+    pattern = r"(?<!\w)(?:" + "|".join(_variant_pattern(variant) for variant in alternatives) + r")(?!\w)"
+    return re.compile(pattern, re.IGNORECASE), replacements
+
+class LocalAnonymizer:
+    """Substitui nomes conhecidos pela inicial com uma expressão regular compilada
+
+    Opcionalmente usa um modelo de NER offline (spaCy) para encontrar outros nomes
+    de pessoas mencionados na transcrição.
+    """
+
+    def __init__(self, ner_enabled: bool = False, ner_model: str = "pt_core_news_sm"):
+        self.ner_enabled = ner_enabled
+        self.ner_model = ner_model
+        self._nlp = None
+
+    def _load_ner(self):
+        if self._nlp is None:
+            try:
+                import spacy
+            except ImportError:
+                logger.warning("spaCy não instalado; NER desativado na anonimização")
+                self.ner_enabled = False
+                return None
+            self._nlp = spacy.load(self.ner_model, disable=["parser", "lemmatizer"])
+        return self._nlp
+
+    def find_person_names(self, text: str) -> List[str]:
+        """Nomes de pessoas encontrados pelo NER (vazio se desativado)"""
+        if not self.ner_enabled:
+            return []
+        nlp = self._load_ner()
+        if nlp is None:
+            return []
+        return list(dict.fromkeys(ent.text for ent in nlp(text).ents if ent.label_ == "PER"))
+
+    def anonymize(self, transcription: str, names: Iterable[str]) -> str:
+        """Substitui cada ocorrência dos nomes (e dos encontrados pelo NER) pela inicial"""
+        known = [name.strip() for name in names if name and name.strip()]
+        all_names = tuple(dict.fromkeys(known + self.find_person_names(transcription)))
+        matcher, replacements = _compile_matcher(all_names)
+        if matcher is None:
+            return transcription
+
+        def replace(match: "re.Match[str]") -> str:
+            found = match.group(0)
+            normalized = _normalize(found)
+            # A transcrição nem sempre capitaliza nomes ("joão"); só palavras comuns em
+            # minúsculas (ex: "rosa", "clara") ficam como estão
+            if not found[0].isupper() and normalized in COMMON_WORD_NAMES:
+                return found
+            return replacements.get(normalized, found)
+
+        return matcher.sub(replace, transcription)
+
+class AnonymizationService:
+    """Anonimiza transcrições localmente, com o GPT-4 apenas como alternativa opcional
+
+    `anonymization_mode` escolhe "local" (padrão) ou "llm". Com
+    `anonymization_llm_fallback`, falhas do modo local recorrem ao GPT-4.
+    """
+
+    def __init__(self, openai_service: OpenAIService):
+        self.openai_service = openai_service
+        self.local = LocalAnonymizer(
+            ner_enabled=settings.anonymization_ner_enabled,
+            ner_model=settings.anonymization_ner_model
+        )
+
+    async def anonymize_async(self, transcription: str, patient_name: str, psychologist_name: str) -> str:
+        """Substitui nomes de pessoas por letras na transcrição"""
+        if settings.anonymization_mode == "llm":
+            return await self.openai_service.anonymize_names_in_transcription_async(
+                transcription, patient_name, psychologist_name
+            )
+        try:
+            # O NER pode levar alguns segundos em transcrições longas
+            return await asyncio.to_thread(self.local.anonymize, transcription, [patient_name, psychologist_name])
+        except Exception as e:
+            if not settings.anonymization_llm_fallback:
+                raise
+            logger.warning(f"Anonimização local falhou, usando GPT-4: {str(e)}")
+            return await self.openai_service.anonymize_names_in_transcription_async(
+                transcription, patient_name, psychologist_name
+            )
+
+    def anonymize(self, transcription: str, patient_name: str, psychologist_name: str) -> str:
+        """Versão síncrona (obsoleta) de anonymize_async"""
+        return run_sync(self.anonymize_async(transcription, patient_name, psychologist_name), "anonymize_async")
@@ -1,22 +1,249 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
 from app.config import settings
-from typing import Optional
-import io
+from app.services.cache_service import CacheService, get_cache, hash_file
+from app.services.rate_limiter import OpenAIScheduler, get_scheduler
+from app.services.transcription_backends import TranscriptionBackend, available_cores, create_transcription_backends
+from app.utils import audio_chunking, audio_preprocessing, metrics
+from app.utils.sync import run_sync
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
 
 class AudioService:
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.openai_api_key)
+    """Transcreve áudios com o motor configurado (ver app/services/transcription_backends.py)
+    
+    `transcription_backend` define o motor padrão; os métodos assíncronos aceitam
+    `backend` para escolher outro motor disponível por chamada.
+    """
+    
+    def __init__(
+        self,
+        cache: Optional[CacheService] = None,
+        async_client: Optional[AsyncOpenAI] = None,
+        scheduler: Optional[OpenAIScheduler] = None,
+        backends: Optional[Dict[str, TranscriptionBackend]] = None
+    ):
+        # A API recebe o cliente assíncrono compartilhado (ver app/services/container.py)
+        self.async_client = async_client or AsyncOpenAI(api_key=settings.openai_api_key)
+        self.cache = cache or get_cache()
+        if scheduler is None and settings.openai_scheduler_enabled:
+            scheduler = get_scheduler()
+        self.scheduler = scheduler
+        self.backends = backends or create_transcription_backends(self.async_client, scheduler)
+        # Conversões de áudio (processos do ffmpeg) simultâneas
+        self._preprocess_slots = asyncio.Semaphore(settings.audio_preprocess_workers or available_cores())
+    
+    def backend(self, name: Optional[str] = None) -> TranscriptionBackend:
+        """Motor de transcrição pelo nome (padrão: `transcription_backend`)"""
+        name = name or settings.transcription_backend
+        if name not in self.backends:
+            raise ValueError(f"Motor de transcrição indisponível: {name} (disponíveis: {', '.join(self.backends)})")
+        return self.backends[name]
+    
+    @contextmanager
+    def _observe(self, model: str = "whisper-1"):
+        """Registra latência, chamadas em andamento e falhas de uma transcrição"""
+        in_progress = metrics.OPENAI_REQUESTS_IN_PROGRESS.labels("transcription")
+        in_progress.inc()
+        started_at = time.perf_counter()
+        status = "error"
+        try:
+            yield
+            status = "success"
+        finally:
+            in_progress.dec()
+            metrics.observe_openai_request("transcription", model, status, time.perf_counter() - started_at)
+    
+    def _cache_key(self, audio_hash: str, model: str = "whisper-1") -> str:
+        """Chave do cache: hash dos bytes do áudio, modelo e idioma"""
+        return self.cache.make_key("transcription", audio_hash, model, "pt")
+    
+    async def transcribe_audio_async(self, audio_file: bytes, filename: str, backend: Optional[str] = None) -> str:
+        """Transcreve áudio em memória (divide áudios longos em trechos)"""
+        result = await self.transcribe_audio_segments_async(audio_file, filename, backend)
+        return result["text"]
     
     def transcribe_audio(self, audio_file: bytes, filename: str) -> str:
-        """Transcreve áudio usando Whisper API"""
-        audio_io = io.BytesIO(audio_file)
-        audio_io.name = filename
-        
-        transcript = self.client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_io,
-            language="pt"  # Português
+        """Versão síncrona (obsoleta) de transcribe_audio_async"""
+        return run_sync(self.transcribe_audio_async(audio_file, filename), "transcribe_audio_async")
+    
+    async def transcribe_audio_file_async(self, audio_path: str, filename: str, backend: Optional[str] = None) -> str:
+        """Transcreve um áudio salvo em disco, lendo direto do arquivo"""
+        result = await self.transcribe_audio_file_segments_async(audio_path, filename, backend)
+        return result["text"]
+    
+    async def _transcribe_with(self, backend: TranscriptionBackend, audio_path: str, filename: str) -> Dict[str, Any]:
+        """Transcreve um arquivo com o motor, retornando texto e segmentos com tempos relativos"""
+        with self._observe(backend.model):
+            result = await backend.transcribe(audio_path, filename)
+        metrics.record_audio_usage(backend.model, result.get("duration"), backend.price_per_minute)
+        return {"text": result["text"], "segments": result["segments"]}
+    
+    async def transcribe_audio_segments_async(
+        self,
+        audio_file: bytes,
+        filename: str,
+        backend: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Transcreve áudio em memória retornando {"text", "segments"}"""
+        suffix = os.path.splitext(filename)[1]
+        audio_path = await asyncio.to_thread(self._write_temp_file, audio_file, suffix)
+        try:
+            return await self.transcribe_audio_file_segments_async(audio_path, filename, backend)
+        finally:
+            await asyncio.to_thread(os.remove, audio_path)
+    
+    async def transcribe_audio_file_segments_async(
+        self,
+        audio_path: str,
+        filename: str,
+        backend: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Transcreve um áudio em disco retornando {"text", "segments"}
+        
+        O áudio é normalizado antes (mono 16 kHz em Opus, sem o silêncio das bordas).
+        Áudios maiores que `transcription_chunk_seconds` (ou que o limite do motor) são
+        divididos em silêncios, transcritos em paralelo e reunidos em ordem. O resultado
+        fica em cache pelo hash do conteúdo do arquivo original e pelo modelo do motor.
+        """
+        engine = self.backend(backend)
+        cache_key = self._cache_key(await asyncio.to_thread(hash_file, audio_path), engine.model)
+        cached = await self.cache.get_async(cache_key)
+        if cached is not None:
+            logger.info("Transcrição encontrada no cache")
+            return cached
+        
+        result = await self._transcribe_preprocessed_async(engine, audio_path, filename)
+        await self.cache.set_async(cache_key, result)
+        return result
+    
+    async def _transcribe_preprocessed_async(
+        self,
+        engine: TranscriptionBackend,
+        audio_path: str,
+        filename: str
+    ) -> Dict[str, Any]:
+        """Normaliza o áudio (ver app/utils/audio_preprocessing.py) e transcreve o resultado
+        
+        Sem ffmpeg, com `audio_preprocessing_enabled` desligado, se a conversão falhar ou
+        não reduzir o arquivo, transcreve o original. Os tempos dos segmentos continuam
+        relativos ao áudio original.
+        """
+        if not settings.audio_preprocessing_enabled or not audio_chunking.ffmpeg_available():
+            return await self._transcribe_file_segments_async(engine, audio_path, filename)
+        
+        work_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix="preprocess_", dir=settings.session_job_dir)
+        try:
+            processed = None
+            try:
+                async with self._preprocess_slots:
+                    processed = await audio_preprocessing.preprocess_audio(
+                        audio_path,
+                        os.path.join(work_dir, "audio.ogg"),
+                        settings.audio_preprocess_sample_rate,
+                        settings.audio_preprocess_bitrate,
+                        settings.audio_preprocess_silence_db,
+                        settings.audio_preprocess_min_silence,
+                        settings.audio_preprocess_padding
+                    )
+            except Exception as e:
+                logger.warning(f"Pré-processamento do áudio falhou; transcrevendo o original: {str(e)}")
+            if processed is None:
+                return await self._transcribe_file_segments_async(engine, audio_path, filename)
+            
+            metrics.AUDIO_PREPROCESS_BYTES.labels("input").inc(processed.input_bytes)
+            metrics.AUDIO_PREPROCESS_BYTES.labels("output").inc(processed.output_bytes)
+            logger.info(
+                f"Áudio normalizado: {processed.input_bytes / 1024:.0f} KB -> {processed.output_bytes / 1024:.0f} KB, "
+                f"{processed.duration:.0f}s a partir de {processed.offset:.1f}s"
+            )
+            result = await self._transcribe_file_segments_async(engine, processed.path, "audio.ogg", compact=True)
+            return audio_preprocessing.shift_segments(result, processed.offset)
+        finally:
+            await asyncio.to_thread(shutil.rmtree, work_dir, True)
+    
+    async def _transcribe_file_segments_async(
+        self,
+        engine: TranscriptionBackend,
+        audio_path: str,
+        filename: str,
+        compact: bool = False
+    ) -> Dict[str, Any]:
+        size = os.path.getsize(audio_path)
+        too_large = engine.max_file_bytes is not None and size > engine.max_file_bytes
+        can_chunk = settings.transcription_chunking_enabled and audio_chunking.ffmpeg_available()
+        
+        if can_chunk:
+            duration = await audio_chunking.probe_duration(audio_path)
+            if duration > settings.transcription_chunk_seconds or too_large:
+                work_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix="transcription_")
+                try:
+                    return await self._transcribe_chunked_async(engine, audio_path, work_dir, duration, compact)
+                finally:
+                    await asyncio.to_thread(shutil.rmtree, work_dir, True)
+        elif too_large:
+            logger.warning("Áudio acima do limite do Whisper e ffmpeg indisponível para dividi-lo")
+        
+        return await self._transcribe_with(engine, audio_path, filename)
+    
+    async def _transcribe_chunked_async(
+        self,
+        engine: TranscriptionBackend,
+        source_path: str,
+        work_dir: str,
+        duration: float,
+        compact: bool = False
+    ) -> Dict[str, Any]:
+        """Divide o áudio em trechos sobrepostos e transcreve com paralelismo limitado
+        
+        Com `compact` (áudio já normalizado), os trechos também são extraídos em Opus.
+        """
+        silences = await audio_chunking.detect_silences(
+            source_path,
+            settings.transcription_silence_db,
+            settings.transcription_min_silence
         )
+        chunks = audio_chunking.plan_chunks(
+            duration,
+            silences,
+            settings.transcription_chunk_seconds,
+            settings.transcription_chunk_overlap
+        )
+        logger.info(f"Transcrevendo áudio de {duration:.0f}s em {len(chunks)} trechos")
         
-        return transcript.text
-
+        semaphore = asyncio.Semaphore(max(1, settings.transcription_max_concurrency))
+        
+        async def transcribe_chunk(chunk: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                extension, codec, bitrate = ("ogg", "libopus", settings.audio_preprocess_bitrate) if compact else ("mp3", "libmp3lame", "64k")
+                chunk_path = os.path.join(work_dir, f"chunk_{chunk['index']:04d}.{extension}")
+                await audio_chunking.extract_chunk(
+                    source_path, chunk_path, chunk["start"], chunk["end"], codec=codec, bitrate=bitrate
+                )
+                result = await self._transcribe_with(engine, chunk_path, os.path.basename(chunk_path))
+                return {**chunk, "segments": result["segments"]}
+        
+        transcribed = await asyncio.gather(*(transcribe_chunk(chunk) for chunk in chunks))
+        return audio_chunking.stitch_segments(transcribed)
+    
+    def _write_temp_file(self, content: bytes, suffix: str) -> str:
+        with tempfile.NamedTemporaryFile(delete=False, dir=settings.session_job_dir, suffix=suffix) as output:
+            output.write(content)
+            return output.name
+    
+    async def close_backends(self):
+        """Encerra os motores de transcrição (ex: o pool de processos do motor local)"""
+        for backend in self.backends.values():
+            await backend.aclose()
+    
+    async def aclose(self):
+        """Fecha as conexões HTTP do cliente assíncrono e os motores de transcrição"""
+        await self.close_backends()
+        await self.async_client.close()
@@ -0,0 +1,398 @@
+from openai import AsyncOpenAI
+from openai.types import CompletionUsage
+from app.config import settings
+from app.services.openai_service import OpenAIService
+from app.services.pipeline_service import SessionPipeline, StageCallback
+from app.services.supabase_service import SupabaseService
+from app.utils import metrics
+from app.utils.uploads import download_to_tempfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+import asyncio
+import httpx
+import json
+import logging
+import openai
+import os
+
+logger = logging.getLogger(__name__)
+
+# Callback chamado a cada mudança de status de uma sessão do lote: (session_id, status, erro)
+ItemCallback = Callable[[str, str, Optional[str]], None]
+
+# Callback chamado com o id do lote da Batch API assim que ele é criado
+SubmitCallback = Callable[[str], Awaitable[None]]
+
+# Status finais de um lote na Batch API
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+class OpenAIBatchBackend:
+    """Envia as requisições pela Batch API da OpenAI (arquivo JSONL, resultado em até 24h)
+
+    Custa metade das chamadas normais e não consome o limite de requisições por minuto,
+    em troca de latência: o lote é consultado a cada `openai_batch_poll_interval` segundos.
+    """
+
+    def __init__(self, async_client: AsyncOpenAI):
+        self.async_client = async_client
+
+    def _jsonl(self, requests: Dict[str, Dict[str, Any]]) -> bytes:
+        """Uma linha por requisição, no formato de entrada da Batch API
+        
+        Os fallbacks da rota não se aplicam: falhas ficam registradas no resultado do lote.
+        Os campos de `extra_body` (ex: prompt_cache_key) vão direto no corpo, como o cliente openai faz.
+        """
+        lines = []
+        for custom_id, request in requests.items():
+            body = {key: value for key, value in request.items() if key not in ("operation", "fallbacks", "extra_body")}
+            body.update(request.get("extra_body") or {})
+            body.setdefault("model", settings.openai_default_model)
+            lines.append(json.dumps(
+                {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body},
+                ensure_ascii=False
+            ))
+        return "\n".join(lines).encode("utf-8")
+
+    async def _wait(self, batch_id: str) -> Any:
+        """Consulta o lote até um status final; falhas temporárias da consulta não interrompem a espera"""
+        while True:
+            try:
+                batch = await self.async_client.batches.retrieve(batch_id)
+            except (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError) as e:
+                logger.warning(f"Erro ao consultar o lote {batch_id}: {str(e)}")
+            else:
+                if batch.status in BATCH_FINAL_STATUSES:
+                    return batch
+            await asyncio.sleep(settings.openai_batch_poll_interval)
+
+    async def _read_lines(self, file_id: Optional[str]) -> List[Dict[str, Any]]:
+        if not file_id:
+            return []
+        content = await self.async_client.files.content(file_id)
+        return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+    async def submit(self, requests: Dict[str, Dict[str, Any]]) -> str:
+        """Envia as requisições e retorna o id do lote criado"""
+        input_file = await self.async_client.files.create(file=("batch.jsonl", self._jsonl(requests)), purpose="batch")
+        batch = await self.async_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=settings.openai_batch_completion_window
+        )
+        logger.info(f"Lote {batch.id} enviado à OpenAI com {len(requests)} requisições")
+        return batch.id
+
+    async def run(
+        self,
+        requests: Dict[str, Dict[str, Any]],
+        on_submit: Optional[SubmitCallback] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Executa as requisições e retorna, por custom_id, {"content": texto} ou {"error": mensagem}
+
+        `on_submit` recebe o id do lote antes da espera, para que ele possa ser retomado com `resume`.
+        """
+        batch_id = await self.submit(requests)
+        if on_submit:
+            await on_submit(batch_id)
+        return await self.resume(batch_id, requests)
+
+    async def resume(
+        self,
+        batch_id: str,
+        requests: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Aguarda um lote já enviado e retorna seus resultados, no mesmo formato de `run`
+
+        Sem `requests` (ex: após reiniciar a API), as requisições são lidas do arquivo de entrada do lote.
+        """
+        batch = await self._wait(batch_id)
+        logger.info(f"Lote {batch.id} finalizado com status {batch.status}")
+        if requests is None:
+            requests = {line["custom_id"]: line.get("body") or {} for line in await self._read_lines(batch.input_file_id)}
+        if batch.status == "failed" and not batch.output_file_id:
+            errors = "; ".join(error.message or "" for error in (batch.errors.data if batch.errors else []) or [])
+            raise Exception(f"Lote {batch.id} falhou na OpenAI: {errors or 'sem detalhes'}")
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for line in await self._read_lines(batch.output_file_id) + await self._read_lines(batch.error_file_id):
+            custom_id = line.get("custom_id")
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            if response.get("status_code") == 200:
+                request = requests.get(custom_id, {})
+                if body.get("usage"):
+                    metrics.record_openai_usage(
+                        request.get("operation", "batch"), body.get("model", settings.openai_default_model), CompletionUsage(**body["usage"])
+                    )
+                results[custom_id] = {"content": body["choices"][0]["message"]["content"]}
+            else:
+                error = line.get("error") or body.get("error") or {}
+                results[custom_id] = {"error": error.get("message") or f"Status {response.get('status_code')}"}
+
+        # Requisições sem linha de saída (ex: lote expirado antes de processá-las)
+        for custom_id in requests:
+            results.setdefault(custom_id, {"error": f"Sem resultado no lote (status {batch.status})"})
+        return results
+
+class LocalBatchBackend:
+    """Substituto local da Batch API: executa as mesmas requisições como chamadas normais
+
+    Usado em testes e desenvolvimento; passa pelo cache, pelas métricas e pelo agendador
+    do OpenAIService, com o mesmo formato de resultado do OpenAIBatchBackend.
+    """
+
+    def __init__(self, openai_service: OpenAIService):
+        self.openai_service = openai_service
+
+    async def run(
+        self,
+        requests: Dict[str, Dict[str, Any]],
+        on_submit: Optional[SubmitCallback] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Executa as requisições na hora; não há lote para retomar, então `on_submit` não é chamado"""
+        custom_ids = list(requests)
+        outcomes = await asyncio.gather(
+            *(self.openai_service.complete_async(requests[custom_id]) for custom_id in custom_ids),
+            return_exceptions=True
+        )
+        return {
+            custom_id: {"error": str(outcome)} if isinstance(outcome, BaseException) else {"content": outcome}
+            for custom_id, outcome in zip(custom_ids, outcomes)
+        }
+
+BatchBackend = Union[OpenAIBatchBackend, LocalBatchBackend]
+
+def create_batch_backend(backend: str, async_client: AsyncOpenAI, openai_service: OpenAIService) -> BatchBackend:
+    """Cria o executor de lotes configurado em `openai_batch_backend`"""
+    if backend == "openai":
+        return OpenAIBatchBackend(async_client)
+    if backend == "local":
+        return LocalBatchBackend(openai_service)
+    raise ValueError(f"openai_batch_backend inválido: {backend}")
+
+class SessionBatchService:
+    """Processa um lote de sessões já criadas no banco
+
+    Cada áudio é transcrito e anonimizado individualmente (a transcrição é salva assim que
+    fica pronta); as perguntas e análises de todas as sessões vão juntas em um único lote
+    e os resultados são salvos com uma requisição por grupo de colunas.
+    """
+
+    STAGES = ("download", "transcription", "batch", "saving")
+
+    def __init__(
+        self,
+        session_pipeline: SessionPipeline,
+        openai_service: OpenAIService,
+        supabase_service: SupabaseService,
+        batch_backend: BatchBackend,
+        http_client: httpx.AsyncClient
+    ):
+        self.session_pipeline = session_pipeline
+        self.openai_service = openai_service
+        self.supabase_service = supabase_service
+        self.batch_backend = batch_backend
+        # Cliente do pool do Supabase, que já envia a chave usada pelo Storage
+        self.http_client = http_client
+
+    async def _download(self, item: Dict[str, Any]):
+        item["audio_path"] = await download_to_tempfile(
+            self.http_client,
+            item["audio_url"],
+            max_bytes=settings.max_upload_mb * 1024 * 1024,
+            chunk_size=settings.upload_chunk_size,
+            directory=settings.session_job_dir
+        )
+
+    async def _for_each(
+        self,
+        items: List[Dict[str, Any]],
+        step: Callable[[Dict[str, Any]], Any],
+        failed: Dict[str, str],
+        on_item: Optional[ItemCallback]
+    ):
+        """Executa `step` em paralelo (até `session_batch_concurrency` por vez) e registra as falhas por sessão"""
+        semaphore = asyncio.Semaphore(max(1, settings.session_batch_concurrency))
+
+        async def run(item: Dict[str, Any]):
+            async with semaphore:
+                return await step(item)
+
+        outcomes = await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+        for item, outcome in zip(items, outcomes):
+            if isinstance(outcome, BaseException):
+                failed[item["session_id"]] = str(outcome)
+                logger.error(f"Erro na sessão {item['session_id']} do lote: {str(outcome)}")
+                if on_item:
+                    on_item(item["session_id"], "failed", str(outcome))
+
+    async def _save_results(
+        self,
+        sessions: List[Dict[str, Any]],
+        results: Dict[str, Dict[str, Any]],
+        failed: Dict[str, str],
+        on_item: Optional[ItemCallback]
+    ):
+        """Salva os resultados do lote (custom_id "{session_id}:{campo}") e registra as falhas por sessão
+
+        Campos que falharam podem ser gerados com POST /sessions/{id}/reprocess. O id do lote
+        é apagado das sessões salvas.
+        """
+        rows: Dict[str, Dict[str, Any]] = {
+            session["id"]: {
+                "id": session["id"],
+                "psychologist_id": session["psychologist_id"],
+                "patient_id": session["patient_id"],
+                "openai_batch_id": None
+            }
+            for session in sessions
+        }
+        errors: Dict[str, List[str]] = {}
+        for custom_id, result in results.items():
+            session_id, field = custom_id.split(":", 1)
+            if session_id not in rows:
+                # Sessão já salva por outra execução do mesmo lote
+                continue
+            try:
+                if "error" in result:
+                    raise Exception(result["error"])
+                rows[session_id].update(self.openai_service.parse_batch_result(field, result["content"]))
+            except Exception as e:
+                errors.setdefault(session_id, []).append(f"{field}: {str(e)}")
+        await self.supabase_service.update_sessions_async(list(rows.values()))
+
+        for session_id in rows:
+            if session_id in errors:
+                failed[session_id] = "; ".join(errors[session_id])
+                if on_item:
+                    on_item(session_id, "failed", failed[session_id])
+            elif on_item:
+                on_item(session_id, "completed", None)
+
+    async def run(
+        self,
+        items: List[Dict[str, Any]],
+        on_stage: Optional[StageCallback] = None,
+        on_item: Optional[ItemCallback] = None
+    ) -> Dict[str, str]:
+        """Processa as sessões do lote e retorna os erros por sessão (vazio se todas concluíram)
+
+        Cada item tem session_id, psychologist_id, patient_id, patient_name, psychologist_name,
+        filename e `audio_path` (arquivo enviado) ou `audio_url` (arquivo no Storage), e
+        opcionalmente `transcription_backend` (motor de transcrição). Os arquivos temporários são removidos ao final.
+        """
+        failed: Dict[str, str] = {}
+        stage = None
+
+        def notify(status: str):
+            if on_stage:
+                on_stage(stage, status)
+
+        def pending() -> List[Dict[str, Any]]:
+            return [item for item in items if item["session_id"] not in failed]
+
+        try:
+            # 1. Baixa os áudios informados por URL
+            stage = "download"
+            notify("running")
+            await self._for_each([item for item in items if not item.get("audio_path")], self._download, failed, on_item)
+            notify("completed")
+
+            # 2. Transcreve e anonimiza cada áudio
+            stage = "transcription"
+            notify("running")
+
+            async def transcribe(item: Dict[str, Any]):
+                session = await self.session_pipeline.transcribe_session(
+                    item["session_id"], item["audio_path"], item["filename"],
+                    item["patient_name"], item["psychologist_name"],
+                    transcription_backend=item.get("transcription_backend")
+                )
+                item["transcription"] = session["transcription"]
+
+            await self._for_each(pending(), transcribe, failed, on_item)
+            notify("completed")
+
+            # 3. Perguntas e análises de todas as sessões em um único lote
+            stage = "batch"
+            notify("running")
+            requests: Dict[str, Dict[str, Any]] = {}
+            for item in pending():
+                session_requests = await self.openai_service.session_batch_requests_async(
+                    item["transcription"], item["patient_name"], item["psychologist_name"]
+                )
+                for field, request in session_requests.items():
+                    requests[f"{item['session_id']}:{field}"] = request
+            sessions = [
+                {"id": item["session_id"], "psychologist_id": item["psychologist_id"], "patient_id": item["patient_id"]}
+                for item in pending()
+            ]
+
+            async def save_batch_id(batch_id: str):
+                # Permite retomar a espera pelo mesmo lote se a API reiniciar (ver resume)
+                await self.supabase_service.set_sessions_batch_async([session["id"] for session in sessions], batch_id)
+
+            results = await self.batch_backend.run(requests, on_submit=save_batch_id) if requests else {}
+            notify("completed")
+
+            # 4. Salva os resultados
+            stage = "saving"
+            notify("running")
+            await self._save_results(sessions, results, failed, on_item)
+            notify("completed")
+
+            logger.info(f"Lote com {len(items)} sessões processado ({len(failed)} com erro)")
+            return failed
+        except Exception:
+            if stage:
+                notify("failed")
+            raise
+        finally:
+            for item in items:
+                if item.get("audio_path"):
+                    try:
+                        await asyncio.to_thread(os.remove, item["audio_path"])
+                    except OSError:
+                        logger.warning(f"Não foi possível remover o áudio temporário {item['audio_path']}")
+
+    async def resume(
+        self,
+        openai_batch_id: str,
+        on_stage: Optional[StageCallback] = None,
+        on_item: Optional[ItemCallback] = None
+    ) -> Dict[str, str]:
+        """Retoma a espera por um lote já enviado à Batch API e salva os resultados, como `run`
+
+        As sessões são as que ainda têm o `openai_batch_id` registrado; as requisições são
+        lidas do próprio lote, então nada é transcrito ou enviado de novo.
+        """
+        if not isinstance(self.batch_backend, OpenAIBatchBackend):
+            raise ValueError("O executor de lotes configurado não permite retomar lotes")
+
+        failed: Dict[str, str] = {}
+        stage = None
+
+        def notify(status: str):
+            if on_stage:
+                on_stage(stage, status)
+
+        try:
+            for stage in ("download", "transcription"):
+                notify("skipped")
+
+            stage = "batch"
+            notify("running")
+            sessions = await self.supabase_service.get_sessions_by_batch_async(openai_batch_id)
+            results = await self.batch_backend.resume(openai_batch_id)
+            notify("completed")
+
+            stage = "saving"
+            notify("running")
+            await self._save_results(sessions, results, failed, on_item)
+            notify("completed")
+
+            logger.info(f"Lote {openai_batch_id} retomado com {len(sessions)} sessões ({len(failed)} com erro)")
+            return failed
+        except Exception:
+            if stage:
+                notify("failed")
+            raise
@@ -0,0 +1,251 @@
+from app.config import settings
+from app.utils import metrics
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class CacheBackend:
+    """Interface dos backends de cache; valores precisam ser serializáveis em JSON"""
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: int):
+        raise NotImplementedError
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def set_async(self, key: str, value: Any, ttl: int):
+        self.set(key, value, ttl)
+
+class MemoryCacheBackend(CacheBackend):
+    """LRU em memória do processo, limitado pelo tamanho total dos valores"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, size, value = item
+            if expires_at < time.time():
+                del self._items[key]
+                self.size -= size
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int):
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous:
+                self.size -= previous[1]
+            self._items[key] = (time.time() + ttl, size, value)
+            self.size += size
+            # Remove os itens usados há mais tempo até caber no limite
+            while self.size > self.max_bytes:
+                _, (_, evicted_size, _) = self._items.popitem(last=False)
+                self.size -= evicted_size
+
+class DiskCacheBackend(CacheBackend):
+    """Um arquivo JSON por chave, em subdiretórios pelo prefixo do hash"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as cache_file:
+                item = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if item["expires_at"] < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return item["value"]
+
+    def set(self, key: str, value: Any, ttl: int):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escreve em arquivo temporário e renomeia para não deixar entradas pela metade
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as cache_file:
+            json.dump({"expires_at": time.time() + ttl, "value": value}, cache_file, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, value: Any, ttl: int):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+class SupabaseCacheBackend(CacheBackend):
+    """Tabela do Supabase (ver supabase/migrations) compartilhada entre instâncias da API"""
+
+    def __init__(self, supabase_service: Any, table: str):
+        self.supabase_service = supabase_service
+        self.table = table
+
+    def _expires_at(self, ttl: int) -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl))
+
+    def _now(self) -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    def get(self, key: str) -> Optional[Any]:
+        response = (
+            self.supabase_service.client.table(self.table)
+            .select("value")
+            .eq("key", key)
+            .gt("expires_at", self._now())
+            .execute()
+        )
+        return response.data[0]["value"] if response.data else None
+
+    def set(self, key: str, value: Any, ttl: int):
+        self.supabase_service.client.table(self.table).upsert(
+            {"key": key, "value": value, "expires_at": self._expires_at(ttl)}
+        ).execute()
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        response = await (
+            self.supabase_service.async_client.table(self.table)
+            .select("value")
+            .eq("key", key)
+            .gt("expires_at", self._now())
+            .execute()
+        )
+        return response.data[0]["value"] if response.data else None
+
+    async def set_async(self, key: str, value: Any, ttl: int):
+        await self.supabase_service.async_client.table(self.table).upsert(
+            {"key": key, "value": value, "expires_at": self._expires_at(ttl)}
+        ).execute()
+
+class CacheService:
+    """Cache endereçado por conteúdo para transcrições e respostas da OpenAI
+
+    As chaves são hashes do conteúdo (bytes do áudio ou prompt, modelo e parâmetros),
+    então reenvios idênticos não fazem novas chamadas. Erros do backend são tratados
+    como cache miss para nunca interromper o processamento.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(namespace: str, *parts: Any) -> str:
+        """Chave `namespace:sha256` a partir das partes que determinam o resultado"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def _count(self, key: str, event: str):
+        namespace = key.split(":", 1)[0]
+        counters = self.stats.setdefault(namespace, {"hits": 0, "misses": 0, "errors": 0})
+        counters[event] += 1
+        metrics.CACHE_EVENTS.labels(namespace, event).inc()
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Erro ao ler o cache: {str(e)}")
+            self._count(key, "errors")
+            return None
+        self._count(key, "hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: Any):
+        if not self.enabled or value is None:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar no cache: {str(e)}")
+            self._count(key, "errors")
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        try:
+            value = await self.backend.get_async(key)
+        except Exception as e:
+            logger.warning(f"Erro ao ler o cache: {str(e)}")
+            self._count(key, "errors")
+            return None
+        self._count(key, "hits" if value is not None else "misses")
+        return value
+
+    async def set_async(self, key: str, value: Any):
+        if not self.enabled or value is None:
+            return
+        try:
+            await self.backend.set_async(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar no cache: {str(e)}")
+            self._count(key, "errors")
+
+def hash_file(path: str, block_size: int = 1024 * 1024) -> str:
+    """sha256 do arquivo lido em blocos"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def create_cache_backend(backend: str, supabase_service: Any = None) -> Optional[CacheBackend]:
+    """Cria o backend configurado em `cache_backend`"""
+    if backend == "memory":
+        return MemoryCacheBackend(settings.cache_memory_max_mb * 1024 * 1024)
+    if backend == "disk":
+        return DiskCacheBackend(settings.cache_dir)
+    if backend == "supabase":
+        if supabase_service is None:
+            from app.services.supabase_service import SupabaseService
+            supabase_service = SupabaseService()
+        return SupabaseCacheBackend(supabase_service, settings.cache_supabase_table)
+    if backend in ("none", ""):
+        return None
+    raise ValueError(f"Backend de cache desconhecido: {backend}")
+
+_default_cache: Optional[CacheService] = None
+
+def get_cache() -> CacheService:
+    """Cache compartilhado pelos serviços do processo"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CacheService(create_cache_backend(settings.cache_backend), settings.cache_ttl)
+    return _default_cache
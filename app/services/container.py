@@ -0,0 +1,85 @@
+from openai import AsyncOpenAI
+from app.config import settings
+from app.services.audio_service import AudioService
+from app.services.batch_service import SessionBatchService, create_batch_backend
+from app.services.cache_service import CacheService, create_cache_backend
+from app.services.job_service import JobService
+from app.services.openai_service import OpenAIService
+from app.services.pipeline_service import SessionPipeline
+from app.services.rate_limiter import get_scheduler
+from app.services.supabase_service import SupabaseService
+from typing import Optional
+import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def create_http_client(timeout: Optional[float] = None) -> httpx.AsyncClient:
+    """Cliente HTTP com pool de conexões, keep-alive e HTTP/2 configurados em Settings"""
+    http2 = settings.http_http2
+    if http2 and not _http2_available():
+        logger.warning("Pacote h2 não instalado; usando HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry
+        ),
+        timeout=httpx.Timeout(timeout, connect=settings.http_connect_timeout)
+    )
+
+class ServiceContainer:
+    """Serviços compartilhados por todas as rotas, com um pool HTTP por upstream
+
+    Criado no startup da aplicação (lifespan em app/main.py) e fechado no shutdown.
+    """
+
+    def __init__(self):
+        # A biblioteca da OpenAI define o timeout de cada requisição
+        self.openai_http = create_http_client()
+        self.supabase_http = create_http_client(settings.supabase_timeout)
+
+        # Com o agendador as retentativas são dele (respeitando Retry-After); o cliente não repete
+        self.openai_scheduler = get_scheduler() if settings.openai_scheduler_enabled else None
+        self.openai_client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            http_client=self.openai_http,
+            max_retries=0 if self.openai_scheduler else 2
+        )
+        self.supabase_service = SupabaseService(http_client=self.supabase_http)
+        self.cache = CacheService(
+            create_cache_backend(settings.cache_backend, self.supabase_service),
+            settings.cache_ttl
+        )
+        self.openai_service = OpenAIService(
+            cache=self.cache, async_client=self.openai_client, scheduler=self.openai_scheduler
+        )
+        self.audio_service = AudioService(
+            cache=self.cache, async_client=self.openai_client, scheduler=self.openai_scheduler
+        )
+        self.session_pipeline = SessionPipeline(self.audio_service, self.openai_service, self.supabase_service)
+        self.batch_service = SessionBatchService(
+            self.session_pipeline,
+            self.openai_service,
+            self.supabase_service,
+            create_batch_backend(settings.openai_batch_backend, self.openai_client, self.openai_service),
+            self.supabase_http
+        )
+        self.job_service = JobService()
+
+    async def aclose(self):
+        """Interrompe os jobs em andamento e fecha os pools de conexões"""
+        await self.job_service.aclose()
+        await self.audio_service.close_backends()
+        await self.openai_http.aclose()
+        await self.supabase_http.aclose()
+        logger.info("Conexões HTTP encerradas")
@@ -0,0 +1,130 @@
+from app.config import settings
+from app.utils.metrics import stop_server_timing
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class JobService:
+    """Fila em memória de processamentos em segundo plano com status por etapa
+
+    Os jobs rodam em um pool limitado a `session_job_workers` execuções simultâneas.
+    O status fica apenas na memória do processo; jobs finalizados são descartados
+    após `session_job_ttl` segundos.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or settings.session_job_workers
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._finished_at: Dict[str, float] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _now(self) -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def _prune(self):
+        """Remove jobs finalizados há mais tempo que o TTL"""
+        limit = time.monotonic() - settings.session_job_ttl
+        for job_id in [job_id for job_id, finished in self._finished_at.items() if finished < limit]:
+            self._jobs.pop(job_id, None)
+            self._finished_at.pop(job_id, None)
+
+    def create_job(
+        self,
+        job_id: str,
+        session_id: Optional[str],
+        stages: Iterable[str],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Registra um novo job com todas as etapas pendentes
+
+        `metadata` adiciona campos ao job (ex: o status de cada sessão de um lote).
+        """
+        self._prune()
+        now = self._now()
+        job = {
+            "job_id": job_id,
+            "session_id": session_id,
+            "status": "queued",
+            "stages": {stage: {"status": "pending", "started_at": None, "finished_at": None} for stage in stages},
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            **(metadata or {})
+        }
+        self._jobs[job_id] = job
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def update_stage(self, job_id: str, stage: str, status: str):
+        """Atualiza o status de uma etapa do job"""
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        now = self._now()
+        stage_info = job["stages"].setdefault(stage, {"status": "pending", "started_at": None, "finished_at": None})
+        stage_info["status"] = status
+        if status == "running":
+            stage_info["started_at"] = now
+        else:
+            stage_info["finished_at"] = now
+        job["updated_at"] = now
+
+    def update_item(self, job_id: str, item_id: str, status: str, error: Optional[str] = None):
+        """Atualiza o status de um item de um job em lote (ver `metadata` em create_job)"""
+        job = self._jobs.get(job_id)
+        if not job or "items" not in job:
+            return
+        job["items"][item_id] = {"status": status, "error": error}
+        job["updated_at"] = self._now()
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None):
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        job["status"] = status
+        job["error"] = error
+        job["updated_at"] = self._now()
+        self._finished_at[job_id] = time.monotonic()
+
+    def submit(self, job_id: str, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any):
+        """Agenda a execução de uma corrotina no pool de workers"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        task = asyncio.create_task(self._run(job_id, func, *args, **kwargs))
+        # Mantém referência para a task não ser coletada antes de terminar
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job_id: str, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any):
+        # A task herda o contexto da requisição que criou o job, que já foi respondida
+        stop_server_timing()
+        async with self._semaphore:
+            job = self._jobs.get(job_id)
+            if job:
+                job["status"] = "running"
+                job["updated_at"] = self._now()
+            try:
+                await func(*args, **kwargs)
+                self._finish(job_id, "completed")
+                logger.info(f"Job {job_id} concluído")
+            except Exception as e:
+                logger.error(f"Erro no job {job_id}: {str(e)}")
+                self._finish(job_id, "failed", str(e))
+
+    async def aclose(self):
+        """Cancela os jobs em andamento (usado no desligamento da API)"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for job_id, job in self._jobs.items():
+            if job["status"] in ("queued", "running"):
+                self._finish(job_id, "failed", "Processamento interrompido pelo desligamento da API")
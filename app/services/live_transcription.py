@@ -0,0 +1,141 @@
+from app.config import settings
+from app.services.anonymization_service import AnonymizationService
+from app.services.audio_service import AudioService
+from app.services.supabase_service import SupabaseService
+from app.services.pipeline_service import ANALYSIS_FIELDS
+from app.utils import metrics
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Callback chamado a cada segmento salvo (ou que falhou), na ordem em que foi gravado
+SegmentCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class LiveStreamLimitError(Exception):
+    """O cliente ultrapassou um limite do stream (tamanho da mensagem ou segmentos pendentes)"""
+
+class LiveTranscription:
+    """Transcreve uma sessão em segmentos enquanto o áudio ainda está sendo gravado
+
+    Cada segmento é transcrito e anonimizado assim que termina (até
+    `transcription_max_concurrency` ao mesmo tempo) e anexado à transcrição salva, sempre
+    na ordem de gravação. Ao encerrar, resta só o último segmento; as perguntas e análises
+    ficam para o SessionPipeline.
+    """
+
+    # Sessões com um stream aberto neste processo (um stream por sessão)
+    active: Set[str] = set()
+
+    def __init__(
+        self,
+        session: Dict[str, Any],
+        audio_service: AudioService,
+        anonymization_service: AnonymizationService,
+        supabase_service: SupabaseService,
+        patient_name: str,
+        psychologist_name: str,
+        on_segment: Optional[SegmentCallback] = None,
+        transcription_backend: Optional[str] = None
+    ):
+        self.session_id = str(session["id"])
+        self.session = session
+        self.audio_service = audio_service
+        self.anonymization_service = anonymization_service
+        self.supabase_service = supabase_service
+        self.patient_name = patient_name
+        self.psychologist_name = psychologist_name
+        self.on_segment = on_segment
+        self.transcription_backend = transcription_backend
+        # Um novo stream continua a transcrição já salva (ex: reconexão)
+        self.transcription = session.get("transcription") or ""
+        self.segments = 0
+        self.failed_segments = 0
+        self._semaphore = asyncio.Semaphore(max(1, settings.transcription_max_concurrency))
+        # Limitada: um cliente que envia áudio mais rápido do que ele é transcrito não acumula memória
+        self._queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(max(1, settings.live_max_pending_segments))
+        self._committer: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "LiveTranscription":
+        if self.session_id in self.active:
+            raise RuntimeError("Já existe uma transmissão aberta para esta sessão")
+        self.active.add(self.session_id)
+        metrics.LIVE_STREAMS_IN_PROGRESS.inc()
+        self._committer = asyncio.create_task(self._commit_segments())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.active.discard(self.session_id)
+        metrics.LIVE_STREAMS_IN_PROGRESS.dec()
+        if self._committer and not self._committer.done():
+            # Saída sem finish() (ex: erro): descarta os segmentos pendentes
+            self._committer.cancel()
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item:
+                    item["task"].cancel()
+
+    def add_segment(self, audio: bytes, filename: str, start: Optional[float] = None):
+        """Agenda a transcrição de um segmento terminado (arquivo de áudio completo)
+
+        Lança LiveStreamLimitError se já houver `live_max_pending_segments` segmentos na fila.
+        """
+        if self._queue.full():
+            raise LiveStreamLimitError(
+                f"Mais de {self._queue.maxsize} segmentos aguardando transcrição; envie o áudio em tempo real"
+            )
+        index = self.segments
+        self.segments += 1
+        task = asyncio.create_task(self._transcribe(audio, filename))
+        self._queue.put_nowait({"index": index, "start": start, "task": task})
+
+    async def _transcribe(self, audio: bytes, filename: str) -> str:
+        async with self._semaphore:
+            result = await self.audio_service.transcribe_audio_segments_async(audio, filename, self.transcription_backend)
+        text = result["text"].strip()
+        if not text:
+            return ""
+        return await self.anonymization_service.anonymize_async(text, self.patient_name, self.psychologist_name)
+
+    async def _commit_segments(self):
+        """Anexa os segmentos à transcrição na ordem de gravação, salvando a cada um"""
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            event = {"index": item["index"], "start": item["start"]}
+            try:
+                text = await item["task"]
+                if text:
+                    self.transcription = f"{self.transcription} {text}".strip()
+                    await self.supabase_service.update_session_async(self.session_id, {"transcription": self.transcription})
+                metrics.LIVE_SEGMENTS.labels("success").inc()
+                event.update(type="segment", text=text)
+            except Exception as e:
+                # O segmento fica fora da transcrição; os seguintes continuam
+                logger.error(f"Erro ao transcrever o segmento {item['index']} da sessão {self.session_id}: {str(e)}")
+                metrics.LIVE_SEGMENTS.labels("error").inc()
+                self.failed_segments += 1
+                event.update(type="segment_error", error=str(e))
+            if self.on_segment:
+                try:
+                    await self.on_segment(event)
+                except Exception as e:
+                    # Cliente desconectado: a transcrição continua sendo salva
+                    logger.warning(f"Não foi possível notificar o segmento {item['index']} da sessão {self.session_id}: {str(e)}")
+
+    async def finish(self) -> Dict[str, Any]:
+        """Espera os segmentos pendentes e retorna a sessão pronta para as análises
+
+        Se o stream acrescentou texto a uma sessão que já tinha perguntas ou análises,
+        elas são apagadas para serem geradas de novo com a transcrição completa.
+        """
+        await self._queue.put(None)
+        await self._committer
+
+        stale = [field for field in ("questions", "answers", *ANALYSIS_FIELDS) if self.session.get(field)]
+        if self.transcription != (self.session.get("transcription") or "") and stale:
+            logger.info(f"Transcrição da sessão {self.session_id} mudou; descartando {', '.join(stale)}")
+            return await self.supabase_service.update_session_async(self.session_id, {field: None for field in stale})
+        return {**self.session, "transcription": self.transcription or None}
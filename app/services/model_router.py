@@ -0,0 +1,127 @@
+from app.config import ModelRoute, settings
+from app.utils.tokens import context_window
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+import asyncio
+import logging
+import openai
+import random
+
+logger = logging.getLogger(__name__)
+
+# Falhas após as quais a etapa tenta o próximo modelo da rota; as temporárias já foram
+# repetidas pelo agendador (ou pelo cliente openai) antes de chegar aqui
+FALLBACK_ERRORS = (openai.APIError, asyncio.TimeoutError)
+
+class RoutePlan(NamedTuple):
+    """Como executar uma chamada: modelos na ordem de tentativa e parâmetros da etapa"""
+    models: List[str]
+    temperature: float
+    options: Dict[str, Any]
+    timeout: Optional[float]
+    canary: bool
+
+class ModelRouter:
+    """Escolhe modelo, temperatura e max_tokens de cada etapa pela tabela `openai_model_routes`
+
+    A etapa é o `operation` da requisição (ex: "patient_demand", "conclusion"). Etapas sem
+    rota usam o modelo da própria requisição ou `openai_default_model`. Com `canary_percent`,
+    essa fração das chamadas vai primeiro para `canary_model`; o modelo principal vira o
+    primeiro fallback. As métricas por modelo (psiapi_openai_request_duration_seconds)
+    permitem comparar a latência das duas variantes.
+    """
+
+    def __init__(
+        self,
+        routes: Optional[Dict[str, ModelRoute]] = None,
+        default_model: Optional[str] = None,
+        rng: Callable[[], float] = random.random
+    ):
+        self.routes = settings.openai_model_routes if routes is None else routes
+        self.default_model = default_model or settings.openai_default_model
+        self.rng = rng
+
+    def primary_model(self, operation: str, model: Optional[str] = None) -> str:
+        """Modelo principal da etapa (sem canário nem fallbacks)"""
+        route = self.routes.get(operation)
+        return (route.model if route else None) or model or self.default_model
+
+    def candidates(self, operation: str, model: Optional[str] = None) -> List[str]:
+        """Todos os modelos que a etapa pode usar (principal, canário e fallbacks)"""
+        route = self.routes.get(operation)
+        models = [self.primary_model(operation, model)]
+        if route:
+            models = [route.canary_model] + models if route.canary_model else models
+            models += route.fallbacks
+        return list(dict.fromkeys(models))
+
+    def context_window(self, operation: str, model: Optional[str] = None) -> int:
+        """Menor janela de contexto entre os candidatos: o prompt precisa caber em qualquer um"""
+        return min(context_window(candidate) for candidate in self.candidates(operation, model))
+
+    def output_tokens(self, operation: str) -> int:
+        """Tokens reservados para a resposta da etapa"""
+        route = self.routes.get(operation)
+        return (route.max_tokens if route else None) or settings.openai_output_reserve_tokens
+
+    def plan(
+        self,
+        operation: str,
+        model: Optional[str],
+        temperature: float,
+        options: Dict[str, Any],
+        fallbacks: Optional[List[str]] = None
+    ) -> RoutePlan:
+        """Plano de uma chamada da etapa
+
+        `fallbacks` já definidos (requisição roteada antes, ex: lotes) mantêm o modelo da
+        requisição e não sorteiam o canário de novo.
+        """
+        route = self.routes.get(operation)
+        timeout = route.timeout if route else None
+        if fallbacks is not None:
+            return RoutePlan(list(dict.fromkeys([model or self.default_model, *fallbacks])), temperature, options, timeout, False)
+
+        models = [self.primary_model(operation, model)]
+        canary = False
+        if route:
+            if route.temperature is not None:
+                temperature = route.temperature
+            if route.max_tokens is not None:
+                options = {**options, "max_tokens": route.max_tokens}
+            if route.canary_model and self.rng() * 100 < route.canary_percent:
+                models.insert(0, route.canary_model)
+                canary = True
+            models += route.fallbacks
+        return RoutePlan(list(dict.fromkeys(models)), temperature, options, timeout, canary)
+
+    def variant(self, plan: RoutePlan, index: int) -> str:
+        """Papel do modelo na tentativa `index`, para as métricas"""
+        if index == 0:
+            return "canary" if plan.canary else "primary"
+        return "primary" if plan.canary and index == 1 else "fallback"
+
+    def route_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Requisição com o plano aplicado (modelo, temperatura, max_tokens e `fallbacks`)
+
+        Usado quando a requisição é montada antes de ser executada (ex: lotes), para que
+        o sorteio do canário aconteça uma vez só.
+        """
+        options = {key: value for key, value in request.items() if key not in ("messages", "temperature", "model", "operation")}
+        plan = self.plan(request.get("operation", "chat"), request.get("model"), request["temperature"], options)
+        return {
+            "operation": request.get("operation", "chat"),
+            "messages": request["messages"],
+            "temperature": plan.temperature,
+            "model": plan.models[0],
+            "fallbacks": plan.models[1:],
+            **plan.options
+        }
+
+_default_router: Optional[ModelRouter] = None
+
+def get_router() -> ModelRouter:
+    """Roteador com a tabela de Settings, compartilhado pelos serviços do processo"""
+    global _default_router
+    if _default_router is None:
+        _default_router = ModelRouter()
+    return _default_router
@@ -1,350 +1,799 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
 from app.config import settings
-from typing import Dict
+from app.models.session import SessionUpdate
+from app.prompts import get_prompt
+from app.services.cache_service import CacheService, get_cache
+from app.services.model_router import FALLBACK_ERRORS, ModelRouter, RoutePlan, get_router
+from app.services.rate_limiter import BATCH, INTERACTIVE, OpenAIScheduler, estimate_tokens, get_scheduler
+from app.utils import metrics
+from app.utils.retrieval import BM25Index
+from app.utils.sync import run_sync
+from app.utils.tokens import count_message_tokens, count_tokens, split_by_tokens
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Campos gerados pela chamada única do modo combinado
+COMBINED_ANALYSIS_FIELDS = ("full_summary", "anonymous_summary", "patient_demand", "context", "analise_da_ia", "questions")
+
+COMBINED_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "full_summary": {"type": "string"},
+        "anonymous_summary": {"type": "string"},
+        "patient_demand": {"type": "string"},
+        "context": {"type": "string"},
+        "analise_da_ia": {"type": "string"},
+        "questions": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": list(COMBINED_ANALYSIS_FIELDS),
+    "additionalProperties": False
+}
+
+# Operações com o usuário esperando a resposta; passam na frente na fila do agendador
+INTERACTIVE_OPERATIONS = {"conclusion"}
+
+class SessionAnalysisError(Exception):
+    """Falha em uma ou mais análises da sessão, mantendo os resultados parciais"""
+    
+    def __init__(self, results: Dict[str, Optional[str]], errors: Dict[str, str]):
+        self.results = results
+        self.errors = errors
+        details = "; ".join(f"{field}: {error}" for field, error in errors.items())
+        super().__init__(f"Falha ao gerar análises da sessão ({details})")
 
 class OpenAIService:
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.openai_api_key)
+    def __init__(
+        self,
+        cache: Optional[CacheService] = None,
+        async_client: Optional[AsyncOpenAI] = None,
+        scheduler: Optional[OpenAIScheduler] = None,
+        router: Optional[ModelRouter] = None
+    ):
+        # A API recebe o cliente assíncrono compartilhado (ver app/services/container.py)
+        self.async_client = async_client or AsyncOpenAI(api_key=settings.openai_api_key)
+        self.cache = cache or get_cache()
+        # Sem agendador, as chamadas assíncronas usam apenas as retentativas do cliente openai
+        if scheduler is None and settings.openai_scheduler_enabled:
+            scheduler = get_scheduler()
+        self.scheduler = scheduler
+        self.router = router or get_router()
+        # Resumos por trecho em andamento, compartilhados pelas análises da mesma transcrição
+        self._map_tasks: Dict[Tuple[str, str], asyncio.Future] = {}
     
-    def generate_full_summary(self, transcription: str) -> str:
-        """Gera resumo completo da transcrição"""
-        prompt = f"""Analise a seguinte transcrição de uma sessão de psicoterapia e gere um resumo completo e detalhado.
-
-Transcrição:
-{transcription}
-
-Resumo completo:"""
+    @contextmanager
+    def _observe(self, operation: str, model: str):
+        """Registra latência, chamadas em andamento e falhas de uma chamada à OpenAI"""
+        in_progress = metrics.OPENAI_REQUESTS_IN_PROGRESS.labels(operation)
+        in_progress.inc()
+        started_at = time.perf_counter()
+        status = "error"
+        try:
+            yield
+            status = "success"
+        finally:
+            in_progress.dec()
+            metrics.observe_openai_request(operation, model, status, time.perf_counter() - started_at)
+    
+    async def _create_async(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        priority: int,
+        **params: Any
+    ) -> Any:
+        """Chama chat.completions.create pelo agendador (limites por modelo e retentativas)"""
+        if self.scheduler is None:
+            return await self.async_client.chat.completions.create(model=model, messages=messages, **params)
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em análise de sessões de psicoterapia."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
+        raw = await self.scheduler.run(
+            model,
+            lambda: self.async_client.chat.completions.with_raw_response.create(model=model, messages=messages, **params),
+            priority=priority,
+            tokens=estimate_tokens(messages, params.get("max_tokens"))
         )
+        return raw.parse()
+    
+    @asynccontextmanager
+    async def _stream_async(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        priority: int,
+        **params: Any
+    ) -> AsyncIterator[Any]:
+        """Versão de _create_async com stream=True: a vaga do agendador fica ocupada até o stream ser lido"""
+        if self.scheduler is None:
+            stream = await self.async_client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+            try:
+                yield stream
+            finally:
+                await stream.close()
+            return
         
-        return response.choices[0].message.content
+        async with self.scheduler.stream(
+            model,
+            lambda: self.async_client.chat.completions.with_raw_response.create(
+                model=model, messages=messages, stream=True, **params
+            ),
+            priority=priority,
+            tokens=estimate_tokens(messages, params.get("max_tokens"))
+        ) as raw:
+            stream = raw.parse()
+            try:
+                yield stream
+            finally:
+                await stream.close()
     
-    def generate_anonymous_summary(self, transcription: str) -> str:
-        """Gera resumo anonimizado (sem nomes, dados pessoais)"""
-        prompt = f"""Analise a seguinte transcrição de uma sessão de psicoterapia e gere um resumo anonimizado que:
-1. Remova todos os nomes próprios
-2. Remova dados pessoais identificáveis (endereços, telefones, etc.)
-3. Seja mais superficial e genérico
-4. Pode ser compartilhado com outros profissionais sem expor o paciente
-5. Mantenha apenas informações clínicas relevantes de forma genérica
-
-Transcrição:
-{transcription}
-
-Resumo anonimizado:"""
+    def _cache_key(self, messages: List[Dict[str, str]], temperature: float, model: str, options: Dict[str, Any]) -> str:
+        """Chave do cache: prompt completo (template + texto), modelo e parâmetros"""
+        return self.cache.make_key("chat", model, temperature, messages, options)
+    
+    def _fallback(self, operation: str, plan: RoutePlan, index: int, error: Exception) -> bool:
+        """Registra a falha do modelo `index` do plano; True se há outro modelo para tentar"""
+        model = plan.models[index]
+        if index + 1 >= len(plan.models):
+            return False
+        reason = "timeout" if isinstance(error, asyncio.TimeoutError) else type(error).__name__
+        metrics.OPENAI_FALLBACKS.labels(operation, model).inc()
+        logger.warning(f"{operation}: {model} falhou ({reason}); tentando {plan.models[index + 1]}")
+        return True
+    
+    async def _acomplete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        model: Optional[str] = None,
+        operation: str = "chat",
+        fallbacks: Optional[List[str]] = None,
+        **options: Any
+    ) -> str:
+        """Executa uma chamada de chat e retorna o texto gerado
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em anonimização de dados clínicos, garantindo privacidade e conformidade ética."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
+        `operation` identifica a etapa na tabela de rotas (modelo, temperatura, max_tokens e
+        fallbacks; ver ModelRouter) e nas métricas (latência, tokens e custo).
+        """
+        plan = self.router.plan(operation, model, temperature, options, fallbacks)
+        priority = INTERACTIVE if operation in INTERACTIVE_OPERATIONS else BATCH
+        for index, model in enumerate(plan.models):
+            cache_key = self._cache_key(messages, plan.temperature, model, plan.options)
+            cached = await self.cache.get_async(cache_key)
+            if cached is not None:
+                return cached
+            
+            metrics.OPENAI_ROUTED_CALLS.labels(operation, model, self.router.variant(plan, index)).inc()
+            try:
+                with self._observe(operation, model):
+                    # O timeout da rota inclui a fila e as retentativas do agendador
+                    response = await asyncio.wait_for(
+                        self._create_async(messages, model, priority, temperature=plan.temperature, **plan.options),
+                        plan.timeout
+                    )
+            except FALLBACK_ERRORS as e:
+                if not self._fallback(operation, plan, index, e):
+                    raise
+                continue
+            metrics.record_openai_usage(operation, model, response.usage)
+            
+            content = response.choices[0].message.content
+            await self.cache.set_async(cache_key, content)
+            return content
+    
+    async def _astream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        model: Optional[str] = None,
+        operation: str = "chat",
+        fallbacks: Optional[List[str]] = None,
+        **options: Any
+    ) -> AsyncIterator[str]:
+        """Versão de _acomplete com stream=True; gera os trechos de texto à medida que chegam
         
-        return response.choices[0].message.content
+        O texto completo só vai para o cache se o stream terminar; uma resposta em
+        cache é enviada de uma vez. O fallback para outro modelo só acontece antes do
+        primeiro trecho ser enviado.
+        """
+        plan = self.router.plan(operation, model, temperature, options, fallbacks)
+        for index, model in enumerate(plan.models):
+            cache_key = self._cache_key(messages, plan.temperature, model, plan.options)
+            cached = await self.cache.get_async(cache_key)
+            if cached is not None:
+                yield cached
+                return
+            
+            metrics.OPENAI_ROUTED_CALLS.labels(operation, model, self.router.variant(plan, index)).inc()
+            parts = []
+            try:
+                with self._observe(operation, model):
+                    async with AsyncExitStack() as stack:
+                        # Streams sempre têm alguém acompanhando a resposta: prioridade interativa.
+                        # O timeout vale até a resposta começar; a leitura do texto não tem limite
+                        stream = await asyncio.wait_for(
+                            stack.enter_async_context(self._stream_async(
+                                messages,
+                                model,
+                                INTERACTIVE,
+                                temperature=plan.temperature,
+                                # O último evento traz response.usage para as métricas de tokens
+                                stream_options={"include_usage": True},
+                                **plan.options
+                            )),
+                            plan.timeout
+                        )
+                        
+                        async for chunk in stream:
+                            if getattr(chunk, "usage", None):
+                                metrics.record_openai_usage(operation, model, chunk.usage)
+                            if not chunk.choices:
+                                continue
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+            except FALLBACK_ERRORS as e:
+                if parts or not self._fallback(operation, plan, index, e):
+                    raise
+                continue
+            
+            await self.cache.set_async(cache_key, "".join(parts))
+            return
     
-    def generate_patient_demand(self, transcription: str) -> str:
-        """Identifica a demanda trazida pelo paciente"""
-        prompt = f"""Analise a seguinte transcrição de uma sessão de psicoterapia e identifique qual foi a demanda principal trazida pelo paciente nesta sessão.
-
-Transcrição:
-{transcription}
-
-Demanda do paciente:"""
+    def _prompt_request(self, name: str, **values: Any) -> Dict[str, Any]:
+        """Operação e mensagens do template `name` do registro de prompts (app/prompts.py)
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em identificar demandas e necessidades em sessões de psicoterapia."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
+        O prefixo fixo do template vem antes dos dados da chamada, para aproveitar o cache
+        de prompts da OpenAI; `prompt_cache_key` identifica o template e a versão. Ele vai em
+        `extra_body`, que o cliente openai repassa no corpo da requisição em qualquer versão.
+        """
+        template = get_prompt(name)
+        request: Dict[str, Any] = {"operation": name, "messages": template.render(**values)}
+        if settings.openai_prompt_cache_key:
+            request["extra_body"] = {"prompt_cache_key": template.cache_key}
+        return request
+    
+    def _map_request(self, chunk: str, index: int, total: int, model: str) -> Dict[str, Any]:
+        """Monta a requisição que resume um trecho da transcrição (etapa map)"""
+        return {
+            **self._prompt_request("map_summary", chunk=chunk, index=index, total=total),
+            "temperature": 0.2,
+            "model": model
+        }
+    
+    def _reduce_request(self, summaries: str, model: str) -> Dict[str, Any]:
+        """Monta a requisição que junta resumos de trechos consecutivos (etapa reduce)"""
+        return {
+            **self._prompt_request("reduce_summary", summaries=summaries),
+            "temperature": 0.2,
+            "model": model
+        }
+    
+    def _map_model(self, model: str) -> str:
+        """Modelo dos resumos por trecho: rota "map_summary", `openai_map_model` ou o da análise"""
+        return self.router.primary_model("map_summary", settings.openai_map_model or model)
+    
+    def _chunk_tokens(self, model: str) -> int:
+        """Tamanho dos trechos do map para o modelo: o que cabe no contexto, até `openai_map_chunk_tokens`"""
+        overhead = count_message_tokens(self._map_request("", 1, 1, model)["messages"], model)
+        available = (
+            self.router.context_window("map_summary", model) - overhead - self.router.output_tokens("map_summary")
         )
+        return max(256, min(settings.openai_map_chunk_tokens, available))
+    
+    def _transcription_budget(self, request: Dict[str, Any]) -> Tuple[str, int]:
+        """Modelo da requisição e tokens que sobram para a transcrição no seu prompt
         
-        return response.choices[0].message.content
+        `request` é a requisição montada com a transcrição vazia.
+        """
+        operation = request.get("operation", "chat")
+        model = self.router.primary_model(operation, request.get("model"))
+        overhead = count_message_tokens(request["messages"], model)
+        window = self.router.context_window(operation, request.get("model"))
+        return model, window - overhead - self.router.output_tokens(operation)
     
-    def generate_context(self, transcription: str) -> str:
-        """Gera contexto da sessão"""
-        prompt = f"""Analise a seguinte transcrição de uma sessão de psicoterapia e gere um resumo do contexto da sessão, incluindo:
-- Situação atual do paciente
-- Temas principais discutidos
-- Dinâmica da sessão
-- Observações relevantes
-
-Transcrição:
-{transcription}
-
-Contexto:"""
+    def _condensed_text(self, summaries: List[str]) -> str:
+        """Texto que substitui a transcrição nos prompts das análises"""
+        parts = [f"Trecho {index}/{len(summaries)}:\n{summary}" for index, summary in enumerate(summaries, start=1)]
+        header = f"[Transcrição longa, resumida em {len(summaries)} trechos consecutivos]"
+        return "\n\n".join([header, *parts])
+    
+    async def _map_summaries_async(self, transcription: str, model: str) -> List[str]:
+        """Resume os trechos da transcrição em paralelo (etapa map)
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em análise contextual de sessões de psicoterapia."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
+        Análises da mesma transcrição chamadas ao mesmo tempo aguardam a mesma execução.
+        """
+        async def summarize() -> List[str]:
+            chunks = await asyncio.to_thread(split_by_tokens, transcription, self._chunk_tokens(model), model)
+            logger.info(f"Transcrição longa; resumindo {len(chunks)} trechos com {model}")
+            return await asyncio.gather(*(
+                self._acomplete(**self._map_request(chunk, index, len(chunks), model))
+                for index, chunk in enumerate(chunks, start=1)
+            ))
         
-        return response.choices[0].message.content
+        key = (hashlib.sha256(transcription.encode("utf-8")).hexdigest(), model)
+        task = self._map_tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(summarize())
+            self._map_tasks[key] = task
+            task.add_done_callback(lambda _: self._map_tasks.pop(key, None))
+        # shield: o cancelamento de uma análise (ex: timeout) não interrompe as demais
+        return list(await asyncio.shield(task))
     
-    def generate_ia_analysis(self, transcription: str) -> str:
+    async def _fitted_request_async(self, build: Callable[[str], Dict[str, Any]], transcription: str) -> Dict[str, Any]:
+        """Requisição de `build` com a transcrição inteira ou, se ela não couber no contexto
+        do modelo, condensada por map-reduce
+        
+        Map: a transcrição é dividida em trechos de até `_chunk_tokens` tokens, resumidos em
+        paralelo. Reduce: enquanto os resumos juntos não couberem, são agrupados e resumidos
+        de novo. O resultado substitui a transcrição no prompt da análise.
+        """
+        model, budget = self._transcription_budget(build(""))
+        if await asyncio.to_thread(count_tokens, transcription, model) <= budget:
+            return build(transcription)
+        
+        map_model = self._map_model(model)
+        text = self._condensed_text(await self._map_summaries_async(transcription, map_model))
+        for _ in range(settings.openai_max_reduce_rounds):
+            if await asyncio.to_thread(count_tokens, text, model) <= budget:
+                return build(text)
+            groups = await asyncio.to_thread(split_by_tokens, text, self._chunk_tokens(map_model), map_model)
+            summaries = await asyncio.gather(*(self._acomplete(**self._reduce_request(group, map_model)) for group in groups))
+            text = self._condensed_text(list(summaries))
+        raise ValueError(f"Transcrição longa demais para {model} mesmo após {settings.openai_max_reduce_rounds} rodadas de resumo")
+    
+    def _full_summary_request(self, transcription: str) -> Dict[str, Any]:
+        """Monta a requisição de generate_full_summary_async"""
+        return {**self._prompt_request("full_summary", transcription=transcription), "temperature": 0.3}
+    
+    async def generate_full_summary_async(self, transcription: str) -> str:
+        """Gera resumo completo da transcrição"""
+        return await self._acomplete(**await self._fitted_request_async(self._full_summary_request, transcription))
+    
+    def _anonymous_summary_request(self, transcription: str) -> Dict[str, Any]:
+        """Monta a requisição de generate_anonymous_summary_async"""
+        return {**self._prompt_request("anonymous_summary", transcription=transcription), "temperature": 0.3}
+    
+    async def generate_anonymous_summary_async(self, transcription: str) -> str:
+        """Gera resumo anonimizado (sem nomes, dados pessoais)"""
+        return await self._acomplete(**await self._fitted_request_async(self._anonymous_summary_request, transcription))
+    
+    def _patient_demand_request(self, transcription: str) -> Dict[str, Any]:
+        """Monta a requisição de generate_patient_demand_async"""
+        return {**self._prompt_request("patient_demand", transcription=transcription), "temperature": 0.3}
+    
+    async def generate_patient_demand_async(self, transcription: str) -> str:
+        """Identifica a demanda trazida pelo paciente"""
+        return await self._acomplete(**await self._fitted_request_async(self._patient_demand_request, transcription))
+    
+    def _context_request(self, transcription: str) -> Dict[str, Any]:
+        """Monta a requisição de generate_context_async"""
+        return {**self._prompt_request("context", transcription=transcription), "temperature": 0.3}
+    
+    async def generate_context_async(self, transcription: str) -> str:
+        """Gera contexto da sessão"""
+        return await self._acomplete(**await self._fitted_request_async(self._context_request, transcription))
+    
+    def _ia_analysis_request(self, transcription: str) -> Dict[str, Any]:
+        """Monta a requisição de generate_ia_analysis_async"""
+        return {**self._prompt_request("ia_analysis", transcription=transcription), "temperature": 0.3}
+    
+    async def generate_ia_analysis_async(self, transcription: str) -> str:
         """Gera análise FAP (Functional Analytic Psychotherapy) baseada no livro 'FAP Descomplicada'"""
+        return await self._acomplete(**await self._fitted_request_async(self._ia_analysis_request, transcription))
+    
+    async def stream_ia_analysis(self, transcription: str) -> AsyncIterator[str]:
+        """Versão de generate_ia_analysis_async que gera o texto em trechos (stream)"""
+        request = await self._fitted_request_async(self._ia_analysis_request, transcription)
+        async for chunk in self._astream(**request):
+            yield chunk
+    
+    def _anonymize_names_request(self, transcription: str, patient_name: str, psychologist_name: str) -> Dict[str, Any]:
+        """Monta a requisição de anonymize_names_in_transcription_async"""
+        request = self._prompt_request(
+            "anonymize_names",
+            transcription=transcription,
+            patient_name=patient_name,
+            psychologist_name=psychologist_name
+        )
+        return {**request, "temperature": 0.1}
+    
+    async def anonymize_names_in_transcription_async(self, transcription: str, patient_name: str, psychologist_name: str) -> str:
+        """Substitui nomes de pessoas por letras na transcrição (P para Pedro, R para Rafael, etc.)"""
+        return await self._acomplete(**self._anonymize_names_request(transcription, patient_name, psychologist_name))
+    
+    def _session_questions_request(self, transcription: str, patient_name: str, psychologist_name: str) -> Dict[str, Any]:
+        """Monta a requisição de generate_session_questions_async"""
+        return {**self._prompt_request("session_questions", transcription=transcription), "temperature": 0.5}
+    
+    def _parse_questions(self, content: str) -> list[str]:
+        """Separa as perguntas por linha"""
+        questions_text = content.strip()
+        return [q.strip() for q in questions_text.split('\n') if q.strip()]
+    
+    async def generate_session_questions_async(self, transcription: str, patient_name: str, psychologist_name: str) -> list[str]:
+        """Gera perguntas sobre a sessão para a psicóloga responder"""
+        build = lambda text: self._session_questions_request(text, patient_name, psychologist_name)
+        return self._parse_questions(await self._acomplete(**await self._fitted_request_async(build, transcription)))
+    
+    def _conclusion_request(
+        self,
+        transcription: str,
+        context: str,
+        patient_demand: str,
+        analise_da_ia: str,
+        answers: list[str],
+        questions: Optional[list[str]] = None,
+        excerpts: bool = False
+    ) -> Dict[str, Any]:
+        """Monta a requisição de generate_conclusion_async
         
-        # Persona e contexto do sistema
-        system_message = """Persona: Você é um(a) supervisor(a) clínico(a) sênior, especialista em Psicoterapia Analítica Funcional (FAP), cujo conhecimento e prática são estritamente baseados na metodologia, princípios e linguagem apresentados no livro "FAP Descomplicada" (cujo conteúdo relevante foi fornecido anteriormente). Seu papel é me orientar na elaboração de evoluções de caso FAP que sejam clinicamente úteis, concisas e funcionalmente precisas, refletindo a aplicação prática da teoria do livro.
-
-Contexto Teórico e Estrutura de Conhecimento (Baseado em "FAP Descomplicada"):
-
-Sua análise e orientação devem derivar exclusivamente das seguintes informações e estruturas conceituais extraídas do livro "FAP Descomplicada":
-
-Objetivo Central: Ajudar o terapeuta a ser consciente, corajoso e habilidoso na interação momento a momento com o cliente, utilizando a relação terapêutica como veículo principal para a mudança comportamental, fundamentado na análise funcional e na Ciência Comportamental Contextual (CBS).
-
-Base Teórica: Behaviorismo Radical, Análise do Comportamento, com forte ênfase na Ciência Comportamental Contextual (CBS), vendo o comportamento como aprendido e funcionalmente determinado pelo contexto (histórico e presente).
-
-Estrutura do Livro: Organizado em Teoria (Parte 1: Ideias - Caps 1-5) e Prática (Parte 2: A Prática - Caps 6-13), com foco na aplicação clínica dos princípios.
-
-Conceitos Teóricos Essenciais (a aplicar):
-
-Análise Funcional: Aplicada primordialmente à relação terapêutica in vivo para entender a função dos comportamentos (antecedentes, respostas, consequências na interação).
-
-Comportamentos Clinicamente Relevantes (CCRs):
-- CCR1: Comportamentos-problema do cliente que ocorrem em sessão, funcionalmente ligados aos problemas fora dela.
-- CCR2: Comportamentos de melhora/progresso do cliente em sessão.
-- Classes Funcionais (FIAT adaptado): Identificar CCRs relacionados à Asserção de Necessidades (A), Comunicação Bidirecional (B), Conflito (C), Autorrevelação/Proximidade (D).
-
-Comportamentos do Terapeuta:
-- T1: Comportamentos do terapeuta que interferem no progresso.
-- T2: Comportamentos do terapeuta que facilitam o progresso (incluindo aplicação habilidosa das 5 regras).
-
-Modelo Consciência, Coragem e Amor (ACL): Usar como ferramenta de análise funcional da conexão social e guia para a postura terapêutica (avaliar/promover esses aspectos na interação).
-
-As 5 Regras da FAP: Aplicar como guia do processo terapêutico momento a momento: 1. Observar CCRs; 2. Evocar CCRs; 3. Reforçar CCR2; 4. Observar o efeito; 5. Generalizar.
-
-Princípios da CBS: Aplicar conceitos como comportamento aprendido, função do comportamento (apetitivo/aversivo), reforçamento/punição, flexibilidade psicológica (vs. rigidez por regras/história), e o papel da linguagem (RFT brevemente).
-
-Instruções Essenciais de Execução:
-- Pergunte Sempre que Necessário: Se informações cruciais para realizar uma análise FAP robusta estiverem faltando ou ambíguas, interrompa a geração da evolução e faça perguntas claras e direcionadas. Não preencha lacunas com suposições.
-- Exclusividade FAP (Livro): Sua base de conhecimento e análise é unicamente o conteúdo e a metodologia do livro "FAP Descomplicada" fornecido. Não introduza conceitos ou técnicas de outras abordagens terapêuticas.
-- Linguagem FAP (Livro): Utilize consistentemente a terminologia técnica da FAP (CCR1, CCR2, T1, T2, 5 Regras, ACL, Análise Funcional, Evocar, Reforçar, Generalizar, etc.) conforme definida e utilizada no livro.
-- Foco Funcional e Relacional: Mantenha o foco na função do comportamento dentro da interação terapêutica. A relação terapêutica é o principal motor da mudança.
-- Concisão e Precisão Funcional: Seja sucinto, mas garanta que a análise funcional FAP seja o núcleo da evolução, não apenas uma descrição superficial."""
+        Com `excerpts`, `transcription` contém apenas os trechos escolhidos por _conclusion_excerpts.
+        """
         
-        # Prompt do usuário com formato da evolução FAP
-        user_prompt = """Analise a seguinte transcrição de uma sessão de psicoterapia e gere uma evolução FAP completa seguindo rigorosamente o formato abaixo.
-
-FORMATO DA EVOLUÇÃO FAP:
-
-1. Resumo da Sessão:
-Gere um breve resumo (2-3 frases) dos principais eventos e processos FAP da sessão.
-
-2. Demanda Trazida e Contexto Inicial:
-- Relatos do paciente (eventos privados, comportamentos observáveis fora da sessão, objetivos para a sessão).
-- Identifique Antecedentes (A) relevantes para os comportamentos relatados fora da sessão.
-- Análise FAP Inicial: Com base na demanda e na conceituação de caso FAP (se disponível), aponte possíveis CCR1s que podem estar funcionalmente relacionados.
-
-3. Intervenção Clínica (FAP in vivo):
-- Descreva as ações específicas do terapeuta (perguntas, observações, evocações, reforçamentos, uso de exercícios, etc.).
-- Análise Funcional da Intervenção (FAP): Justifique CADA ação principal do terapeuta usando a FAP:
-  * Qual(is) das 5 Regras da FAP está(ão) sendo aplicada(s)?
-  * Como a intervenção visa observar/evocar/reforçar um CCR específico?
-  * Análise ACL: A ação promove Consciência, Coragem ou Amor? É uma resposta de Amor a uma Coragem do cliente?
-  * Classifique a intervenção como potencial T1 ou T2 e justifique funcionalmente.
-
-4. Resposta do Paciente (Observação de CCRs - Regra 1):
-- Descreva as reações observáveis (comportamento motor, expressões) e os relatos verbais do paciente à intervenção. Diferencie claramente.
-- Análise FAP da Resposta: Identifique explicitamente os comportamentos do paciente como potenciais CCR1s ou CCR2s ocorrendo em resposta à intervenção. Explique a função (o que o comportamento busca obter ou evitar naquele momento da interação).
-- Análise ACL: A resposta demonstrou Consciência, Coragem, Amor (ou dificuldades nessas áreas)?
-
-5. Análise Funcional ABC Principal da Interação:
-Sintetize a principal contingência de três termos (A-B-C) observada durante a interação terapêutica chave da sessão.
-- A (Antecedente): Qual ação do terapeuta (T2 ou T1) ou evento imediato precedeu o CCR principal?
-- B (Behavior/Comportamento): Qual foi o CCR1 ou CCR2 mais significativo do paciente observado em resposta a A?
-- C (Consequência): Qual foi a resposta imediata do terapeuta (potencialmente reforçadora - Regra 3/T2, ou não - T1) e/ou o efeito observado no paciente (Regra 4)?
-
-IMPORTANTE: Se as informações fornecidas não permitirem identificar claramente A, B ou C para esta análise, você DEVE fazer perguntas específicas para obter os detalhes necessários ANTES de tentar completar esta seção ou fazer suposições.
-
-6. Planejamento (Próxima Sessão e Generalização - Regra 5):
-- Objetivos FAP específicos para a próxima sessão (Ex: focar em evocar CCR2 de assertividade, observar T1 específico).
-- Tarefas de casa (se houver) explicitamente ligadas à prática de CCR2s em contextos externos relevantes (generalização). Descreva a tarefa e sua justificativa funcional FAP, baseando-se nos princípios do Cap. 12 do livro.
-- Ações futuras do terapeuta ou ajustes nas estratégias FAP (Ex: variar forma de reforçar, usar exercício específico).
-
-7. Correlação com Sessão Anterior (Opcional):
-Breve comparação FAP (progresso em CCR2s específicos, mudanças na frequência de CCR1s, evolução na aplicação das regras, T1s/T2s recorrentes). Adicionar apenas se informações da sessão anterior forem fornecidas.
-
-TRANSCRIÇÃO DA SESSÃO:
-{transcription}
-
-Gere a evolução FAP completa seguindo rigorosamente o formato acima, aplicando o conhecimento do livro "FAP Descomplicada" para uma análise funcional precisa e clinicamente útil."""
+        # Formata as respostas (com as perguntas, quando disponíveis) para incluir no prompt
+        if answers and questions and len(questions) == len(answers):
+            answers_text = "\n".join(
+                f"{i+1}. {question}\nResposta: {answer}" for i, (question, answer) in enumerate(zip(questions, answers))
+            )
+        else:
+            answers_text = "\n".join([f"{i+1}. {answer}" for i, answer in enumerate(answers)]) if answers else "Nenhuma resposta fornecida ainda."
         
-        formatted_prompt = user_prompt.format(transcription=transcription)
+        if excerpts:
+            transcription_section = f"""Trechos da Transcrição (selecionados pela relevância para as perguntas; o restante da sessão está coberto pelo contexto e pelas análises abaixo):
+{transcription}"""
+        else:
+            transcription_section = f"""Transcrição:
+{transcription}"""
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": formatted_prompt}
-            ],
-            temperature=0.3
+        request = self._prompt_request(
+            "conclusion",
+            transcription_section=transcription_section,
+            context=context,
+            patient_demand=patient_demand,
+            analise_da_ia=analise_da_ia,
+            answers=answers_text
         )
-        
-        return response.choices[0].message.content
+        return {**request, "temperature": 0.3}
     
-    def anonymize_names_in_transcription(self, transcription: str, patient_name: str, psychologist_name: str) -> str:
-        """Substitui nomes de pessoas por letras na transcrição (P para Pedro, R para Rafael, etc.)"""
-        prompt = f"""Analise a seguinte transcrição de uma sessão de psicoterapia e substitua todos os nomes próprios de pessoas por letras do alfabeto.
-
-Regras:
-- O nome do paciente "{patient_name}" deve ser substituído pela primeira letra do nome (ex: Pedro -> P, Rafael -> R, Maria -> M)
-- O nome da psicóloga "{psychologist_name}" deve ser substituído pela primeira letra do nome
-- Outros nomes próprios mencionados devem ser substituídos pela primeira letra do nome
-- Mantenha o resto do texto exatamente como está
-- Preserve a formatação e pontuação
-
-Transcrição:
-{transcription}
-
-Transcrição com nomes substituídos por letras:"""
+    def _conclusion_mode(self, mode: Optional[str], context: str, patient_demand: str, analise_da_ia: str) -> str:
+        """Modo efetivo da conclusão: "compact" exige ao menos uma análise salva"""
+        mode = mode or settings.conclusion_mode
+        if mode not in ("compact", "full"):
+            raise ValueError(f"Modo de conclusão inválido: {mode}")
+        if mode == "compact" and not (context or patient_demand or analise_da_ia):
+            logger.info("Sessão sem análises salvas; conclusão gerada com a transcrição completa")
+            return "full"
+        return mode
+    
+    def _conclusion_excerpts(self, build: Callable[[str], Dict[str, Any]], transcription: str, queries: List[str]) -> Optional[str]:
+        """Trechos da transcrição mais relevantes para as consultas, dentro do orçamento de tokens
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em anonimização de transcrições, substituindo nomes por letras."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1
-        )
+        A transcrição é dividida em trechos de `conclusion_excerpt_tokens` e indexada com BM25;
+        cada pergunta/resposta (e a demanda) escolhe, alternadamente, os seus trechos mais
+        relevantes até o prompt atingir `conclusion_max_input_tokens`. Retorna None se a
+        transcrição inteira já couber no orçamento, ou se o prompt sem trechos já o ultrapassar
+        (nesse caso o chamador usa o modo "full", com map-reduce).
+        """
+        model, budget = self._transcription_budget(build(""))
+        overhead = count_message_tokens(build("")["messages"], model)
+        budget = max(0, min(budget, settings.conclusion_max_input_tokens - overhead))
+        if budget == 0:
+            logger.warning(
+                f"Conclusão compacta: o prompt sem trechos ({overhead} tokens) não cabe em "
+                f"conclusion_max_input_tokens; usando a transcrição condensada"
+            )
+            return None
+        if count_tokens(transcription, model) <= budget:
+            return None
+        
+        segments = split_by_tokens(transcription, settings.conclusion_excerpt_tokens, model)
+        rendered = [f"[Trecho {index}/{len(segments)}] {segment}" for index, segment in enumerate(segments, start=1)]
+        used = 0
+        
+        def fits(index: int) -> bool:
+            nonlocal used
+            tokens = count_tokens(rendered[index], model) + 2
+            if used + tokens > budget:
+                return False
+            used += tokens
+            return True
         
-        return response.choices[0].message.content
+        selected = BM25Index(segments).select(queries, fits)
+        logger.info(f"Conclusão compacta: {len(selected)} de {len(segments)} trechos da transcrição ({used} tokens)")
+        if not selected:
+            return "(nenhum trecho relevante encontrado)"
+        return "\n\n".join(rendered[index] for index in selected)
     
-    def generate_session_questions(self, transcription: str, patient_name: str, psychologist_name: str) -> list[str]:
-        """Gera perguntas sobre a sessão para a psicóloga responder"""
-        prompt = f"""Você é um assistente que gera perguntas reflexivas para psicólogos sobre suas sessões de terapia.
-
-REGRAS OBRIGATÓRIAS:
-- Use APENAS "Paciente" para se referir ao paciente
-- Use "você" para se referir à psicóloga (a pessoa que vai responder as perguntas)
-- NUNCA use nomes próprios, letras (como P, R, etc.) ou qualquer identificador pessoal
-- Se a transcrição mencionar nomes ou letras, ignore-os completamente e use apenas "Paciente" e "você"
-
-As perguntas devem ser direcionadas à psicóloga, usando "você" quando apropriado. Exemplos:
-- "Como você percebeu que o Paciente reagiu quando..."
-- "O que você observou sobre a reação do Paciente diante de..."
-- "Como você interveio quando o Paciente mencionou..."
-
-Gere entre 3 a 5 perguntas objetivas e específicas baseadas no conteúdo da transcrição.
-As perguntas devem ajudar a psicóloga a refletir sobre:
-- Reações e comportamentos do Paciente
-- Suas próprias intervenções e observações
-- Dinâmicas da sessão
-- Aspectos importantes que podem ter passado despercebidos
-
-Retorne APENAS as perguntas, uma por linha, sem numeração ou marcadores.
-NUNCA mencione nomes próprios, letras ou identificadores pessoais.
-
-Transcrição:
-{transcription}
-
-Perguntas:"""
+    def _conclusion_queries(self, patient_demand: str, answers: list[str], questions: Optional[list[str]]) -> List[str]:
+        """Consultas do recuperador: cada pergunta com a sua resposta, e a demanda do paciente"""
+        answers = answers or []
+        if questions and len(questions) == len(answers):
+            queries = [f"{question} {answer}" for question, answer in zip(questions, answers)]
+        else:
+            queries = list(answers)
+        return [*queries, patient_demand]
+    
+    async def _fitted_conclusion_request_async(
+        self,
+        transcription: str,
+        context: str,
+        patient_demand: str,
+        analise_da_ia: str,
+        answers: list[str],
+        questions: Optional[list[str]],
+        mode: Optional[str]
+    ) -> Dict[str, Any]:
+        """Requisição da conclusão no modo configurado
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em análise de sessões de psicoterapia. Você gera perguntas reflexivas direcionadas à psicóloga, usando APENAS 'Paciente' para o paciente e 'você' para a psicóloga. NUNCA use nomes próprios, letras ou identificadores pessoais."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5
+        "compact": análises salvas + trechos relevantes da transcrição (ver _conclusion_excerpts,
+        executado em thread). "full": transcrição inteira, condensada por map-reduce se não
+        couber no contexto.
+        """
+        build = lambda text, excerpts=False: self._conclusion_request(
+            text, context, patient_demand, analise_da_ia, answers, questions, excerpts=excerpts
         )
+        if self._conclusion_mode(mode, context, patient_demand, analise_da_ia) == "compact":
+            text = await asyncio.to_thread(
+                self._conclusion_excerpts,
+                lambda text: build(text, True),
+                transcription,
+                self._conclusion_queries(patient_demand, answers, questions)
+            )
+            if text is not None:
+                return build(text, True)
+        return await self._fitted_request_async(build, transcription)
+    
+    async def generate_conclusion_async(
+        self,
+        transcription: str,
+        context: str,
+        patient_demand: str,
+        analise_da_ia: str,
+        answers: list[str],
+        questions: Optional[list[str]] = None,
+        mode: Optional[str] = None
+    ) -> str:
+        """Gera a conclusão final da sessão baseada no contexto, análise e respostas do psicólogo
         
-        # Separa as perguntas por linha
-        questions_text = response.choices[0].message.content.strip()
-        questions = [q.strip() for q in questions_text.split('\n') if q.strip()]
-        
-        return questions
+        `mode` ("compact" ou "full") sobrescreve `conclusion_mode`.
+        """
+        return await self._acomplete(**await self._fitted_conclusion_request_async(
+            transcription, context, patient_demand, analise_da_ia, answers, questions, mode
+        ))
+    
+    async def stream_conclusion(
+        self,
+        transcription: str,
+        context: str,
+        patient_demand: str,
+        analise_da_ia: str,
+        answers: list[str],
+        questions: Optional[list[str]] = None,
+        mode: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Versão de generate_conclusion_async que gera o texto em trechos (stream)"""
+        request = await self._fitted_conclusion_request_async(
+            transcription, context, patient_demand, analise_da_ia, answers, questions, mode
+        )
+        async for chunk in self._astream(**request):
+            yield chunk
+    
+    def _combined_analysis_request(self, transcription: str) -> Dict[str, Any]:
+        """Monta a requisição de generate_combined_analysis_async"""
+        return {
+            **self._prompt_request("combined_analysis", transcription=transcription),
+            "temperature": 0.3,
+            "model": settings.openai_combined_model,
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "session_analysis", "strict": True, "schema": COMBINED_ANALYSIS_SCHEMA}
+            }
+        }
     
-    def generate_conclusion(self, transcription: str, context: str, patient_demand: str, analise_da_ia: str, answers: list[str]) -> str:
-        """Gera a conclusão final da sessão baseada no contexto, análise e respostas do psicólogo"""
+    def _parse_combined_analysis(self, content: str) -> Dict[str, Any]:
+        """Valida a resposta do modo combinado contra o modelo SessionUpdate"""
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Resposta do modo combinado não é um JSON válido: {str(e)}")
         
-        # Formata as respostas para incluir no prompt
-        answers_text = "\n".join([f"{i+1}. {answer}" for i, answer in enumerate(answers)]) if answers else "Nenhuma resposta fornecida ainda."
+        # Lança ValidationError se algum campo vier com o tipo errado
+        session_update = SessionUpdate(**data)
+        result = session_update.model_dump(include=set(COMBINED_ANALYSIS_FIELDS))
+        result["questions"] = [q.strip() for q in (result["questions"] or []) if q and q.strip()]
         
-        prompt = f"""Você é um assistente especializado em elaborar conclusões de sessões de psicoterapia seguindo a metodologia FAP (Functional Analytic Psychotherapy).
-
-IMPORTANTE: Use APENAS "Paciente" para se referir ao paciente e "você" para se referir à psicóloga. NUNCA use nomes próprios, letras ou identificadores pessoais.
-
-Elabore uma conclusão completa da sessão seguindo RIGOROSAMENTE a estrutura abaixo. Use as informações fornecidas e as respostas da psicóloga às perguntas reflexivas.
-
-ESTRUTURA OBRIGATÓRIA:
-
-0. Resumo da Sessão:
-[Breve resumo (2-3 frases) dos principais eventos e processos FAP da sessão]
-
-1. Demanda Trazida e Contexto Inicial:
-- Relatos do Paciente: [Descrição dos relatos do paciente]
-- Antecedentes (A) Relevantes: [Contexto histórico e imediato]
-- Análise FAP Inicial: [CCR1s e CCR2s potenciais identificados]
-
-2. Intervenção Clínica (FAP in vivo):
-[Descrição das ações específicas do terapeuta com análise funcional FAP de cada intervenção principal]
-
-3. Resposta do Paciente (Observação de CCRs - Regra 1):
-[Descrição das reações e comportamentos do paciente com análise FAP]
-
-4. Análise Funcional ABC Principal da Interação:
-[Análise da contingência A-B-C principal observada]
-
-5. Planejamento (Próxima Sessão e Generalização - Regra 5):
-- Objetivos FAP Próxima Sessão: [Objetivos específicos]
-- Tarefas de Casa: [Se houver, com justificativa FAP]
-- Ações Futuras Terapeuta: [Ações e ajustes]
-
-6. Correlação com Sessão Anterior:
-[Breve comparação FAP com sessões anteriores, se aplicável]
-
-INFORMAÇÕES DA SESSÃO:
-
-Transcrição:
-{transcription}
-
-Contexto:
-{context}
-
-Demanda do Paciente:
-{patient_demand}
-
-Análise da IA (FAP):
-{analise_da_ia}
-
-Respostas da Psicóloga às Perguntas Reflexivas:
-{answers_text}
-
-Elabore a conclusão completa seguindo EXATAMENTE a estrutura acima, usando apenas "Paciente" e "você" para se referir às pessoas envolvidas."""
+        missing = [field for field in COMBINED_ANALYSIS_FIELDS if not result.get(field)]
+        if missing:
+            raise ValueError(f"Resposta do modo combinado sem os campos: {', '.join(missing)}")
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Você é um assistente especializado em análise FAP de sessões de psicoterapia. Você elabora conclusões detalhadas seguindo rigorosamente a metodologia FAP, usando apenas 'Paciente' e 'você' para se referir às pessoas. NUNCA use nomes próprios ou identificadores pessoais."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
+        return result
+    
+    async def generate_combined_analysis_async(self, transcription: str) -> Dict[str, Any]:
+        """Gera todas as análises e as perguntas da sessão em uma única chamada estruturada"""
+        return self._parse_combined_analysis(
+            await self._acomplete(**await self._fitted_request_async(self._combined_analysis_request, transcription))
         )
+    
+    async def session_batch_requests_async(self, transcription: str, patient_name: str, psychologist_name: str) -> Dict[str, Dict[str, Any]]:
+        """Requisições que geram perguntas e análises da sessão, por campo, para envio em lote
         
-        return response.choices[0].message.content
+        No modo combinado há uma única requisição (`combined`). Transcrições longas já vão
+        condensadas (ver _fitted_request_async) e cada requisição já traz o modelo da rota.
+        """
+        if settings.openai_analysis_mode == "combined":
+            request = await self._fitted_request_async(self._combined_analysis_request, transcription)
+            return {"combined": self.router.route_request(request)}
+        builders = {
+            "questions": lambda text: self._session_questions_request(text, patient_name, psychologist_name),
+            "full_summary": self._full_summary_request,
+            "anonymous_summary": self._anonymous_summary_request,
+            "patient_demand": self._patient_demand_request,
+            "context": self._context_request,
+            "analise_da_ia": self._ia_analysis_request
+        }
+        requests = await asyncio.gather(*(self._fitted_request_async(build, transcription) for build in builders.values()))
+        return {field: self.router.route_request(request) for field, request in zip(builders, requests)}
     
-    def process_session(self, transcription: str) -> Dict[str, str]:
-        """Processa toda a sessão e retorna todos os resultados"""
+    def parse_batch_result(self, field: str, content: str) -> Dict[str, Any]:
+        """Converte o texto gerado para um campo de session_batch_requests_async nos valores a salvar"""
+        if field == "combined":
+            results = self._parse_combined_analysis(content)
+            return {**results, "answers": None}
+        if field == "questions":
+            # Perguntas novas invalidam respostas anteriores
+            return {"questions": self._parse_questions(content), "answers": None}
+        return {field: content}
+    
+    async def complete_async(self, request: Dict[str, Any]) -> str:
+        """Executa uma requisição montada por session_batch_requests_async (cache, métricas e agendador)"""
+        return await self._acomplete(**request)
+    
+    def _analysis_tasks_async(self) -> Dict[str, Callable[[str], Awaitable[str]]]:
+        """Mapeia cada campo da sessão para o método que o gera"""
         return {
-            "full_summary": self.generate_full_summary(transcription),
-            "anonymous_summary": self.generate_anonymous_summary(transcription),
-            "patient_demand": self.generate_patient_demand(transcription),
-            "context": self.generate_context(transcription),
-            "analise_da_ia": self.generate_ia_analysis(transcription)
+            "full_summary": self.generate_full_summary_async,
+            "anonymous_summary": self.generate_anonymous_summary_async,
+            "patient_demand": self.generate_patient_demand_async,
+            "context": self.generate_context_async,
+            "analise_da_ia": self.generate_ia_analysis_async
         }
-
+    
+    def _select_tasks_async(self, fields: Optional[List[str]]) -> Dict[str, Callable[[str], Awaitable[str]]]:
+        """Tarefas de _analysis_tasks_async, opcionalmente só dos campos em `fields`"""
+        tasks = self._analysis_tasks_async()
+        if fields is None:
+            return tasks
+        return {field: task for field, task in tasks.items() if field in fields}
+    
+    async def process_session_concurrent_async(
+        self,
+        transcription: str,
+        fields: Optional[List[str]] = None,
+        on_result: Optional[Callable[[str, str], Awaitable[Any]]] = None
+    ) -> Tuple[Dict[str, Optional[str]], Dict[str, str]]:
+        """Executa as análises em paralelo e retorna (resultados, erros por campo)
+        
+        Campos que falharem ou estourarem o tempo ficam como None nos resultados e têm o
+        erro registrado. O limite de `openai_analysis_max_workers` chamadas simultâneas é
+        aplicado com um semáforo. `openai_analysis_timeout` vale para cada análise, contado
+        quando ela consegue uma vaga no semáforo; a análise que estoura o tempo é cancelada
+        sem afetar as demais. `fields` limita as análises geradas e `on_result(campo, texto)`
+        é aguardado assim que cada uma termina (ex: para salvar o resultado antes das demais).
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.openai_analysis_max_workers))
+        
+        async def run(field: str, task: Callable[[str], Awaitable[str]]) -> str:
+            async with semaphore:
+                result = await asyncio.wait_for(task(transcription), timeout=settings.openai_analysis_timeout)
+            if on_result:
+                await on_result(field, result)
+            return result
+        
+        tasks = self._select_tasks_async(fields)
+        outcomes = await asyncio.gather(*(run(field, task) for field, task in tasks.items()), return_exceptions=True)
+        
+        results: Dict[str, Optional[str]] = {}
+        errors: Dict[str, str] = {}
+        for field, outcome in zip(tasks, outcomes):
+            results[field] = None
+            if isinstance(outcome, asyncio.TimeoutError):
+                errors[field] = f"Tempo limite de {settings.openai_analysis_timeout:g}s excedido"
+            elif isinstance(outcome, BaseException):
+                errors[field] = str(outcome)
+            else:
+                results[field] = outcome
+        
+        return results, errors
+    
+    async def process_session_async(
+        self,
+        transcription: str,
+        fields: Optional[List[str]] = None,
+        on_result: Optional[Callable[[str, str], Awaitable[Any]]] = None
+    ) -> Dict[str, str]:
+        """Processa toda a sessão e retorna todos os resultados
+        
+        Com `openai_concurrent_analyses` as análises são executadas em paralelo; se alguma
+        falhar é lançado SessionAnalysisError com os resultados parciais. `fields` e
+        `on_result` como em process_session_concurrent_async.
+        """
+        if settings.openai_concurrent_analyses:
+            results, errors = await self.process_session_concurrent_async(transcription, fields, on_result)
+            if errors:
+                raise SessionAnalysisError(results, errors)
+            return results
+        
+        results = {}
+        for field, task in self._select_tasks_async(fields).items():
+            results[field] = await task(transcription)
+            if on_result:
+                await on_result(field, results[field])
+        return results
+    
+    # Versões síncronas (obsoletas), mantidas para scripts que ainda não usam asyncio
+    
+    def generate_full_summary(self, transcription: str) -> str:
+        """Versão síncrona (obsoleta) de generate_full_summary_async"""
+        return run_sync(self.generate_full_summary_async(transcription), "generate_full_summary_async")
+    
+    def generate_anonymous_summary(self, transcription: str) -> str:
+        """Versão síncrona (obsoleta) de generate_anonymous_summary_async"""
+        return run_sync(self.generate_anonymous_summary_async(transcription), "generate_anonymous_summary_async")
+    
+    def generate_patient_demand(self, transcription: str) -> str:
+        """Versão síncrona (obsoleta) de generate_patient_demand_async"""
+        return run_sync(self.generate_patient_demand_async(transcription), "generate_patient_demand_async")
+    
+    def generate_context(self, transcription: str) -> str:
+        """Versão síncrona (obsoleta) de generate_context_async"""
+        return run_sync(self.generate_context_async(transcription), "generate_context_async")
+    
+    def generate_ia_analysis(self, transcription: str) -> str:
+        """Versão síncrona (obsoleta) de generate_ia_analysis_async"""
+        return run_sync(self.generate_ia_analysis_async(transcription), "generate_ia_analysis_async")
+    
+    def generate_combined_analysis(self, transcription: str) -> str:
+        """Versão síncrona (obsoleta) de generate_combined_analysis_async"""
+        return run_sync(self.generate_combined_analysis_async(transcription), "generate_combined_analysis_async")
+    
+    def anonymize_names_in_transcription(self, transcription: str, patient_name: str, psychologist_name: str) -> str:
+        """Versão síncrona (obsoleta) de anonymize_names_in_transcription_async"""
+        return run_sync(self.anonymize_names_in_transcription_async(transcription, patient_name, psychologist_name), "anonymize_names_in_transcription_async")
+    
+    def generate_session_questions(self, transcription: str, patient_name: str, psychologist_name: str) -> list[str]:
+        """Versão síncrona (obsoleta) de generate_session_questions_async"""
+        return run_sync(self.generate_session_questions_async(transcription, patient_name, psychologist_name), "generate_session_questions_async")
+    
+    def generate_conclusion(
+        self,
+        transcription: str,
+        context: str,
+        patient_demand: str,
+        analise_da_ia: str,
+        answers: list[str],
+        questions: Optional[list[str]] = None,
+        mode: Optional[str] = None
+    ) -> str:
+        """Versão síncrona (obsoleta) de generate_conclusion_async"""
+        return run_sync(
+            self.generate_conclusion_async(transcription, context, patient_demand, analise_da_ia, answers, questions, mode),
+            "generate_conclusion_async"
+        )
+    
+    def process_session_concurrent(self, transcription: str) -> Tuple[Dict[str, Optional[str]], Dict[str, str]]:
+        """Versão síncrona (obsoleta) de process_session_concurrent_async"""
+        return run_sync(self.process_session_concurrent_async(transcription), "process_session_concurrent_async")
+    
+    def process_session(self, transcription: str) -> Dict[str, str]:
+        """Versão síncrona (obsoleta) de process_session_async"""
+        return run_sync(self.process_session_async(transcription), "process_session_async")
+    
+    async def aclose(self):
+        """Fecha as conexões HTTP do cliente assíncrono"""
+        await self.async_client.close()
@@ -0,0 +1,271 @@
+from app.config import settings
+from app.services.anonymization_service import AnonymizationService
+from app.services.audio_service import AudioService
+from app.services.openai_service import OpenAIService
+from app.services.supabase_service import SupabaseService
+from app.utils import metrics
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Callback chamado a cada mudança de etapa: (etapa, status)
+StageCallback = Callable[[str, str], None]
+
+# Campos da sessão salvos por cada etapa; a etapa está concluída quando todos estão preenchidos
+STAGE_FIELDS = {
+    "transcription": ("transcription",),
+    "anonymization": ("transcription",),
+    "questions": ("questions",),
+    "analyses": ("full_summary", "anonymous_summary", "patient_demand", "context", "analise_da_ia")
+}
+ANALYSIS_FIELDS = STAGE_FIELDS["analyses"]
+
+# Transcrição com os nomes reais, salva até a anonimização terminar (ver supabase/migrations)
+RAW_TRANSCRIPTION_FIELD = "raw_transcription"
+
+class SessionPipeline:
+    """Executa as etapas de processamento de uma sessão já criada no banco"""
+
+    STAGES = ("transcription", "anonymization", "questions", "analyses")
+
+    def __init__(
+        self,
+        audio_service: AudioService,
+        openai_service: OpenAIService,
+        supabase_service: SupabaseService,
+        anonymization_service: Optional[AnonymizationService] = None
+    ):
+        self.audio_service = audio_service
+        self.openai_service = openai_service
+        self.supabase_service = supabase_service
+        self.anonymization_service = anonymization_service or AnonymizationService(openai_service)
+
+    def _notify(self, on_stage: Optional[StageCallback], stage: str, status: str):
+        if on_stage:
+            on_stage(stage, status)
+
+    def _instrument(self, on_stage: Optional[StageCallback]) -> StageCallback:
+        """Envolve o callback de etapas registrando a duração de cada etapa nas métricas"""
+        started: Dict[str, float] = {}
+
+        def callback(stage: str, status: str):
+            if status == "running":
+                started[stage] = time.perf_counter()
+                metrics.PIPELINE_STAGES_IN_PROGRESS.labels(stage).inc()
+            elif stage in started:
+                metrics.PIPELINE_STAGES_IN_PROGRESS.labels(stage).dec()
+                metrics.observe_stage(stage, status, time.perf_counter() - started.pop(stage))
+            if on_stage:
+                on_stage(stage, status)
+
+        return callback
+
+    async def transcribe_session(
+        self,
+        session_id: str,
+        audio_path: str,
+        filename: str,
+        patient_name: str,
+        psychologist_name: str,
+        on_stage: Optional[StageCallback] = None,
+        transcription_backend: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Etapas de transcrição e anonimização; salva a transcrição e retorna a sessão atualizada
+
+        A transcrição original é salva antes da anonimização, para que uma falha nela não
+        obrigue a transcrever o áudio de novo (ver anonymize_session).
+        `transcription_backend` escolhe o motor de transcrição (padrão: `transcription_backend` de Settings).
+        """
+        # 1. Transcreve áudio
+        stage = "transcription"
+        try:
+            self._notify(on_stage, stage, "running")
+            logger.info(f"Transcrevendo áudio da sessão {session_id}")
+            raw_transcription = await self.audio_service.transcribe_audio_file_async(
+                audio_path, filename, transcription_backend
+            )
+            await self.supabase_service.update_session_async(session_id, {RAW_TRANSCRIPTION_FIELD: raw_transcription})
+            self._notify(on_stage, stage, "completed")
+        except Exception:
+            self._notify(on_stage, stage, "failed")
+            raise
+
+        return await self.anonymize_session(session_id, raw_transcription, patient_name, psychologist_name, on_stage)
+
+    async def anonymize_session(
+        self,
+        session_id: str,
+        raw_transcription: str,
+        patient_name: str,
+        psychologist_name: str,
+        on_stage: Optional[StageCallback] = None
+    ) -> Dict[str, Any]:
+        """Anonimiza a transcrição original e a salva, apagando a original do banco"""
+        stage = "anonymization"
+        try:
+            # 2. Anonimiza transcrição substituindo nomes por letras
+            self._notify(on_stage, stage, "running")
+            logger.info(f"Anonimizando transcrição da sessão {session_id}")
+            transcription = await self.anonymization_service.anonymize_async(
+                raw_transcription,
+                patient_name,
+                psychologist_name
+            )
+
+            # 3. Atualiza sessão com transcrição anonimizada
+            logger.info(f"Salvando transcrição da sessão {session_id}")
+            updated_session = await self.supabase_service.update_session_async(
+                session_id, {"transcription": transcription, RAW_TRANSCRIPTION_FIELD: None}
+            )
+            self._notify(on_stage, stage, "completed")
+            return updated_session
+        except Exception:
+            self._notify(on_stage, stage, "failed")
+            raise
+
+    @classmethod
+    def pending_stages(cls, session: Dict[str, Any]) -> List[str]:
+        """Etapas cujo resultado ainda não foi salvo na sessão
+
+        Com a transcrição original salva e a anonimizada faltando, só a anonimização está pendente.
+        """
+        pending = [stage for stage in cls.STAGES if not all(session.get(field) for field in STAGE_FIELDS[stage])]
+        if "transcription" in pending and session.get(RAW_TRANSCRIPTION_FIELD):
+            pending.remove("transcription")
+        return pending
+
+    async def run(
+        self,
+        session_id: str,
+        audio_path: Optional[str],
+        filename: Optional[str],
+        patient_name: str,
+        psychologist_name: str,
+        on_stage: Optional[StageCallback] = None,
+        session: Optional[Dict[str, Any]] = None,
+        transcription_backend: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Processa o áudio da sessão salvo em disco e retorna a sessão atualizada
+
+        Cada etapa salva seu resultado assim que termina (as análises, campo a campo), para
+        uma falha não descartar o que já foi gerado. Com `session` (o estado atual no banco)
+        as etapas já salvas são puladas; o áudio só é necessário se faltar a transcrição.
+        """
+        on_stage = self._instrument(on_stage)
+        updated_session = session = session or {}
+        pending = self.pending_stages(session)
+        stage = None
+        try:
+            if "transcription" in pending:
+                if not audio_path:
+                    raise ValueError("A sessão não possui transcrição e nenhum áudio foi enviado")
+
+                # 1-3. Transcreve, anonimiza e salva a transcrição (falhas já notificadas)
+                updated_session = await self.transcribe_session(
+                    session_id, audio_path, filename, patient_name, psychologist_name, on_stage, transcription_backend
+                )
+                transcription = updated_session["transcription"]
+            elif "anonymization" in pending:
+                # A transcrição original foi salva, mas a anonimização falhou
+                self._notify(on_stage, "transcription", "skipped")
+                updated_session = await self.anonymize_session(
+                    session_id, session[RAW_TRANSCRIPTION_FIELD], patient_name, psychologist_name, on_stage
+                )
+                transcription = updated_session["transcription"]
+            else:
+                transcription = session["transcription"]
+                self._notify(on_stage, "transcription", "skipped")
+                self._notify(on_stage, "anonymization", "skipped")
+
+            questions_pending = "questions" in pending
+            missing_analyses = [field for field in ANALYSIS_FIELDS if not session.get(field)]
+
+            if settings.openai_analysis_mode == "combined" and (questions_pending or missing_analyses):
+                # 4-5. Uma única chamada estruturada gera perguntas e análises; só as que faltam são salvas
+                stage = "analyses"
+                self._notify(on_stage, "questions", "running" if questions_pending else "skipped")
+                self._notify(on_stage, stage, "running")
+                logger.info(f"Gerando perguntas e análises (modo combinado) da sessão {session_id}")
+                try:
+                    results = await self.openai_service.generate_combined_analysis_async(transcription)
+                except Exception:
+                    if questions_pending:
+                        self._notify(on_stage, "questions", "failed")
+                    raise
+                updates = {field: results[field] for field in missing_analyses}
+                if questions_pending:
+                    # Perguntas novas invalidam respostas anteriores
+                    updates.update({"questions": results["questions"], "answers": None})
+                updated_session = await self.supabase_service.update_session_async(session_id, updates)
+                if questions_pending:
+                    self._notify(on_stage, "questions", "completed")
+                self._notify(on_stage, stage, "completed")
+            else:
+                # 4. Gera perguntas sobre a sessão
+                stage = "questions"
+                if questions_pending:
+                    self._notify(on_stage, stage, "running")
+                    logger.info(f"Gerando perguntas sobre a sessão {session_id}")
+                    questions = await self.openai_service.generate_session_questions_async(
+                        transcription,
+                        patient_name,
+                        psychologist_name
+                    )
+                    updated_session = await self.supabase_service.update_session_async(
+                        session_id, {"questions": questions, "answers": None}
+                    )
+                    self._notify(on_stage, stage, "completed")
+                else:
+                    self._notify(on_stage, stage, "skipped")
+
+                # 5. Processa com OpenAI (resumos, demandas, contexto), salvando cada campo ao terminar
+                stage = "analyses"
+                if missing_analyses:
+                    self._notify(on_stage, stage, "running")
+                    logger.info(f"Processando com OpenAI a sessão {session_id} ({', '.join(missing_analyses)})")
+
+                    async def save_field(field: str, value: str):
+                        await self.supabase_service.update_session_async(session_id, {field: value})
+
+                    await self.openai_service.process_session_async(
+                        transcription, fields=missing_analyses, on_result=save_field
+                    )
+                    # Os campos foram salvos em paralelo; relê a sessão com todos eles
+                    updated_session = await self.supabase_service.get_session_async(session_id)
+                    self._notify(on_stage, stage, "completed")
+                else:
+                    self._notify(on_stage, stage, "skipped")
+
+            logger.info(f"Sessão {session_id} processada com sucesso - todos os dados salvos")
+            return updated_session
+        except Exception:
+            if stage:
+                self._notify(on_stage, stage, "failed")
+            raise
+
+    async def run_from_file(
+        self,
+        session_id: str,
+        audio_path: Optional[str],
+        filename: Optional[str],
+        patient_name: str,
+        psychologist_name: str,
+        on_stage: Optional[StageCallback] = None,
+        session: Optional[Dict[str, Any]] = None,
+        transcription_backend: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Processa o áudio da sessão e remove o arquivo ao final"""
+        try:
+            return await self.run(
+                session_id, audio_path, filename, patient_name, psychologist_name, on_stage, session, transcription_backend
+            )
+        finally:
+            if audio_path:
+                try:
+                    await asyncio.to_thread(os.remove, audio_path)
+                except OSError:
+                    logger.warning(f"Não foi possível remover o áudio temporário {audio_path}")
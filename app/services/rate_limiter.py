@@ -0,0 +1,309 @@
+from app.config import settings
+from app.utils import metrics
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple, TypeVar
+import asyncio
+import heapq
+import itertools
+import logging
+import openai
+import random
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Prioridades: chamadas interativas (usuário esperando) passam na frente das etapas em lote
+INTERACTIVE = 0
+BATCH = 1
+
+RESET_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# Status HTTP que indicam falha temporária
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Converte durações dos headers x-ratelimit-reset-* (ex: "1s", "6m0s", "20ms") em segundos"""
+    if not value:
+        return None
+    parts = RESET_DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Segundos indicados em retry-after-ms ou retry-after (segundos ou data HTTP)"""
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> int:
+    """Estimativa rápida dos tokens cobrados pelo limite de TPM (~4 caracteres por token)"""
+    characters = sum(len(str(message.get("content") or "")) for message in messages)
+    return characters // 4 + (max_tokens or 0)
+
+class ModelLimiter:
+    """Limite de chamadas simultâneas e orçamento de requisições/tokens de um modelo
+
+    O limite de concorrência é adaptativo: cai pela metade a cada 429 e volta a
+    subir aos poucos a cada sucesso (AIMD). O orçamento vem dos headers
+    x-ratelimit-* das respostas; sem orçamento, as chamadas esperam até o reset.
+    """
+
+    def __init__(self, model: str, max_concurrency: int):
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.active = 0
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+        self.blocked_until = 0.0
+        self._waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        metrics.OPENAI_CONCURRENCY_LIMIT.labels(model).set(self.limit)
+
+    def _budget_wait(self, tokens: int) -> float:
+        """Segundos até haver orçamento para a chamada (0 se pode seguir agora)"""
+        now = time.monotonic()
+        waits = [self.blocked_until - now]
+        if self.remaining_requests is not None and self.remaining_requests <= 0:
+            waits.append(self.requests_reset_at - now)
+        if self.remaining_tokens is not None and self.remaining_tokens < tokens:
+            waits.append(self.tokens_reset_at - now)
+        return max(waits)
+
+    def _dispatch(self):
+        """Libera as próximas chamadas da fila, por prioridade, enquanto houver vaga e orçamento"""
+        while self._waiters and self.active < int(self.limit):
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._budget_wait(tokens)
+            if wait > 0:
+                if self._wakeup is None:
+                    self._wakeup = asyncio.get_running_loop().call_later(wait, self._on_wakeup)
+                return
+            heapq.heappop(self._waiters)
+            self.active += 1
+            if self.remaining_requests is not None:
+                self.remaining_requests -= 1
+            if self.remaining_tokens is not None:
+                self.remaining_tokens -= tokens
+            future.set_result(None)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
+
+    async def acquire(self, priority: int, tokens: int):
+        """Espera uma vaga; chamadas de mesma prioridade são atendidas na ordem de chegada"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # A vaga foi concedida antes do cancelamento
+                self.release()
+            raise
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def update_from_headers(self, headers: Optional[Mapping[str, str]]):
+        """Atualiza o orçamento com os headers x-ratelimit-* da resposta"""
+        if not headers:
+            return
+        now = time.monotonic()
+        remaining_requests = _parse_int(headers.get("x-ratelimit-remaining-requests"))
+        if remaining_requests is not None:
+            self.remaining_requests = remaining_requests
+            self.requests_reset_at = now + (parse_reset_duration(headers.get("x-ratelimit-reset-requests")) or 0.0)
+        remaining_tokens = _parse_int(headers.get("x-ratelimit-remaining-tokens"))
+        if remaining_tokens is not None:
+            self.remaining_tokens = remaining_tokens
+            self.tokens_reset_at = now + (parse_reset_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0)
+
+    def on_success(self):
+        # Aumento aditivo: cerca de +1 vaga a cada `limit` sucessos
+        self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        metrics.OPENAI_CONCURRENCY_LIMIT.labels(self.model).set(self.limit)
+
+    def on_rate_limited(self, retry_after: float):
+        # Redução multiplicativa e pausa do modelo até o Retry-After
+        self.limit = max(1.0, self.limit / 2)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        metrics.OPENAI_CONCURRENCY_LIMIT.labels(self.model).set(self.limit)
+
+class OpenAIScheduler:
+    """Agenda as chamadas à OpenAI de todo o processo, por modelo, com retentativas
+
+    Falhas temporárias (429, 5xx, timeouts e erros de conexão) são repetidas com
+    backoff exponencial com jitter, respeitando o Retry-After quando informado.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None
+    ):
+        self.max_concurrency = max_concurrency or settings.openai_max_concurrency
+        self.max_retries = settings.openai_max_retries if max_retries is None else max_retries
+        self.base_delay = base_delay or settings.openai_retry_base_delay
+        self.max_delay = max_delay or settings.openai_retry_max_delay
+        self._limiters: Dict[str, ModelLimiter] = {}
+
+    def limiter(self, model: str) -> ModelLimiter:
+        if model not in self._limiters:
+            self._limiters[model] = ModelLimiter(model, self.max_concurrency)
+        return self._limiters[model]
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: espera aleatória entre 0 e o teto exponencial
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Espera antes de repetir a chamada, ou None se o erro não é temporário"""
+        if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+            return self._backoff(attempt)
+        if not isinstance(error, openai.APIStatusError) or error.status_code not in RETRYABLE_STATUS:
+            return None
+        if error.status_code == 429 and getattr(error, "code", None) == "insufficient_quota":
+            # Falta de créditos não se resolve esperando
+            return None
+        retry_after = parse_retry_after(error.response.headers)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+        return self._backoff(attempt)
+
+    def _record_failure(self, limiter: ModelLimiter, error: Exception, attempt: int) -> Optional[float]:
+        """Aplica ao limitador os headers e o 429 da falha; retorna a espera antes de repetir (None: não repetir)"""
+        delay = self._retry_delay(error, attempt)
+        if isinstance(error, openai.APIStatusError):
+            limiter.update_from_headers(error.response.headers)
+            if error.status_code == 429 and delay is not None:
+                limiter.on_rate_limited(delay)
+        return delay
+
+    async def _start(
+        self,
+        limiter: ModelLimiter,
+        call: Callable[[], Awaitable[T]],
+        priority: int,
+        tokens: int
+    ) -> T:
+        """Executa `call` com retentativas e retorna a resposta com a vaga do limitador ainda ocupada"""
+        model = limiter.model
+        attempt = 0
+        while True:
+            queued_at = time.perf_counter()
+            await limiter.acquire(priority, tokens)
+            metrics.OPENAI_QUEUE_WAIT_SECONDS.labels(model, "interactive" if priority == INTERACTIVE else "batch").observe(
+                time.perf_counter() - queued_at
+            )
+            try:
+                response = await call()
+            except Exception as error:
+                delay = self._record_failure(limiter, error, attempt)
+                limiter.release()
+                if delay is None or attempt >= self.max_retries:
+                    raise
+                reason = str(error.status_code) if isinstance(error, openai.APIStatusError) else type(error).__name__
+                metrics.OPENAI_RETRIES.labels(model, reason).inc()
+                logger.warning(f"Chamada à OpenAI ({model}) falhou ({reason}); nova tentativa em {delay:.1f}s")
+                attempt += 1
+            except BaseException:
+                # Cancelamento durante a chamada
+                limiter.release()
+                raise
+            else:
+                limiter.update_from_headers(getattr(response, "headers", None))
+                return response
+            await asyncio.sleep(delay)
+
+    async def run(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        priority: int = BATCH,
+        tokens: int = 0
+    ) -> T:
+        """Executa `call` respeitando os limites do modelo; repete em falhas temporárias
+
+        `call` deve retornar a resposta bruta (`with_raw_response`) para que os headers
+        de rate limit sejam lidos; respostas sem headers também são aceitas.
+        """
+        limiter = self.limiter(model)
+        response = await self._start(limiter, call, priority, tokens)
+        limiter.on_success()
+        limiter.release()
+        return response
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        priority: int = INTERACTIVE,
+        tokens: int = 0
+    ) -> AsyncIterator[T]:
+        """Como `run`, para respostas em stream: a vaga fica ocupada até o bloco terminar
+
+        A resposta chega antes do texto, então a vaga só é liberada depois que o stream é
+        lido (ou abandonado). Uma falha no meio do stream (ex: 429) não é repetida, mas
+        reduz o limite do modelo como as demais.
+        """
+        limiter = self.limiter(model)
+        response = await self._start(limiter, call, priority, tokens)
+        try:
+            yield response
+        except Exception as error:
+            self._record_failure(limiter, error, self.max_retries)
+            raise
+        else:
+            limiter.on_success()
+        finally:
+            limiter.release()
+
+_default_scheduler: Optional[OpenAIScheduler] = None
+
+def get_scheduler() -> OpenAIScheduler:
+    """Agendador compartilhado pelos serviços do processo"""
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = OpenAIScheduler()
+    return _default_scheduler
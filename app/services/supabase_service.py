@@ -1,14 +1,132 @@
 from supabase import create_client, Client
+from postgrest import AsyncPostgrestClient
 from app.config import settings
-from typing import Optional, Dict, Any
+from app.services.cache_service import MemoryCacheBackend
+from app.utils.metrics import instrument_postgrest_client
+from app.utils.pagination import decode_rank_cursor, keyset_filter
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+import httpx
+import mimetypes
 import uuid
 import re
 import os
 import unicodedata
 
+# Tabelas cujas linhas quase nunca mudam e podem ser lidas do cache de entidades
+CACHED_TABLES = ("patients", "psychologists")
+
+# Extensões de áudio que o mimetypes não conhece (ou conhece com outro tipo) em algumas plataformas
+AUDIO_CONTENT_TYPES = {
+    ".m4a": "audio/mp4",
+    ".mp3": "audio/mpeg",
+    ".oga": "audio/ogg",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".wav": "audio/wav",
+    ".webm": "audio/webm",
+}
+
+def audio_content_type(filename: str) -> str:
+    """Tipo MIME de um arquivo de áudio pela extensão"""
+    extension = os.path.splitext(filename)[1].lower()
+    return AUDIO_CONTENT_TYPES.get(extension) or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+class SharedPostgrestClient(AsyncPostgrestClient):
+    """AsyncPostgrestClient que usa um httpx.AsyncClient já existente (pool compartilhado)"""
+    
+    def __init__(self, base_url: str, http_client: httpx.AsyncClient, **kwargs: Any):
+        self._http_client = http_client
+        super().__init__(base_url, **kwargs)
+    
+    def create_session(self, base_url: str, headers: Dict[str, str], timeout: Any) -> httpx.AsyncClient:
+        # Mantém o timeout e os limites do pool configurados no cliente compartilhado
+        self._http_client.base_url = base_url
+        self._http_client.headers.update(headers)
+        return self._http_client
+
 class SupabaseService:
-    def __init__(self):
-        self.client: Client = create_client(settings.supabase_url, settings.supabase_key)
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self._client: Optional[Client] = None
+        # Cliente PostgREST assíncrono; uma única instância compartilha o pool de conexões
+        headers = {
+            "apikey": settings.supabase_key,
+            "Authorization": f"Bearer {settings.supabase_key}"
+        }
+        if http_client is not None:
+            self.async_client = SharedPostgrestClient(f"{settings.supabase_url}/rest/v1", http_client, headers=headers)
+        else:
+            self.async_client = AsyncPostgrestClient(f"{settings.supabase_url}/rest/v1", headers=headers)
+        instrument_postgrest_client(self.async_client.session)
+        # Pacientes e psicólogos, com TTL e remoção dos menos usados (LRU)
+        self.entity_cache = (
+            MemoryCacheBackend(settings.entity_cache_max_mb * 1024 * 1024)
+            if settings.entity_cache_ttl > 0 else None
+        )
+    
+    @property
+    def client(self) -> Client:
+        """Cliente síncrono do Supabase (Storage e métodos síncronos), criado apenas no primeiro uso"""
+        if self._client is None:
+            self._client = create_client(settings.supabase_url, settings.supabase_key)
+        return self._client
+    
+    def _cache_entity(self, table: str, row: Optional[Dict[str, Any]]):
+        """Guarda a linha no cache de entidades, substituindo qualquer versão anterior"""
+        if row and self.entity_cache and table in CACHED_TABLES:
+            self.entity_cache.set(f"{table}:{row['id']}", row, settings.entity_cache_ttl)
+    
+    def _split_cached(self, table: str, ids: Iterable[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """Separa os ids já em cache dos que precisam ser buscados no banco"""
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for entity_id in dict.fromkeys(str(entity_id) for entity_id in ids):
+            row = self.entity_cache.get(f"{table}:{entity_id}") if self.entity_cache and table in CACHED_TABLES else None
+            if row is None:
+                missing.append(entity_id)
+            else:
+                found[entity_id] = row
+        return found, missing
+    
+    def _store_fetched(self, table: str, found: Dict[str, Dict[str, Any]], rows: Optional[List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        for row in rows or []:
+            self._cache_entity(table, row)
+            found[str(row["id"])] = row
+        return found
+    
+    def get_many(self, table: str, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Busca várias linhas por id em uma única consulta (`in`), passando antes pelo cache
+        
+        Retorna um dicionário id -> linha; ids inexistentes ficam de fora.
+        """
+        found, missing = self._split_cached(table, ids)
+        if missing:
+            response = self.client.table(table).select("*").in_("id", missing).execute()
+            self._store_fetched(table, found, response.data)
+        return found
+    
+    async def get_many_async(self, table: str, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Versão assíncrona de get_many"""
+        found, missing = self._split_cached(table, ids)
+        if missing:
+            response = await self.async_client.table(table).select("*").in_("id", missing).execute()
+            self._store_fetched(table, found, response.data)
+        return found
+    
+    def _list_query(self, query, limit: Optional[int], cursor: Optional[str]):
+        """Ordena por (created_at, id) decrescente e aplica o cursor e o limite
+        
+        Busca `limit + 1` linhas para que o chamador saiba se existe próxima página.
+        """
+        # O cliente PostgREST não expõe `or` nem ordenação por várias colunas
+        if cursor:
+            query.params = query.params.add("or", f"({keyset_filter(cursor)})")
+        query.params = query.params.add("order", "created_at.desc,id.desc")
+        if limit:
+            query = query.limit(limit + 1)
+        return query
+    
+    def _select_columns(self, columns: Optional[List[str]]) -> str:
+        return ",".join(columns) if columns else "*"
     
     def _sanitize_filename(self, filename: str) -> str:
         """Sanitiza o nome do arquivo para seguir as regras do AWS S3/Supabase Storage
@@ -68,8 +186,12 @@ class SupabaseService:
             # O upload vai falhar depois se o bucket realmente não existir
             pass
     
-    def upload_audio(self, file_content: bytes, filename: str) -> str:
-        """Upload áudio para Supabase Storage e retorna URL"""
+    def upload_audio(self, file_content: bytes, filename: str, content_type: Optional[str] = None) -> str:
+        """Upload áudio para Supabase Storage e retorna URL
+        
+        Sem `content_type`, o tipo é deduzido da extensão do arquivo (ex: .ogg do áudio
+        normalizado), para o Storage servir o áudio com o tipo correto.
+        """
         # Tenta garantir que o bucket existe
         self._ensure_bucket_exists()
         
@@ -83,7 +205,7 @@ class SupabaseService:
             self.client.storage.from_(settings.supabase_storage_bucket).upload(
                 file_path,
                 file_content,
-                file_options={"content-type": "audio/mpeg"}
+                file_options={"content-type": content_type or audio_content_type(filename)}
             )
             
             # Retorna URL pública
@@ -125,47 +247,208 @@ class SupabaseService:
         response = self.client.table("sessions").update(updates).eq("id", session_id).execute()
         return response.data[0] if response.data else None
     
-    def list_sessions(self, psychologist_id: Optional[str] = None, patient_id: Optional[str] = None) -> list[Dict[str, Any]]:
-        """Lista sessões com filtros opcionais"""
-        query = self.client.table("sessions").select("*")
+    def list_sessions(
+        self,
+        psychologist_id: Optional[str] = None,
+        patient_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        columns: Optional[List[str]] = None
+    ) -> list[Dict[str, Any]]:
+        """Lista sessões com filtros opcionais, paginação por cursor e projeção de colunas"""
+        query = self.client.table("sessions").select(self._select_columns(columns))
         
         if psychologist_id:
             query = query.eq("psychologist_id", psychologist_id)
         if patient_id:
             query = query.eq("patient_id", patient_id)
         
-        response = query.order("created_at", desc=True).execute()
+        response = self._list_query(query, limit, cursor).execute()
         return response.data if response.data else []
     
     # Métodos para Psicólogos
     def create_psychologist(self, psychologist_data: Dict[str, Any]) -> Dict[str, Any]:
         """Cria um novo psicólogo"""
         response = self.client.table("psychologists").insert(psychologist_data).execute()
-        return response.data[0] if response.data else None
+        psychologist = response.data[0] if response.data else None
+        self._cache_entity("psychologists", psychologist)
+        return psychologist
     
     def get_psychologist(self, psychologist_id: str) -> Optional[Dict[str, Any]]:
         """Busca um psicólogo por ID"""
-        response = self.client.table("psychologists").select("*").eq("id", psychologist_id).execute()
-        return response.data[0] if response.data else None
+        return self.get_many("psychologists", [psychologist_id]).get(str(psychologist_id))
     
-    def list_psychologists(self) -> list[Dict[str, Any]]:
-        """Lista todos os psicólogos"""
-        response = self.client.table("psychologists").select("*").order("created_at", desc=True).execute()
+    def list_psychologists(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        columns: Optional[List[str]] = None
+    ) -> list[Dict[str, Any]]:
+        """Lista psicólogos com paginação por cursor e projeção de colunas"""
+        query = self.client.table("psychologists").select(self._select_columns(columns))
+        response = self._list_query(query, limit, cursor).execute()
         return response.data if response.data else []
     
     # Métodos para Pacientes
     def create_patient(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
         """Cria um novo paciente"""
         response = self.client.table("patients").insert(patient_data).execute()
-        return response.data[0] if response.data else None
+        patient = response.data[0] if response.data else None
+        self._cache_entity("patients", patient)
+        return patient
     
     def get_patient(self, patient_id: str) -> Optional[Dict[str, Any]]:
         """Busca um paciente por ID"""
-        response = self.client.table("patients").select("*").eq("id", patient_id).execute()
+        return self.get_many("patients", [patient_id]).get(str(patient_id))
+    
+    def list_patients(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        columns: Optional[List[str]] = None
+    ) -> list[Dict[str, Any]]:
+        """Lista pacientes com paginação por cursor e projeção de colunas"""
+        query = self.client.table("patients").select(self._select_columns(columns))
+        response = self._list_query(query, limit, cursor).execute()
+        return response.data if response.data else []
+    
+    # Versões assíncronas (PostgREST assíncrono, sem bloquear o event loop)
+    async def create_session_async(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Cria uma nova sessão no banco"""
+        response = await self.async_client.table("sessions").insert(session_data).execute()
+        return response.data[0] if response.data else None
+    
+    async def create_sessions_async(self, sessions_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Cria várias sessões em uma única requisição, na ordem recebida"""
+        response = await self.async_client.table("sessions").insert(sessions_data).execute()
+        return response.data or []
+    
+    async def update_sessions_async(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Atualiza várias sessões com valores diferentes por linha (upsert pelo id)
+        
+        Cada linha precisa do `id` e das colunas obrigatórias (psychologist_id, patient_id).
+        O PostgREST exige as mesmas colunas em todas as linhas de uma requisição, então as
+        linhas são agrupadas pelo conjunto de colunas.
+        """
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        
+        updated: List[Dict[str, Any]] = []
+        for group in groups.values():
+            response = await self.async_client.table("sessions").upsert(group, on_conflict="id").execute()
+            updated.extend(response.data or [])
+        return updated
+    
+    async def set_sessions_batch_async(self, session_ids: List[str], openai_batch_id: Optional[str]):
+        """Registra nas sessões o lote da Batch API que gera suas perguntas e análises"""
+        await self.async_client.table("sessions").update({"openai_batch_id": openai_batch_id}).in_("id", session_ids).execute()
+    
+    async def get_sessions_by_batch_async(self, openai_batch_id: str) -> List[Dict[str, Any]]:
+        """Sessões que ainda aguardam o resultado de um lote da Batch API"""
+        response = await self.async_client.table("sessions").select(
+            "id, psychologist_id, patient_id"
+        ).eq("openai_batch_id", openai_batch_id).execute()
+        return response.data or []
+    
+    async def get_session_async(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Busca uma sessão por ID"""
+        response = await self.async_client.table("sessions").select("*").eq("id", session_id).execute()
+        return response.data[0] if response.data else None
+    
+    async def update_session_async(self, session_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Atualiza uma sessão"""
+        response = await self.async_client.table("sessions").update(updates).eq("id", session_id).execute()
         return response.data[0] if response.data else None
     
-    def list_patients(self) -> list[Dict[str, Any]]:
-        """Lista todos os pacientes"""
-        response = self.client.table("patients").select("*").order("created_at", desc=True).execute()
+    async def list_sessions_async(
+        self,
+        psychologist_id: Optional[str] = None,
+        patient_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        columns: Optional[List[str]] = None
+    ) -> list[Dict[str, Any]]:
+        """Lista sessões com filtros opcionais, paginação por cursor e projeção de colunas"""
+        query = self.async_client.table("sessions").select(self._select_columns(columns))
+        
+        if psychologist_id:
+            query = query.eq("psychologist_id", psychologist_id)
+        if patient_id:
+            query = query.eq("patient_id", patient_id)
+        
+        response = await self._list_query(query, limit, cursor).execute()
         return response.data if response.data else []
-
+    
+    async def search_sessions_async(
+        self,
+        query: str,
+        psychologist_id: Optional[str] = None,
+        patient_id: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Busca textual nas sessões (função `search_sessions` do banco), da mais relevante para a menos
+        
+        Cada linha traz id, psychologist_id, patient_id, created_at, rank e os trechos
+        destacados de cada campo encontrado (`highlights`). Busca `limit + 1` linhas para
+        que o chamador saiba se existe próxima página.
+        """
+        params: Dict[str, Any] = {
+            "search_query": query,
+            "filter_psychologist_id": psychologist_id,
+            "filter_patient_id": patient_id,
+            "max_results": limit + 1
+        }
+        if cursor:
+            params["after_rank"], params["after_id"] = decode_rank_cursor(cursor)
+        response = await self.async_client.rpc("search_sessions", params).execute()
+        return response.data if response.data else []
+    
+    async def create_psychologist_async(self, psychologist_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Cria um novo psicólogo"""
+        response = await self.async_client.table("psychologists").insert(psychologist_data).execute()
+        psychologist = response.data[0] if response.data else None
+        self._cache_entity("psychologists", psychologist)
+        return psychologist
+    
+    async def get_psychologist_async(self, psychologist_id: str) -> Optional[Dict[str, Any]]:
+        """Busca um psicólogo por ID"""
+        return (await self.get_many_async("psychologists", [psychologist_id])).get(str(psychologist_id))
+    
+    async def list_psychologists_async(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        columns: Optional[List[str]] = None
+    ) -> list[Dict[str, Any]]:
+        """Lista psicólogos com paginação por cursor e projeção de colunas"""
+        query = self.async_client.table("psychologists").select(self._select_columns(columns))
+        response = await self._list_query(query, limit, cursor).execute()
+        return response.data if response.data else []
+    
+    async def create_patient_async(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Cria um novo paciente"""
+        response = await self.async_client.table("patients").insert(patient_data).execute()
+        patient = response.data[0] if response.data else None
+        self._cache_entity("patients", patient)
+        return patient
+    
+    async def get_patient_async(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        """Busca um paciente por ID"""
+        return (await self.get_many_async("patients", [patient_id])).get(str(patient_id))
+    
+    async def list_patients_async(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        columns: Optional[List[str]] = None
+    ) -> list[Dict[str, Any]]:
+        """Lista pacientes com paginação por cursor e projeção de colunas"""
+        query = self.async_client.table("patients").select(self._select_columns(columns))
+        response = await self._list_query(query, limit, cursor).execute()
+        return response.data if response.data else []
+    
+    async def aclose(self):
+        """Fecha as conexões HTTP do cliente assíncrono"""
+        await self.async_client.aclose()
@@ -0,0 +1,156 @@
+from openai import AsyncOpenAI
+from app.config import settings
+from app.services.rate_limiter import OpenAIScheduler
+from app.utils import metrics, whisper_worker
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+
+logger = logging.getLogger(__name__)
+
+class TranscriptionBackend:
+    """Interface dos motores de transcrição
+
+    `transcribe` recebe um áudio em disco e retorna {"text", "segments", "duration"}, com
+    os segmentos em segundos relativos ao início do arquivo.
+    """
+
+    name = ""
+    model = ""
+    # Tamanho máximo aceito por chamada (None: sem limite); acima disso o áudio é dividido
+    max_file_bytes: Optional[int] = None
+    price_per_minute = 0.0
+
+    async def transcribe(self, audio_path: str, filename: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+def _field(segment: Any, name: str) -> Any:
+    """Campo de um segmento do verbose_json: objeto no openai>=1.55 (TranscriptionVerbose), dict antes disso"""
+    return segment[name] if isinstance(segment, dict) else getattr(segment, name)
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """Transcrição pela API da OpenAI (whisper-1), passando pelo agendador quando configurado"""
+
+    name = "openai"
+    model = "whisper-1"
+    price_per_minute = metrics.WHISPER_PRICE_PER_MINUTE
+
+    def __init__(self, async_client: AsyncOpenAI, scheduler: Optional[OpenAIScheduler] = None):
+        self.async_client = async_client
+        self.scheduler = scheduler
+        self.max_file_bytes = int(settings.transcription_max_file_mb * 1024 * 1024)
+
+    async def transcribe(self, audio_path: str, filename: str) -> Dict[str, Any]:
+        params = {"model": self.model, "language": "pt", "response_format": "verbose_json"}
+        with open(audio_path, "rb") as audio_file:
+            # O Whisper identifica o formato pela extensão do nome
+            upload = (filename, audio_file)
+            if self.scheduler is None:
+                transcript = await self.async_client.audio.transcriptions.create(file=upload, **params)
+            else:
+                async def call():
+                    # Cada tentativa reenvia o arquivo desde o início
+                    audio_file.seek(0)
+                    return await self.async_client.audio.transcriptions.with_raw_response.create(file=upload, **params)
+
+                transcript = (await self.scheduler.run(self.model, call)).parse()
+
+        segments = [
+            {"start": float(_field(segment, "start")), "end": float(_field(segment, "end")), "text": _field(segment, "text")}
+            for segment in (getattr(transcript, "segments", None) or [])
+        ]
+        return {"text": transcript.text, "segments": segments, "duration": getattr(transcript, "duration", None)}
+
+def available_cores() -> int:
+    """Núcleos que o processo pode usar (respeita a afinidade de CPU do container)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """Transcrição na CPU com faster-whisper (CTranslate2), sem enviar o áudio pela rede
+
+    Cada processo do pool carrega o modelo (quantizado em `local_whisper_compute_type`)
+    uma vez e o mantém em memória. O pool tem um processo para cada
+    `local_whisper_cpu_threads` núcleos disponíveis, salvo `local_whisper_workers`.
+    Requer o pacote `faster-whisper`.
+    """
+
+    name = "local"
+
+    def __init__(self):
+        if importlib.util.find_spec("faster_whisper") is None:
+            raise RuntimeError("Motor local de transcrição requer o pacote faster-whisper (pip install faster-whisper)")
+        self.model = f"faster-whisper-{os.path.basename(settings.local_whisper_model.rstrip('/'))}"
+        self.workers = settings.local_whisper_workers or max(1, available_cores() // max(1, settings.local_whisper_cpu_threads))
+        self._pool = self._create_pool()
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # spawn: os processos não herdam o event loop nem as threads do servidor
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=whisper_worker.load_model,
+            initargs=(
+                settings.local_whisper_model,
+                settings.local_whisper_compute_type,
+                settings.local_whisper_cpu_threads,
+                settings.local_whisper_download_root
+            )
+        )
+
+    def warm_up(self):
+        """Inicia todos os processos do pool, carregando o modelo antes da primeira transcrição"""
+        logger.info(f"Carregando {self.model} em {self.workers} processos")
+        for _ in range(self.workers):
+            self._pool.submit(whisper_worker.ready)
+
+    async def transcribe(self, audio_path: str, filename: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._pool,
+                whisper_worker.transcribe,
+                audio_path,
+                settings.local_whisper_beam_size,
+                settings.local_whisper_vad_filter
+            )
+        except BrokenProcessPool as e:
+            # Um processo morreu (ex: falta de memória) ou o modelo não carregou; recria o pool
+            logger.error(f"Pool de transcrição local interrompido: {str(e)}")
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._create_pool()
+            raise RuntimeError("O motor local de transcrição falhou; tente novamente") from e
+
+    async def aclose(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+TRANSCRIPTION_BACKENDS = ("openai", "local")
+
+def create_transcription_backends(
+    async_client: AsyncOpenAI,
+    scheduler: Optional[OpenAIScheduler] = None
+) -> Dict[str, TranscriptionBackend]:
+    """Motores disponíveis no processo: sempre a OpenAI e, se habilitado, o local
+
+    O local é criado quando é o padrão (`transcription_backend`) ou com
+    `transcription_local_enabled`, para ser escolhido por requisição.
+    """
+    if settings.transcription_backend not in TRANSCRIPTION_BACKENDS:
+        raise ValueError(f"transcription_backend inválido: {settings.transcription_backend}")
+    backends: Dict[str, TranscriptionBackend] = {"openai": OpenAIWhisperBackend(async_client, scheduler)}
+    if settings.transcription_backend == "local" or settings.transcription_local_enabled:
+        local = LocalWhisperBackend()
+        if settings.local_whisper_preload:
+            local.warm_up()
+        backends["local"] = local
+    return backends
@@ -0,0 +1,146 @@
+# Divisão de áudios longos em trechos para transcrição (requer ffmpeg/ffprobe)
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import re
+import shutil
+
+SILENCE_START_RE = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+SILENCE_END_RE = re.compile(r"silence_end: (-?\d+(?:\.\d+)?)")
+
+def ffmpeg_available() -> bool:
+    """Indica se ffmpeg e ffprobe estão instalados"""
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+async def run_tool(*args: str) -> Tuple[int, str, str]:
+    """Executa ffmpeg/ffprobe sem bloquear o event loop; retorna (código, stdout, stderr)"""
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    return process.returncode, stdout.decode(errors="ignore"), stderr.decode(errors="ignore")
+
+async def probe_duration(path: str) -> float:
+    """Retorna a duração do áudio em segundos"""
+    code, stdout, stderr = await run_tool(
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", path
+    )
+    if code != 0:
+        raise Exception(f"Não foi possível ler a duração do áudio: {stderr.strip()}")
+    return float(stdout.strip())
+
+async def detect_silences(
+    path: str,
+    noise_db: float,
+    min_silence: float,
+    duration: Optional[float] = None
+) -> List[Tuple[float, float]]:
+    """Detecta intervalos de silêncio (início, fim) com o filtro silencedetect do ffmpeg
+
+    Um silêncio que vai até o fim do arquivo pode não ter `silence_end`; com `duration`
+    ele é fechado no fim do áudio em vez de descartado.
+    """
+    code, _, stderr = await run_tool(
+        "ffmpeg", "-hide_banner", "-nostats", "-i", path,
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f", "null", "-"
+    )
+    if code != 0:
+        raise Exception(f"Não foi possível detectar silêncios no áudio: {stderr.strip()[-500:]}")
+    starts = [float(value) for value in SILENCE_START_RE.findall(stderr)]
+    ends = [float(value) for value in SILENCE_END_RE.findall(stderr)]
+    if duration is not None and len(starts) > len(ends):
+        ends.append(duration)
+    return list(zip(starts, ends))
+
+def plan_chunks(
+    duration: float,
+    silences: List[Tuple[float, float]],
+    chunk_seconds: float,
+    overlap: float,
+    search_window: Optional[float] = None
+) -> List[Dict[str, float]]:
+    """Define os trechos a transcrever, cortando no silêncio mais próximo do tamanho alvo
+
+    Cada trecho tem `cut_start`/`cut_end` (fronteiras usadas para juntar o texto) e
+    `start`/`end` (fronteiras estendidas pela sobreposição, usadas na extração).
+    """
+    if search_window is None:
+        search_window = chunk_seconds * 0.2
+    midpoints = [(start + end) / 2 for start, end in silences]
+
+    cuts = [0.0]
+    while duration - cuts[-1] > chunk_seconds:
+        target = cuts[-1] + chunk_seconds
+        candidates = [point for point in midpoints if cuts[-1] < point <= target and target - point <= search_window]
+        # Sem silêncio perto do alvo, corta no tamanho alvo (a sobreposição evita perder palavras)
+        cuts.append(max(candidates) if candidates else target)
+    cuts.append(duration)
+
+    chunks = []
+    for index in range(len(cuts) - 1):
+        cut_start, cut_end = cuts[index], cuts[index + 1]
+        chunks.append({
+            "index": index,
+            "cut_start": cut_start,
+            "cut_end": cut_end,
+            "start": max(0.0, cut_start - overlap),
+            "end": min(duration, cut_end + overlap)
+        })
+    return chunks
+
+async def extract_chunk(
+    path: str,
+    output_path: str,
+    start: float,
+    end: float,
+    codec: str = "libmp3lame",
+    bitrate: str = "64k"
+):
+    """Extrai um trecho do áudio mono 16 kHz (MP3 por padrão, formato compacto aceito pelo Whisper)"""
+    code, _, stderr = await run_tool(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", path,
+        "-ac", "1", "-ar", "16000", "-c:a", codec, "-b:a", bitrate,
+        output_path
+    )
+    if code != 0:
+        raise Exception(f"Não foi possível extrair trecho do áudio: {stderr.strip()}")
+
+def _overlap_ratio(previous: Dict[str, Any], start: float, end: float) -> float:
+    """Fração do segmento [start, end] coberta pelo segmento anterior"""
+    if end <= start:
+        return 1.0 if start < previous["end"] else 0.0
+    covered = min(end, previous["end"]) - max(start, previous["start"])
+    return max(0.0, covered) / (end - start)
+
+def stitch_segments(chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Junta os segmentos transcritos de cada trecho em ordem, com tempos absolutos
+
+    Em cada região de sobreposição só é mantido o segmento do trecho cuja fronteira
+    de corte contém o ponto médio do segmento; segmentos que repetem o anterior
+    (mesma fala transcrita pelos dois trechos) são descartados.
+    """
+    segments = []
+    ordered = sorted(chunks, key=lambda item: item["index"])
+    for position, chunk in enumerate(ordered):
+        is_last = position == len(ordered) - 1
+        for segment in chunk["segments"]:
+            start = chunk["start"] + segment["start"]
+            end = chunk["start"] + segment["end"]
+            middle = (start + end) / 2
+            if middle < chunk["cut_start"] or (middle >= chunk["cut_end"] and not is_last):
+                continue
+            text = segment["text"].strip()
+            if segments and _overlap_ratio(segments[-1], start, end) > 0.5:
+                # Mesmo trecho de fala transcrito pelos dois lados do corte
+                continue
+            if text:
+                segments.append({"start": round(start, 3), "end": round(end, 3), "text": text})
+
+    return {
+        "text": " ".join(segment["text"] for segment in segments),
+        "segments": segments
+    }
@@ -0,0 +1,77 @@
+# Normalização do áudio antes da transcrição e do armazenamento (requer ffmpeg com libopus)
+from app.utils.audio_chunking import detect_silences, probe_duration, run_tool
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import os
+
+class PreprocessedAudio(NamedTuple):
+    """Áudio normalizado e o deslocamento, em segundos, do corte inicial em relação ao original"""
+    path: str
+    offset: float
+    duration: float
+    input_bytes: int
+    output_bytes: int
+
+def speech_bounds(
+    silences: List[Tuple[float, float]],
+    duration: float,
+    padding: float,
+    tolerance: float = 0.05
+) -> Tuple[float, float]:
+    """Início e fim da fala, sem o silêncio no começo e no fim do áudio
+
+    Só conta como silêncio de borda o que encosta no início ou no fim (com `tolerance`);
+    `padding` segundos de silêncio são mantidos em volta da fala. Um áudio todo em
+    silêncio é mantido inteiro.
+    """
+    start, end = 0.0, duration
+    if silences and silences[0][0] <= tolerance:
+        start = max(0.0, silences[0][1] - padding)
+    if silences and silences[-1][1] >= duration - tolerance and silences[-1][0] > start:
+        end = min(duration, silences[-1][0] + padding)
+    if end - start <= padding * 2:
+        return 0.0, duration
+    return start, end
+
+async def preprocess_audio(
+    source_path: str,
+    output_path: str,
+    sample_rate: int,
+    bitrate: str,
+    silence_db: float,
+    min_silence: float,
+    padding: float
+) -> Optional[PreprocessedAudio]:
+    """Converte o áudio para Opus mono em `sample_rate`, sem o silêncio das bordas
+
+    Retorna None quando o resultado não fica menor que o original (ex: áudio já
+    compacto); nesse caso o original deve ser usado. O ffmpeg usa uma thread por
+    conversão, para o paralelismo ser controlado por quem chama.
+    """
+    duration = await probe_duration(source_path)
+    silences = await detect_silences(source_path, silence_db, min_silence, duration)
+    start, end = speech_bounds(silences, duration, padding)
+
+    code, _, stderr = await run_tool(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-threads", "1",
+        "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", source_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-c:a", "libopus", "-b:a", bitrate, "-application", "voip",
+        output_path
+    )
+    if code != 0:
+        raise Exception(f"Não foi possível converter o áudio: {stderr.strip()[-500:]}")
+
+    input_bytes, output_bytes = os.path.getsize(source_path), os.path.getsize(output_path)
+    if output_bytes >= input_bytes:
+        return None
+    return PreprocessedAudio(output_path, start, end - start, input_bytes, output_bytes)
+
+def shift_segments(result: Dict[str, Any], offset: float) -> Dict[str, Any]:
+    """Leva os tempos dos segmentos de volta à linha do tempo do áudio original"""
+    if not offset:
+        return result
+    segments = [
+        {**segment, "start": round(segment["start"] + offset, 3), "end": round(segment["end"] + offset, 3)}
+        for segment in result["segments"]
+    ]
+    return {**result, "segments": segments}
@@ -0,0 +1,108 @@
+# Segmentação de áudio recebido ao vivo (PCM 16 bits mono), sem ffmpeg
+from array import array
+from typing import List, NamedTuple, Optional
+import io
+import math
+import sys
+import wave
+
+SAMPLE_WIDTH = 2  # bytes por amostra (PCM 16 bits)
+
+class Segment(NamedTuple):
+    """Trecho PCM e o instante, em segundos, em que começa no fluxo"""
+    start: float
+    pcm: bytes
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """Envolve amostras PCM 16 bits mono em um arquivo WAV"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as output:
+        output.setnchannels(1)
+        output.setsampwidth(SAMPLE_WIDTH)
+        output.setframerate(sample_rate)
+        output.writeframes(pcm)
+    return buffer.getvalue()
+
+def level_db(pcm: bytes) -> float:
+    """Nível RMS das amostras em dBFS (-inf para silêncio absoluto)"""
+    samples = array("h")
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH])
+    if sys.byteorder == "big":
+        # O PCM recebido é little-endian
+        samples.byteswap()
+    if not samples:
+        return float("-inf")
+    rms = math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+    return 20 * math.log10(rms / 32768) if rms else float("-inf")
+
+class PcmSegmenter:
+    """Corta um fluxo PCM 16 bits mono em segmentos terminados em silêncio
+
+    O áudio é analisado em janelas de `window_seconds`. Um segmento termina na primeira
+    pausa de ao menos `min_silence` segundos depois de `min_seconds`, ou em `max_seconds`
+    se ninguém parar de falar. Segmentos sem nenhuma janela acima de `silence_db` são
+    descartados (o Whisper tende a inventar texto em silêncio).
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        min_seconds: float,
+        max_seconds: float,
+        silence_db: float,
+        min_silence: float,
+        window_seconds: float = 0.1
+    ):
+        self.sample_rate = sample_rate
+        self.silence_db = silence_db
+        self.window_bytes = max(1, int(sample_rate * window_seconds)) * SAMPLE_WIDTH
+        self.min_bytes = int(sample_rate * min_seconds) * SAMPLE_WIDTH
+        self.max_bytes = max(self.min_bytes, int(sample_rate * max_seconds) * SAMPLE_WIDTH)
+        self.min_silence_windows = max(1, math.ceil(min_silence / window_seconds))
+        self.offset = 0.0  # início do segmento atual, em segundos desde o começo do fluxo
+        self._pending = bytearray()  # bytes recebidos que ainda não completam uma janela
+        self._segment = bytearray()
+        self._silent_windows = 0
+        self._has_speech = False
+
+    def _cut(self) -> Optional[bytes]:
+        segment, has_speech = bytes(self._segment), self._has_speech
+        self._segment.clear()
+        self._silent_windows = 0
+        self._has_speech = False
+        return segment if has_speech else None
+
+    def _duration(self, size: int) -> float:
+        return size / SAMPLE_WIDTH / self.sample_rate
+
+    def feed(self, pcm: bytes) -> List[Segment]:
+        """Adiciona amostras e retorna os segmentos que terminaram com elas"""
+        self._pending.extend(pcm)
+        finished = []
+        while len(self._pending) >= self.window_bytes:
+            window = bytes(self._pending[:self.window_bytes])
+            del self._pending[:self.window_bytes]
+            self._segment.extend(window)
+            if level_db(window) < self.silence_db:
+                self._silent_windows += 1
+            else:
+                self._silent_windows = 0
+                self._has_speech = True
+
+            paused = self._silent_windows >= self.min_silence_windows and len(self._segment) >= self.min_bytes
+            if paused or len(self._segment) >= self.max_bytes:
+                start = self.offset
+                self.offset += self._duration(len(self._segment))
+                segment = self._cut()
+                if segment is not None:
+                    finished.append(Segment(start, segment))
+        return finished
+
+    def flush(self) -> Optional[Segment]:
+        """Encerra o fluxo retornando o último segmento (None se só havia silêncio)"""
+        self._segment.extend(self._pending)
+        self._pending.clear()
+        start = self.offset
+        self.offset += self._duration(len(self._segment))
+        segment = self._cut()
+        return Segment(start, segment) if segment is not None else None
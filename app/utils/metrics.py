@@ -0,0 +1,227 @@
+# Métricas Prometheus (expostas em /metrics) e tempos por requisição no header Server-Timing
+from prometheus_client import Counter, Gauge, Histogram
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import httpx
+import time
+
+# Chamadas à OpenAI levam de segundos a minutos; consultas ao Supabase, milissegundos
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+QUERY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Atraso do event loop: acima de alguns milissegundos algo está bloqueando o loop
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Preço em USD por 1M de tokens (entrada, saída); modelos fora da tabela não somam custo
+MODEL_PRICES = {
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6)
+}
+# Preço em USD por 1M de tokens de entrada lidos do cache de prompts; modelos fora da
+# tabela não têm desconto
+MODEL_CACHED_INPUT_PRICES = {
+    "gpt-4o": 1.25,
+    "gpt-4o-mini": 0.075
+}
+WHISPER_PRICE_PER_MINUTE = 0.006
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "psiapi_http_request_duration_seconds", "Duração das requisições HTTP",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "psiapi_http_requests_in_progress", "Requisições HTTP em andamento", ["method"]
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    "psiapi_pipeline_stage_duration_seconds", "Duração de cada etapa do processamento da sessão",
+    ["stage", "status"], buckets=LATENCY_BUCKETS
+)
+PIPELINE_STAGES_IN_PROGRESS = Gauge(
+    "psiapi_pipeline_stages_in_progress", "Etapas do processamento em andamento", ["stage"]
+)
+OPENAI_REQUEST_SECONDS = Histogram(
+    "psiapi_openai_request_duration_seconds", "Duração das chamadas à OpenAI por método do OpenAIService",
+    ["operation", "model", "status"], buckets=LATENCY_BUCKETS
+)
+OPENAI_REQUESTS_IN_PROGRESS = Gauge(
+    "psiapi_openai_requests_in_progress", "Chamadas à OpenAI em andamento", ["operation"]
+)
+OPENAI_TOKENS = Counter(
+    "psiapi_openai_tokens_total", "Tokens consumidos (response.usage)", ["operation", "model", "type"]
+)
+OPENAI_COST = Counter(
+    "psiapi_openai_cost_usd_total", "Custo estimado das chamadas à OpenAI em USD", ["operation", "model"]
+)
+OPENAI_AUDIO_SECONDS = Counter(
+    "psiapi_openai_audio_seconds_total", "Segundos de áudio transcritos", ["model"]
+)
+OPENAI_RETRIES = Counter(
+    "psiapi_openai_retries_total", "Chamadas à OpenAI repetidas após falha temporária", ["model", "reason"]
+)
+OPENAI_ROUTED_CALLS = Counter(
+    "psiapi_openai_routed_calls_total", "Chamadas à OpenAI por etapa, modelo e papel na rota",
+    ["operation", "model", "variant"]
+)
+OPENAI_FALLBACKS = Counter(
+    "psiapi_openai_fallbacks_total", "Etapas que passaram ao próximo modelo da rota após falha", ["operation", "model"]
+)
+OPENAI_CONCURRENCY_LIMIT = Gauge(
+    "psiapi_openai_concurrency_limit", "Limite adaptativo de chamadas simultâneas por modelo", ["model"]
+)
+OPENAI_QUEUE_WAIT_SECONDS = Histogram(
+    "psiapi_openai_queue_wait_seconds", "Espera na fila do agendador antes de chamar a OpenAI",
+    ["model", "priority"], buckets=LATENCY_BUCKETS
+)
+SUPABASE_QUERY_SECONDS = Histogram(
+    "psiapi_supabase_query_duration_seconds", "Duração das consultas ao Supabase (PostgREST)",
+    ["table", "operation", "status"], buckets=QUERY_BUCKETS
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "psiapi_event_loop_lag_seconds", "Atraso do event loop em relação ao intervalo de amostragem",
+    buckets=LOOP_LAG_BUCKETS
+)
+AUDIO_PREPROCESS_BYTES = Counter(
+    "psiapi_audio_preprocess_bytes_total", "Bytes de áudio antes e depois do pré-processamento", ["stage"]
+)
+LIVE_STREAMS_IN_PROGRESS = Gauge(
+    "psiapi_live_streams_in_progress", "Sessões transmitindo áudio ao vivo (WebSocket /sessions/{id}/stream)"
+)
+LIVE_SEGMENTS = Counter(
+    "psiapi_live_segments_total", "Segmentos de áudio ao vivo transcritos", ["status"]
+)
+CACHE_EVENTS = Counter(
+    "psiapi_cache_events_total", "Acertos, faltas e erros do cache de transcrições e respostas",
+    ["namespace", "event"]
+)
+
+# Intervalos (início, fim) da requisição HTTP atual, por nome (ver app/middleware/metrics.py)
+_server_timing: ContextVar[Optional[Dict[str, List[Tuple[float, float]]]]] = ContextVar("server_timing", default=None)
+
+def start_server_timing() -> Dict[str, List[Tuple[float, float]]]:
+    """Começa a registrar os tempos da requisição atual"""
+    timings: Dict[str, List[Tuple[float, float]]] = {}
+    _server_timing.set(timings)
+    return timings
+
+def stop_server_timing():
+    """Para de acumular tempos no contexto atual (ex: jobs em segundo plano)"""
+    _server_timing.set(None)
+
+def record_timing(name: str, seconds: float):
+    """Registra um intervalo de `seconds` terminado agora no tempo `name` da requisição atual, se houver uma"""
+    timings = _server_timing.get()
+    if timings is not None:
+        ended_at = time.perf_counter()
+        timings.setdefault(name, []).append((ended_at - seconds, ended_at))
+
+def covered_seconds(intervals: List[Tuple[float, float]]) -> float:
+    """Tempo coberto por pelo menos um intervalo (chamadas simultâneas não são somadas)"""
+    covered = 0.0
+    current_start, current_end = None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                covered += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        covered += current_end - current_start
+    return covered
+
+def server_timing_header(timings: Dict[str, List[Tuple[float, float]]], total: float) -> str:
+    """Valor do header Server-Timing, com as durações em milissegundos
+
+    Cada nome informa o tempo de relógio em que havia ao menos uma operação dele em
+    andamento; com as análises em paralelo, `openai` nunca passa de `total`.
+    """
+    durations = {"total": total, **{name: covered_seconds(intervals) for name, intervals in timings.items()}}
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items())
+
+async def monitor_event_loop_lag(interval: float):
+    """Mede continuamente quanto o event loop demora além de `interval` para acordar uma tarefa
+    
+    Executada em segundo plano pela aplicação (lifespan em app/main.py) até ser cancelada.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started_at = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started_at - interval))
+
+def observe_stage(stage: str, status: str, seconds: float):
+    PIPELINE_STAGE_SECONDS.labels(stage, status).observe(seconds)
+    record_timing(stage, seconds)
+
+def observe_openai_request(operation: str, model: str, status: str, seconds: float):
+    OPENAI_REQUEST_SECONDS.labels(operation, model, status).observe(seconds)
+    record_timing("openai", seconds)
+
+def record_openai_usage(operation: str, model: str, usage: Any):
+    """Soma os tokens de `response.usage` e o custo estimado pela tabela MODEL_PRICES
+    
+    Tokens de entrada lidos do cache de prompts (`prompt_tokens_details.cached_tokens`)
+    também são contados em separado (type="cached") e custam MODEL_CACHED_INPUT_PRICES.
+    """
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+    OPENAI_TOKENS.labels(operation, model, "prompt").inc(prompt_tokens)
+    OPENAI_TOKENS.labels(operation, model, "completion").inc(completion_tokens)
+    OPENAI_TOKENS.labels(operation, model, "cached").inc(cached_tokens)
+    prices = MODEL_PRICES.get(model)
+    if prices:
+        cached_price = MODEL_CACHED_INPUT_PRICES.get(model, prices[0])
+        cost = (
+            (prompt_tokens - cached_tokens) * prices[0] + cached_tokens * cached_price + completion_tokens * prices[1]
+        ) / 1_000_000
+        OPENAI_COST.labels(operation, model).inc(cost)
+
+def record_audio_usage(model: str, seconds: Optional[float], price_per_minute: float = WHISPER_PRICE_PER_MINUTE):
+    """Soma a duração transcrita e o custo da transcrição (cobrado por minuto; 0 no motor local)"""
+    if not seconds:
+        return
+    OPENAI_AUDIO_SECONDS.labels(model).inc(seconds)
+    OPENAI_COST.labels("transcription", model).inc(seconds / 60 * price_per_minute)
+
+# Operação do PostgREST correspondente a cada método HTTP
+POSTGREST_OPERATIONS = {"GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+# Prefixo das rotas do PostgREST; o mesmo cliente também baixa arquivos do Storage
+POSTGREST_PATH_PREFIX = "/rest/v1/"
+
+def _postgrest_labels(request: httpx.Request) -> Optional[Tuple[str, str]]:
+    """Tabela (ou função rpc) e operação da consulta; None para requisições fora do PostgREST"""
+    path = request.url.path
+    if POSTGREST_PATH_PREFIX not in path:
+        return None
+    table = path.rstrip("/").rsplit("/", 1)[-1] or "unknown"
+    operation = POSTGREST_OPERATIONS.get(request.method, request.method.lower())
+    if operation == "insert" and "resolution=merge-duplicates" in request.headers.get("prefer", ""):
+        operation = "upsert"
+    return table, operation
+
+def instrument_postgrest_client(client: httpx.AsyncClient):
+    """Mede a latência de cada consulta ao PostgREST por tabela e operação (event hooks do httpx)"""
+
+    async def on_request(request: httpx.Request):
+        request.extensions["psiapi_started_at"] = time.perf_counter()
+
+    async def on_response(response: httpx.Response):
+        request = response.request
+        started_at = request.extensions.get("psiapi_started_at")
+        if started_at is None:
+            return
+        elapsed = time.perf_counter() - started_at
+        record_timing("supabase", elapsed)
+        labels = _postgrest_labels(request)
+        if labels:
+            # Downloads do Storage (um label por arquivo) ficam fora do histograma
+            SUPABASE_QUERY_SECONDS.labels(*labels, str(response.status_code)).observe(elapsed)
+
+    client.event_hooks["request"].append(on_request)
+    client.event_hooks["response"].append(on_response)
@@ -0,0 +1,82 @@
+# Paginação por cursor (keyset) em (created_at, id) e projeção de colunas nas listagens
+from datetime import datetime
+from fastapi import HTTPException
+from pydantic import BaseModel
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+import base64
+from uuid import UUID
+import binascii
+import json
+
+def _encode(values: List[Any]) -> str:
+    payload = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode(cursor: str) -> List[Any]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Cursor opaco com o (created_at, id) da última linha da página"""
+    return _encode([row["created_at"], str(row["id"])])
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Retorna (created_at, id) do cursor, normalizados; 400 se o cursor for inválido
+
+    O cursor vem do cliente e os valores vão para um filtro do PostgREST: só um timestamp
+    ISO 8601 e um uuid válidos são aceitos.
+    """
+    try:
+        created_at, row_id = _decode(cursor)
+        return datetime.fromisoformat(str(created_at)).isoformat(), str(UUID(str(row_id)))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def encode_rank_cursor(row: Dict[str, Any]) -> str:
+    """Cursor opaco com o (rank, id) da última linha de uma página de busca"""
+    return _encode([row["rank"], str(row["id"])])
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, str]:
+    """Retorna (rank, id) do cursor de busca; 400 se o cursor for inválido"""
+    try:
+        rank, row_id = _decode(cursor)
+        # Os valores vão como parâmetros da função de busca; o id precisa ser um uuid
+        return float(rank), str(UUID(str(row_id)))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def keyset_filter(cursor: str) -> str:
+    """Filtro `or` do PostgREST para as linhas após o cursor na ordem (created_at desc, id desc)"""
+    created_at, row_id = decode_cursor(cursor)
+    # Aspas duplas protegem os ":" e "+" do timestamp dentro do filtro
+    return f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})'
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> List[str]:
+    """Colunas pedidas em `fields=` (separadas por vírgula); todas as permitidas se vazio
+
+    `id` e `created_at` são sempre incluídos porque formam o cursor.
+    """
+    allowed = list(allowed)
+    if not fields:
+        return allowed
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(unknown)}")
+    return list(dict.fromkeys(["id", "created_at"] + requested))
+
+def build_page(
+    rows: List[Dict[str, Any]],
+    limit: int,
+    encode: Callable[[Dict[str, Any]], str] = encode_cursor,
+    model: Optional[Type[BaseModel]] = None
+) -> Dict[str, Any]:
+    """Monta a página a partir de até `limit + 1` linhas (a linha extra indica que há mais)
+
+    Com `model`, cada linha é validada e convertida no modelo de resposta.
+    """
+    items = rows[:limit]
+    next_cursor = encode(items[-1]) if len(rows) > limit and items else None
+    if model is not None:
+        items = [model(**item) for item in items]
+    return {"items": items, "next_cursor": next_cursor}
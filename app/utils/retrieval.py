@@ -0,0 +1,100 @@
+# Busca local de trechos da transcrição (BM25), sem chamadas à OpenAI
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Set
+import math
+import re
+import unicodedata
+
+# Palavras muito frequentes em português, que não ajudam a distinguir trechos
+PORTUGUESE_STOPWORDS = frozenset("""
+a ao aos aquela aquelas aquele aqueles aquilo as ate com como da das de dela delas dele deles depois do dos
+e ela elas ele eles em entre era eram essa essas esse esses esta estas este estes eu foi fomos for foram
+ha isso isto ja la lhe lhes mais mas me mesmo meu meus minha minhas muito na nas nao nem no nos nossa
+nossas nosso nossos num numa o os ou para pela pelas pelo pelos por qual quando que quem se sem ser seu
+seus so sua suas tambem te tem tinha tu tua tuas teu teus um uma umas uns voce voces vos ai entao ne ta
+pra pro sim aqui assim ainda bem sobre estar estava estou tenho vai vou
+""".split())
+
+WORD_RE = re.compile(r"\w+")
+
+def _strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if unicodedata.category(char) != "Mn")
+
+def tokenize(text: str) -> List[str]:
+    """Palavras em minúsculas e sem acentos, sem stopwords, números ou letras isoladas"""
+    return [
+        word for word in WORD_RE.findall(_strip_accents(text).lower())
+        if len(word) > 1 and not word.isdigit() and word not in PORTUGUESE_STOPWORDS
+    ]
+
+class BM25Index:
+    """Índice BM25 (Okapi) em memória sobre uma lista de trechos
+
+    Pensado para uma transcrição por vez (dezenas a centenas de trechos): o índice
+    é montado na hora, sem persistência.
+    """
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self._frequencies = [Counter(tokenize(document)) for document in documents]
+        self._lengths = [sum(frequencies.values()) for frequencies in self._frequencies]
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+        document_frequency: Counter = Counter()
+        for frequencies in self._frequencies:
+            document_frequency.update(frequencies.keys())
+        total = len(documents)
+        self._idf: Dict[str, float] = {
+            term: math.log(1 + (total - count + 0.5) / (count + 0.5)) for term, count in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        """Pontuação de cada trecho para a consulta (0 para trechos sem termos em comum)"""
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        results = []
+        for frequencies, length in zip(self._frequencies, self._lengths):
+            score = 0.0
+            normalization = self.k1 * (1 - self.b + self.b * length / (self._average_length or 1))
+            for term in terms:
+                frequency = frequencies.get(term, 0)
+                if frequency:
+                    score += self._idf[term] * frequency * (self.k1 + 1) / (frequency + normalization)
+            results.append(score)
+        return results
+
+    def search(self, query: str, limit: int = 5) -> List[int]:
+        """Índices dos trechos mais relevantes para a consulta, do mais para o menos relevante"""
+        scores = self.scores(query)
+        ranked = sorted((index for index, score in enumerate(scores) if score > 0), key=lambda index: -scores[index])
+        return ranked[:limit]
+
+    def select(self, queries: Iterable[str], fits: Callable[[int], bool]) -> List[int]:
+        """Trechos relevantes para várias consultas, alternando entre elas
+
+        A cada rodada, cada consulta contribui com o seu melhor trecho ainda não escolhido;
+        `fits(index)` decide se o trecho ainda cabe (ex: orçamento de tokens) e é chamado
+        uma vez por candidato. Retorna os índices em ordem cronológica.
+        """
+        rankings = [self.search(query, limit=len(self.documents)) for query in queries if query and query.strip()]
+        selected: Set[int] = set()
+        rejected: Set[int] = set()
+        positions = [0] * len(rankings)
+        progress = True
+        while progress:
+            progress = False
+            for ranking_index, ranking in enumerate(rankings):
+                while positions[ranking_index] < len(ranking):
+                    candidate = ranking[positions[ranking_index]]
+                    positions[ranking_index] += 1
+                    if candidate in selected or candidate in rejected:
+                        continue
+                    progress = True
+                    if fits(candidate):
+                        selected.add(candidate)
+                    else:
+                        rejected.add(candidate)
+                    break
+        return sorted(selected)
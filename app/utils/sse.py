@@ -0,0 +1,16 @@
+# Server-Sent Events (text/event-stream)
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator
+import json
+
+def sse_event(event: str, data: Any) -> str:
+    """Formata um evento SSE com os dados em JSON (uma única linha `data:`)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Resposta SSE sem cache nem buffer em proxies (ex: nginx), para cada trecho chegar na hora"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
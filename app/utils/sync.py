@@ -0,0 +1,38 @@
+# Versões síncronas (obsoletas) dos métodos dos serviços, para scripts fora da API
+from typing import Awaitable, Optional, TypeVar
+import asyncio
+import threading
+import warnings
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop próprio, em uma thread daemon, criado na primeira chamada"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="sync-services", daemon=True).start()
+    return _loop
+
+def run_sync(coroutine: Awaitable[T], replacement: str) -> T:
+    """Executa a corrotina de um serviço e espera o resultado, avisando que o método síncrono é obsoleto
+
+    Todas as chamadas usam o mesmo event loop, para que os clientes assíncronos (conexões
+    do httpx, agendador) continuem válidos entre elas. Dentro de um event loop (ex: na API)
+    a chamada bloquearia o loop: use `replacement`.
+    """
+    warnings.warn(
+        f"Os métodos síncronos dos serviços estão obsoletos e serão removidos; use {replacement}",
+        DeprecationWarning,
+        stacklevel=3
+    )
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+    coroutine.close()
+    raise RuntimeError(f"Método síncrono chamado dentro de um event loop; use {replacement}")
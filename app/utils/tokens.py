@@ -0,0 +1,93 @@
+# Contagem de tokens (tiktoken) e divisão de textos longos em trechos limitados por tokens
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Janela de contexto (entrada + saída) em tokens; modelos fora da tabela usam a menor (gpt-4)
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-3.5-turbo": 16385
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Tokens extras por mensagem do chat (papel e separadores)
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+# Limites de frase ou parágrafo, onde os trechos preferencialmente são cortados
+SENTENCE_BOUNDARY_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+@lru_cache(maxsize=None)
+def _encoding(model: str) -> Optional[Any]:
+    """Codificação do tiktoken para o modelo; None se o tiktoken não estiver disponível"""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken não instalado; tokens estimados por caracteres")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Modelo desconhecido pelo tiktoken (ex: nome configurado em uma rota)
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # A primeira carga baixa o vocabulário; sem rede, usa a estimativa
+        logger.warning(f"Não foi possível carregar o tokenizador de {model}: {str(e)}")
+        return None
+
+def count_tokens(text: str, model: str) -> int:
+    """Tokens de `text` no tokenizador do modelo (~4 caracteres por token sem tiktoken)"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: List[Dict[str, Any]], model: str) -> int:
+    """Tokens de entrada de uma chamada de chat"""
+    return sum(
+        TOKENS_PER_MESSAGE + count_tokens(str(message.get("content") or ""), model) for message in messages
+    ) + TOKENS_PER_REPLY
+
+def _split_long(text: str, max_tokens: int, model: str) -> List[str]:
+    """Corta um texto sem limites de frase em pedaços de até `max_tokens`"""
+    encoding = _encoding(model)
+    if encoding is None:
+        size = max_tokens * 4
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+def split_by_tokens(text: str, max_tokens: int, model: str) -> List[str]:
+    """Divide o texto em trechos de até `max_tokens`, cortando em fim de frase ou parágrafo"""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for sentence in SENTENCE_BOUNDARY_RE.split(text):
+        if not sentence.strip():
+            continue
+        tokens = count_tokens(sentence, model) + 1
+        if tokens > max_tokens:
+            pieces = _split_long(sentence, max_tokens, model)
+        else:
+            pieces = [sentence]
+        for piece in pieces:
+            piece_tokens = tokens if len(pieces) == 1 else count_tokens(piece, model) + 1
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
@@ -0,0 +1,82 @@
+from fastapi import HTTPException, UploadFile
+from typing import Optional
+from urllib.parse import urlsplit
+import asyncio
+import httpx
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+async def save_upload_to_tempfile(
+    upload: UploadFile,
+    max_bytes: int,
+    chunk_size: int,
+    directory: Optional[str] = None
+) -> str:
+    """Copia o upload para um arquivo temporário em blocos de `chunk_size` bytes
+    
+    Mantém a extensão original (usada pelo Whisper para identificar o formato) e
+    lança 413 se o arquivo ultrapassar `max_bytes`. Retorna o caminho do arquivo,
+    que deve ser removido por quem o recebe.
+    """
+    suffix = os.path.splitext(upload.filename or "")[1]
+    audio_file = await asyncio.to_thread(
+        tempfile.NamedTemporaryFile, delete=False, dir=directory, prefix="session_", suffix=suffix
+    )
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Arquivo excede o tamanho máximo permitido de {max_bytes // (1024 * 1024)} MB"
+                )
+            await asyncio.to_thread(audio_file.write, chunk)
+        await asyncio.to_thread(audio_file.close)
+    except BaseException:
+        audio_file.close()
+        os.remove(audio_file.name)
+        raise
+    
+    logger.info(f"Upload de {size} bytes salvo em {audio_file.name}")
+    return audio_file.name
+
+async def download_to_tempfile(
+    client: httpx.AsyncClient,
+    url: str,
+    max_bytes: int,
+    chunk_size: int,
+    directory: Optional[str] = None
+) -> str:
+    """Baixa o arquivo de `url` para um arquivo temporário, em blocos, sem carregá-lo em memória
+    
+    Mesmo contrato de save_upload_to_tempfile, mas com ValueError acima de `max_bytes`
+    (usado fora de requisições HTTP, ex: processamento em lote).
+    """
+    suffix = os.path.splitext(urlsplit(url).path)[1]
+    audio_file = await asyncio.to_thread(
+        tempfile.NamedTemporaryFile, delete=False, dir=directory, prefix="session_", suffix=suffix
+    )
+    size = 0
+    try:
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"Arquivo excede o tamanho máximo permitido de {max_bytes // (1024 * 1024)} MB")
+                await asyncio.to_thread(audio_file.write, chunk)
+        await asyncio.to_thread(audio_file.close)
+    except BaseException:
+        audio_file.close()
+        os.remove(audio_file.name)
+        raise
+    
+    logger.info(f"Download de {size} bytes salvo em {audio_file.name}")
+    return audio_file.name
@@ -0,0 +1,22 @@
+# Funções executadas nos processos do motor local de transcrição (faster-whisper)
+# Só usa a biblioteca padrão no import: cada processo do pool importa este módulo ao iniciar
+from typing import Any, Dict, Optional
+import os
+
+# Modelo carregado neste processo; fica em memória entre as transcrições
+_model: Any = None
+
+def load_model(model: str, compute_type: str, cpu_threads: int, download_root: Optional[str]):
+    """Inicializador dos processos do pool: carrega o modelo uma vez por processo"""
+    global _model
+    from faster_whisper import WhisperModel
+    _model = WhisperModel(model, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads, download_root=download_root)
+
+def ready() -> int:
+    return os.getpid()
+
+def transcribe(audio_path: str, beam_size: int, vad_filter: bool) -> Dict[str, Any]:
+    """Transcreve o arquivo retornando {"text", "segments", "duration"}"""
+    segments, info = _model.transcribe(audio_path, language="pt", beam_size=beam_size, vad_filter=vad_filter)
+    items = [{"start": float(segment.start), "end": float(segment.end), "text": segment.text} for segment in segments]
+    return {"text": "".join(item["text"] for item in items).strip(), "segments": items, "duration": info.duration}
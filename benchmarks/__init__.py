@@ -0,0 +1 @@
+# Scripts de benchmark da API
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Compara o tempo das análises da sessão nos modos "separate" e "combined"
+
+Uso (faz chamadas reais à OpenAI):
+    python -m benchmarks.analysis_modes transcricao.txt --runs 3
+"""
+from app.services.cache_service import CacheService
+from app.services.openai_service import OpenAIService
+from typing import Dict, List
+import argparse
+import asyncio
+import statistics
+import time
+
+async def run_separate(service: OpenAIService, transcription: str) -> float:
+    """Perguntas e as cinco análises, como no pipeline (perguntas e depois análises)"""
+    start = time.perf_counter()
+    await service.generate_session_questions_async(transcription, "", "")
+    await service.process_session_async(transcription)
+    return time.perf_counter() - start
+
+async def run_combined(service: OpenAIService, transcription: str) -> float:
+    """Uma única chamada estruturada"""
+    start = time.perf_counter()
+    await service.generate_combined_analysis_async(transcription)
+    return time.perf_counter() - start
+
+async def main(path: str, runs: int):
+    with open(path, encoding="utf-8") as transcription_file:
+        transcription = transcription_file.read()
+
+    # Sem cache: a partir da segunda execução as respostas viriam do cache de LLM
+    service = OpenAIService(cache=CacheService(None, 0))
+    timings: Dict[str, List[float]] = {"separate": [], "combined": []}
+    for run in range(runs):
+        timings["separate"].append(await run_separate(service, transcription))
+        timings["combined"].append(await run_combined(service, transcription))
+        print(f"Execução {run + 1}/{runs}: separate={timings['separate'][-1]:.1f}s combined={timings['combined'][-1]:.1f}s")
+
+    # Caracteres de entrada enviados por sessão em cada modo (6 chamadas x 1 chamada)
+    separate_chars = sum(
+        len(message["content"])
+        for request in [
+            service._session_questions_request(transcription, "", ""),
+            service._full_summary_request(transcription),
+            service._anonymous_summary_request(transcription),
+            service._patient_demand_request(transcription),
+            service._context_request(transcription),
+            service._ia_analysis_request(transcription)
+        ]
+        for message in request["messages"]
+    )
+    combined_chars = sum(len(message["content"]) for message in service._combined_analysis_request(transcription)["messages"])
+
+    print()
+    print(f"{'modo':<10} {'mediana (s)':>12} {'mín (s)':>8} {'máx (s)':>8} {'entrada (chars)':>16}")
+    for mode, chars in (("separate", separate_chars), ("combined", combined_chars)):
+        values = timings[mode]
+        print(f"{mode:<10} {statistics.median(values):>12.1f} {min(values):>8.1f} {max(values):>8.1f} {chars:>16}")
+
+    await service.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcription", help="Arquivo de texto com a transcrição da sessão")
+    parser.add_argument("--runs", type=int, default=1, help="Número de execuções de cada modo")
+    args = parser.parse_args()
+    asyncio.run(main(args.transcription, args.runs))
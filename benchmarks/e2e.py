@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Benchmark ponta a ponta de POST /sessions/ sem custo: a API roda contra servidores locais
+que imitam a OpenAI e o Supabase (ver benchmarks.mock_servers)
+
+Para cada modo, sobe a API em um processo separado (uvicorn), envia `--sessions` sessões
+com até `--concurrency` simultâneas e mede a latência de cada uma (até a resposta ou, no
+modo assíncrono, até o job terminar). Reporta p50/p95/p99, sessões por minuto, pico de
+memória (RSS) da API e o atraso do event loop (psiapi_event_loop_lag_seconds).
+
+Uso:
+    python -m benchmarks.e2e --sessions 40 --concurrency 8 --modes separate combined async
+    python -m benchmarks.e2e --rate-limit-rate 0.05 --rpm 300 --json resultado.json
+"""
+from benchmarks.mock_servers import add_arguments
+from prometheus_client.parser import text_string_to_metric_families
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import wave
+import httpx
+
+API_KEY = "benchmark"
+
+# Variáveis de ambiente e forma de envio de cada modo do pipeline
+MODES: Dict[str, Dict[str, Any]] = {
+    "separate": {"env": {"OPENAI_ANALYSIS_MODE": "separate"}, "async": False},
+    "combined": {"env": {"OPENAI_ANALYSIS_MODE": "combined"}, "async": False},
+    "sequential": {"env": {"OPENAI_ANALYSIS_MODE": "separate", "OPENAI_CONCURRENT_ANALYSES": "false"}, "async": False},
+    "async": {"env": {"OPENAI_ANALYSIS_MODE": "separate"}, "async": True}
+}
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _silent_wav(seconds: float) -> bytes:
+    """WAV mono de 16 kHz em silêncio (o conteúdo não importa para a OpenAI simulada)"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as output:
+        output.setnchannels(1)
+        output.setsampwidth(2)
+        output.setframerate(16000)
+        output.writeframes(b"\x00\x00" * int(16000 * seconds))
+    return buffer.getvalue()
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    """Pico de memória residente do processo (VmHWM do Linux; psutil nos demais sistemas)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    # Sem VmHWM, psutil só informa o RSS atual
+    return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+
+def _percentile(values: List[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else float("nan")
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+def _loop_lag(metrics_text: str) -> Tuple[Dict[float, float], float, float]:
+    """Buckets acumulados, soma e contagem de psiapi_event_loop_lag_seconds"""
+    buckets: Dict[float, float] = {}
+    total = count = 0.0
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != "psiapi_event_loop_lag_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_bucket"):
+                buckets[float(sample.labels["le"])] = sample.value
+            elif sample.name.endswith("_sum"):
+                total = sample.value
+            elif sample.name.endswith("_count"):
+                count = sample.value
+    return buckets, total, count
+
+def _lag_summary(before: str, after: str) -> Dict[str, Optional[float]]:
+    """Atraso médio e p99 (limite superior do bucket) do event loop durante a carga, em ms"""
+    buckets_before, sum_before, count_before = _loop_lag(before)
+    buckets_after, sum_after, count_after = _loop_lag(after)
+    count = count_after - count_before
+    if count <= 0:
+        return {"mean_ms": None, "p99_ms": None}
+    p99 = None
+    for bound in sorted(buckets_after):
+        if buckets_after[bound] - buckets_before.get(bound, 0.0) >= 0.99 * count:
+            p99 = bound
+            break
+    return {
+        "mean_ms": (sum_after - sum_before) / count * 1000,
+        "p99_ms": p99 * 1000 if p99 is not None and p99 != float("inf") else None
+    }
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    async with httpx.AsyncClient() as client:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Processo encerrou antes de responder em {url}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} não respondeu em {timeout:.0f}s")
+
+def _output(args: argparse.Namespace) -> Dict[str, Any]:
+    """Logs dos processos filhos: descartados, a menos que --verbose"""
+    return {} if args.verbose else {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+
+def _stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+async def _seed(supabase_url: str) -> Tuple[str, str]:
+    """Cria o psicólogo e o paciente usados em todas as sessões"""
+    async with httpx.AsyncClient(base_url=f"{supabase_url}/rest/v1") as client:
+        psychologist = (await client.post("/psychologists", json={"name": "Ana Souza", "email": "ana@example.com"})).json()[0]
+        patient = (await client.post("/patients", json={"name": "Pedro Lima", "psychologist_id": psychologist["id"]})).json()[0]
+    return psychologist["id"], patient["id"]
+
+async def _run_session(
+    client: httpx.AsyncClient,
+    audio: bytes,
+    psychologist_id: str,
+    patient_id: str,
+    async_processing: bool,
+    poll_interval: float
+) -> float:
+    """Envia uma sessão e retorna a latência até o resultado final; lança exceção em falhas"""
+    started_at = time.perf_counter()
+    response = await client.post(
+        "/sessions/",
+        data={
+            "psychologist_id": psychologist_id,
+            "patient_id": patient_id,
+            "async_processing": str(async_processing).lower()
+        },
+        files={"audio": ("sessao.wav", audio, "audio/wav")}
+    )
+    if response.status_code not in (200, 202):
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+    if async_processing:
+        status_url = response.json()["status_url"]
+        while True:
+            await asyncio.sleep(poll_interval)
+            status = (await client.get(status_url)).json()
+            if status["status"] == "completed":
+                break
+            if status["status"] == "failed":
+                raise RuntimeError(f"Job falhou: {status.get('error')}")
+    return time.perf_counter() - started_at
+
+async def run_mode(
+    name: str,
+    args: argparse.Namespace,
+    base_env: Dict[str, str],
+    audio: bytes,
+    psychologist_id: str,
+    patient_id: str
+) -> Dict[str, Any]:
+    mode = MODES[name]
+    port = _free_port()
+    env = {**base_env, **mode["env"]}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        **_output(args)
+    )
+    try:
+        api_url = f"http://127.0.0.1:{port}"
+        await _wait_ready(f"{api_url}/health", process)
+        timeout = httpx.Timeout(args.request_timeout)
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=api_url, headers={"X-API-Key": API_KEY}, timeout=timeout, limits=limits) as client:
+            for _ in range(args.warmup):
+                await _run_session(client, audio, psychologist_id, patient_id, mode["async"], args.poll_interval)
+            metrics_before = (await client.get("/metrics")).text
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+            latencies: List[float] = []
+            errors: List[str] = []
+
+            async def one():
+                async with semaphore:
+                    try:
+                        latencies.append(
+                            await _run_session(client, audio, psychologist_id, patient_id, mode["async"], args.poll_interval)
+                        )
+                    except Exception as e:
+                        errors.append(str(e))
+
+            started_at = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(args.sessions)))
+            elapsed = time.perf_counter() - started_at
+            metrics_after = (await client.get("/metrics")).text
+
+        return {
+            "mode": name,
+            "sessions": args.sessions,
+            "completed": len(latencies),
+            "failed": len(errors),
+            "errors": sorted(set(errors))[:5],
+            "p50_s": _percentile(latencies, 50) if latencies else None,
+            "p95_s": _percentile(latencies, 95) if latencies else None,
+            "p99_s": _percentile(latencies, 99) if latencies else None,
+            "sessions_per_min": len(latencies) / elapsed * 60 if elapsed else None,
+            "peak_rss_mb": _peak_rss_mb(process.pid),
+            "loop_lag": _lag_summary(metrics_before, metrics_after)
+        }
+    finally:
+        _stop(process)
+
+def _format(value: Optional[float], pattern: str) -> str:
+    return "n/d" if value is None else format(value, pattern)
+
+def print_report(results: List[Dict[str, Any]]):
+    print()
+    print(
+        f"{'modo':<11} {'ok':>4} {'falhas':>6} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} "
+        f"{'sessões/min':>11} {'RSS pico (MB)':>13} {'lag médio (ms)':>14} {'lag p99 (ms)':>12} {'429':>5}"
+    )
+    for result in results:
+        print(
+            f"{result['mode']:<11} {result['completed']:>4} {result['failed']:>6} "
+            f"{_format(result['p50_s'], '.2f'):>8} {_format(result['p95_s'], '.2f'):>8} {_format(result['p99_s'], '.2f'):>8} "
+            f"{_format(result['sessions_per_min'], '.1f'):>11} {_format(result['peak_rss_mb'], '.0f'):>13} "
+            f"{_format(result['loop_lag']['mean_ms'], '.1f'):>14} {_format(result['loop_lag']['p99_ms'], '.1f'):>12} "
+            f"{result.get('rate_limited', 0):>5}"
+        )
+        for error in result["errors"]:
+            print(f"    erro: {error}")
+
+async def main(args: argparse.Namespace):
+    openai_port, supabase_port = _free_port(), _free_port()
+    openai_url, supabase_url = f"http://127.0.0.1:{openai_port}", f"http://127.0.0.1:{supabase_port}"
+
+    mock_args = [
+        "--openai-port", str(openai_port), "--supabase-port", str(supabase_port),
+        "--openai-latency", str(args.openai_latency), "--openai-latency-p95", str(args.openai_latency_p95),
+        "--tokens-per-second", str(args.tokens_per_second), "--completion-tokens", str(args.completion_tokens),
+        "--transcription-latency", str(args.transcription_latency),
+        "--transcription-latency-p95", str(args.transcription_latency_p95),
+        "--transcript-words", str(args.transcript_words), "--rate-limit-rate", str(args.rate_limit_rate),
+        "--retry-after-ms", str(args.retry_after_ms), "--rpm", str(args.rpm), "--error-rate", str(args.error_rate),
+        "--supabase-latency", str(args.supabase_latency), "--supabase-latency-p95", str(args.supabase_latency_p95)
+    ]
+    if args.seed is not None:
+        mock_args += ["--seed", str(args.seed)]
+    mocks = subprocess.Popen([sys.executable, "-m", "benchmarks.mock_servers", *mock_args], **_output(args))
+    try:
+        await _wait_ready(f"{openai_url}/stats", mocks)
+        await _wait_ready(f"{supabase_url}/stats", mocks)
+        psychologist_id, patient_id = await _seed(supabase_url)
+
+        base_env = {
+            **os.environ,
+            "OPENAI_API_KEY": "sk-benchmark",
+            "OPENAI_BASE_URL": f"{openai_url}/v1",
+            "SUPABASE_URL": supabase_url,
+            "SUPABASE_KEY": "benchmark",
+            "API_KEY": API_KEY,
+            # Sem cache: o mesmo áudio é enviado em todas as sessões
+            "CACHE_BACKEND": "none",
+            # O WAV de teste é curto; a divisão em trechos dependeria do ffmpeg instalado
+            "TRANSCRIPTION_CHUNKING_ENABLED": "false",
+            "METRICS_ENABLED": "true"
+        }
+        audio = _silent_wav(args.audio_seconds)
+
+        results = []
+        async with httpx.AsyncClient() as client:
+            for name in args.modes:
+                print(f"Modo {name}: {args.sessions} sessões, concorrência {args.concurrency}...", flush=True)
+                stats_before = (await client.get(f"{openai_url}/stats")).json()
+                result = await run_mode(name, args, base_env, audio, psychologist_id, patient_id)
+                stats_after = (await client.get(f"{openai_url}/stats")).json()
+                result["rate_limited"] = stats_after["rate_limited"] - stats_before["rate_limited"]
+                result["openai_errors"] = stats_after["errors"] - stats_before["errors"]
+                results.append(result)
+
+        print_report(results)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as output:
+                json.dump({"parameters": vars(args), "results": results}, output, indent=2, ensure_ascii=False)
+            print(f"\nResultados salvos em {args.json}")
+    finally:
+        _stop(mocks)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=["separate", "combined", "async"])
+    parser.add_argument("--sessions", type=int, default=20, help="Sessões enviadas por modo")
+    parser.add_argument("--concurrency", type=int, default=5, help="Sessões enviadas simultaneamente")
+    parser.add_argument("--warmup", type=int, default=1, help="Sessões enviadas antes da medição")
+    parser.add_argument("--audio-seconds", type=float, default=5.0, help="Duração do WAV enviado")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="Intervalo entre consultas de status no modo async")
+    parser.add_argument("--request-timeout", type=float, default=600.0, help="Timeout de cada requisição à API, em segundos")
+    parser.add_argument("--seed", type=int, default=None, help="Semente dos sorteios dos servidores simulados")
+    parser.add_argument("--json", help="Arquivo para salvar os resultados")
+    parser.add_argument("--verbose", action="store_true", help="Mostra os logs da API e dos servidores simulados")
+    add_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Servidores locais que imitam a API da OpenAI e o PostgREST do Supabase, para benchmarks sem custo
+
+OpenAI: POST /v1/chat/completions (com stream e structured outputs) e
+POST /v1/audio/transcriptions (verbose_json). Supabase: /rest/v1/{tabela} com select,
+insert, upsert, update e delete em memória (filtros eq, neq, in, is, gt, gte, lt, lte,
+order e limit). GET /stats em cada servidor retorna os contadores de chamadas e erros.
+
+Uso:
+    python -m benchmarks.mock_servers --openai-port 9100 --supabase-port 9200 \\
+        --openai-latency 0.8 --openai-latency-p95 2.5 --tokens-per-second 60 --rate-limit-rate 0.02
+"""
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+WORDS = (
+    "paciente relatou semana trabalho ansiedade mãe conversa sentiu medo raiva tristeza chefe "
+    "namorada amigos sono cansaço terapeuta perguntou silêncio reação pensamento evitar conflito "
+    "família pai irmã futuro dinheiro viagem escola lembrou infância choro riso corpo respiração"
+).split()
+
+class Latency:
+    """Distribuição log-normal definida pela mediana e pelo p95 (p95 <= mediana: valor fixo)"""
+
+    def __init__(self, median: float, p95: Optional[float] = None):
+        self.median = median
+        self.sigma = math.log(p95 / median) / 1.645 if p95 and median > 0 and p95 > median else 0.0
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.median * math.exp(self.sigma * random.gauss(0, 1))
+
+def _text(words: int) -> str:
+    """Texto sintético com frases de 12 palavras"""
+    sentences = []
+    for start in range(0, words, 12):
+        sentence = " ".join(random.choice(WORDS) for _ in range(min(12, words - start)))
+        sentences.append(sentence.capitalize() + ".")
+    return " ".join(sentences)
+
+def _from_schema(schema: Dict[str, Any], words: int) -> Any:
+    """Valor de exemplo que satisfaz um JSON schema simples (structured outputs)"""
+    kind = schema.get("type")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        share = max(8, words // max(1, len(properties)))
+        return {name: _from_schema(prop, share) for name, prop in properties.items()}
+    if kind == "array":
+        return [_from_schema(schema.get("items", {"type": "string"}), max(8, words // 4)) for _ in range(4)]
+    if kind in ("number", "integer"):
+        return 1
+    if kind == "boolean":
+        return True
+    return _text(words)
+
+class RateLimiter:
+    """Limite de requisições por minuto (janela fixa), como os headers x-ratelimit-* da OpenAI"""
+
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self.window_start = time.monotonic()
+        self.count = 0
+
+    def check(self) -> Tuple[Dict[str, str], Optional[float]]:
+        """Headers da resposta e, se o limite da janela foi atingido, segundos até a próxima"""
+        now = time.monotonic()
+        if now - self.window_start >= 60:
+            self.window_start, self.count = now, 0
+        reset = 60 - (now - self.window_start)
+        if self.rpm <= 0:
+            return {"x-ratelimit-limit-requests": "1000000", "x-ratelimit-remaining-requests": "1000000", "x-ratelimit-reset-requests": "1s"}, None
+        if self.count >= self.rpm:
+            return {"x-ratelimit-limit-requests": str(self.rpm), "x-ratelimit-remaining-requests": "0"}, reset
+        self.count += 1
+        return {
+            "x-ratelimit-limit-requests": str(self.rpm),
+            "x-ratelimit-remaining-requests": str(self.rpm - self.count),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s"
+        }, None
+
+def create_openai_app(args: argparse.Namespace) -> Starlette:
+    latency = Latency(args.openai_latency, args.openai_latency_p95)
+    transcription_latency = Latency(args.transcription_latency, args.transcription_latency_p95)
+    limiter = RateLimiter(args.rpm)
+    stats = {"chat": 0, "stream": 0, "transcriptions": 0, "rate_limited": 0, "errors": 0}
+
+    def inject_failure() -> Optional[Response]:
+        """429 ou 5xx injetados (por probabilidade ou por excesso de RPM)"""
+        headers, reset = limiter.check()
+        if reset is not None:
+            stats["rate_limited"] += 1
+            return _error(429, "rate_limit_exceeded", {"retry-after-ms": str(int(reset * 1000)), **headers})
+        if random.random() < args.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return _error(429, "rate_limit_exceeded", {"retry-after-ms": str(args.retry_after_ms), **headers})
+        if random.random() < args.error_rate:
+            stats["errors"] += 1
+            return _error(random.choice((500, 502, 503)), "server_error", headers)
+        return None
+
+    async def chat_completions(request: Request) -> Response:
+        body = await request.json()
+        failure = inject_failure()
+        if failure is not None:
+            await asyncio.sleep(latency.sample() / 4)
+            return failure
+
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in body.get("messages", [])) // 4
+        completion_tokens = max(1, int(args.completion_tokens * random.uniform(0.5, 1.5)))
+        if body.get("max_tokens"):
+            completion_tokens = min(completion_tokens, body["max_tokens"])
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            content = json.dumps(_from_schema(response_format["json_schema"]["schema"], completion_tokens * 3 // 4), ensure_ascii=False)
+        else:
+            # Uma frase por linha: também serve como lista de perguntas
+            content = "\n".join(_text(completion_tokens * 3 // 4).split(". "))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0}
+        }
+        model = body.get("model", "gpt-4")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if not body.get("stream"):
+            stats["chat"] += 1
+            await asyncio.sleep(latency.sample() + completion_tokens / args.tokens_per_second)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+
+        stats["stream"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        async def events():
+            await asyncio.sleep(latency.sample())
+            words = content.split(" ")
+            for start in range(0, len(words), 4):
+                delta = " ".join(words[start:start + 4]) + (" " if start + 4 < len(words) else "")
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(completion_tokens / args.tokens_per_second * 4 / max(1, len(words)))
+            if include_usage:
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def audio_transcriptions(request: Request) -> Response:
+        form = await request.form()
+        upload = form.get("file")
+        if upload is not None and hasattr(upload, "read"):
+            await upload.read()
+        failure = inject_failure()
+        if failure is not None:
+            return failure
+
+        stats["transcriptions"] += 1
+        await asyncio.sleep(transcription_latency.sample())
+        text = _text(args.transcript_words)
+        sentences = [sentence for sentence in text.split(". ") if sentence]
+        duration = args.transcript_words / 2.5  # ~150 palavras por minuto
+        step = duration / max(1, len(sentences))
+        segments = [
+            {
+                "id": index, "seek": 0, "start": round(index * step, 2), "end": round((index + 1) * step, 2),
+                "text": f" {sentence}", "tokens": [], "temperature": 0.0, "avg_logprob": -0.2,
+                "compression_ratio": 1.4, "no_speech_prob": 0.01
+            }
+            for index, sentence in enumerate(sentences)
+        ]
+        if form.get("response_format") != "verbose_json":
+            return JSONResponse({"text": text})
+        return JSONResponse({"task": "transcribe", "language": "portuguese", "duration": duration, "text": text, "segments": segments})
+
+    async def get_stats(request: Request) -> Response:
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/audio/transcriptions", audio_transcriptions, methods=["POST"]),
+        Route("/stats", get_stats, methods=["GET"])
+    ])
+
+def _error(status: int, code: str, headers: Dict[str, str]) -> Response:
+    return JSONResponse(
+        {"error": {"message": f"Erro simulado ({code})", "type": code, "param": None, "code": code}},
+        status_code=status,
+        headers=headers
+    )
+
+def _parse_list(value: str) -> List[str]:
+    return [item.strip().strip('"') for item in value.strip("()").split(",") if item.strip()]
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    """Aplica um filtro do PostgREST (ex: "eq.abc", "in.(a,b)", "is.null") a uma linha"""
+    operator, _, operand = expression.partition(".")
+    value = row.get(column)
+    if operator == "is":
+        return value is None if operand == "null" else str(value).lower() == operand
+    if operator == "in":
+        return str(value) in _parse_list(operand)
+    if value is None:
+        return False
+    comparisons = {
+        "eq": lambda: str(value) == operand,
+        "neq": lambda: str(value) != operand,
+        "gt": lambda: str(value) > operand,
+        "gte": lambda: str(value) >= operand,
+        "lt": lambda: str(value) < operand,
+        "lte": lambda: str(value) <= operand
+    }
+    return comparisons.get(operator, lambda: True)()
+
+# Parâmetros da URL que não são filtros de coluna
+POSTGREST_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "or", "and", "columns"}
+
+def create_supabase_app(args: argparse.Namespace) -> Starlette:
+    latency = Latency(args.supabase_latency, args.supabase_latency_p95)
+    tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    stats = {"select": 0, "insert": 0, "update": 0, "delete": 0}
+
+    def filtered(table: str, request: Request) -> List[Dict[str, Any]]:
+        rows = list(tables.setdefault(table, {}).values())
+        for column, expression in request.query_params.multi_items():
+            if column not in POSTGREST_PARAMS:
+                rows = [row for row in rows if _matches(row, column, expression)]
+        return rows
+
+    def new_row(data: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc).isoformat()
+        return {"id": str(uuid.uuid4()), "created_at": now, "updated_at": now, **data}
+
+    async def table_endpoint(request: Request) -> Response:
+        await asyncio.sleep(latency.sample())
+        table = request.path_params["table"]
+        store = tables.setdefault(table, {})
+
+        if request.method == "GET":
+            stats["select"] += 1
+            rows = filtered(table, request)
+            for order in reversed(_parse_list(request.query_params.get("order", ""))):
+                column, _, direction = order.partition(".")
+                rows.sort(key=lambda row: str(row.get(column) or ""), reverse=direction.startswith("desc"))
+            offset = int(request.query_params.get("offset", 0))
+            limit = request.query_params.get("limit")
+            rows = rows[offset:offset + int(limit)] if limit else rows[offset:]
+            return JSONResponse(rows)
+
+        if request.method == "POST":
+            stats["insert"] += 1
+            payload = await request.json()
+            items = payload if isinstance(payload, list) else [payload]
+            upsert = "merge-duplicates" in request.headers.get("prefer", "")
+            key = request.query_params.get("on_conflict", "id")
+            saved = []
+            for item in items:
+                existing = next((row for row in store.values() if key in item and row.get(key) == item[key]), None) if upsert else None
+                if existing is not None:
+                    existing.update(item, updated_at=datetime.now(timezone.utc).isoformat())
+                    saved.append(existing)
+                else:
+                    row = new_row(item)
+                    store[row["id"]] = row
+                    saved.append(row)
+            return JSONResponse(saved, status_code=201)
+
+        if request.method == "PATCH":
+            stats["update"] += 1
+            updates = await request.json()
+            rows = filtered(table, request)
+            for row in rows:
+                row.update(updates, updated_at=datetime.now(timezone.utc).isoformat())
+            return JSONResponse(rows)
+
+        stats["delete"] += 1
+        rows = filtered(table, request)
+        for row in rows:
+            store.pop(row["id"], None)
+        return JSONResponse(rows)
+
+    async def get_stats(request: Request) -> Response:
+        return JSONResponse({**stats, "rows": {table: len(rows) for table, rows in tables.items()}})
+
+    return Starlette(routes=[
+        Route("/rest/v1/{table}", table_endpoint, methods=["GET", "POST", "PATCH", "DELETE"]),
+        Route("/stats", get_stats, methods=["GET"])
+    ])
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Parâmetros das simulações (também aceitos por benchmarks.e2e)"""
+    parser.add_argument("--openai-latency", type=float, default=0.8, help="Mediana do tempo até o primeiro token, em segundos")
+    parser.add_argument("--openai-latency-p95", type=float, default=2.0, help="p95 do tempo até o primeiro token")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="Velocidade de geração da resposta")
+    parser.add_argument("--completion-tokens", type=int, default=400, help="Tokens médios por resposta")
+    parser.add_argument("--transcription-latency", type=float, default=3.0, help="Mediana da transcrição de um áudio, em segundos")
+    parser.add_argument("--transcription-latency-p95", type=float, default=8.0, help="p95 da transcrição de um áudio")
+    parser.add_argument("--transcript-words", type=int, default=1500, help="Palavras de cada transcrição simulada")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fração das chamadas que recebem 429")
+    parser.add_argument("--retry-after-ms", type=int, default=500, help="retry-after-ms dos 429 injetados")
+    parser.add_argument("--rpm", type=int, default=0, help="Limite de requisições por minuto da OpenAI simulada (0: sem limite)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração das chamadas que recebem 5xx")
+    parser.add_argument("--supabase-latency", type=float, default=0.01, help="Mediana da latência do PostgREST, em segundos")
+    parser.add_argument("--supabase-latency-p95", type=float, default=0.04, help="p95 da latência do PostgREST")
+
+async def serve(args: argparse.Namespace):
+    import uvicorn
+
+    servers = [
+        uvicorn.Server(uvicorn.Config(create_openai_app(args), host=args.host, port=args.openai_port, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(create_supabase_app(args), host=args.host, port=args.supabase_port, log_level="warning"))
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openai-port", type=int, default=9100)
+    parser.add_argument("--supabase-port", type=int, default=9200)
+    parser.add_argument("--seed", type=int, default=None, help="Semente dos sorteios (latência, erros e textos)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(serve(args))
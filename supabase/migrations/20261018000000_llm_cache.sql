@@ -0,0 +1,13 @@
+-- Cache de transcrições e respostas da OpenAI (CACHE_BACKEND=supabase)
+create table if not exists public.llm_cache (
+    key text primary key,
+    value jsonb not null,
+    expires_at timestamptz not null,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists llm_cache_expires_at_idx on public.llm_cache (expires_at);
+
+-- Prompts (transcrições anonimizadas) e análises clínicas: sem políticas para anon e
+-- authenticated, só a service role (usada pela API) lê e grava a tabela
+alter table public.llm_cache enable row level security;
@@ -0,0 +1,6 @@
+-- Índices para a paginação por cursor (created_at desc, id desc) das listagens
+create index if not exists sessions_created_at_id_idx on public.sessions (created_at desc, id desc);
+create index if not exists sessions_psychologist_created_at_id_idx on public.sessions (psychologist_id, created_at desc, id desc);
+create index if not exists sessions_patient_created_at_id_idx on public.sessions (patient_id, created_at desc, id desc);
+create index if not exists patients_created_at_id_idx on public.patients (created_at desc, id desc);
+create index if not exists psychologists_created_at_id_idx on public.psychologists (created_at desc, id desc);
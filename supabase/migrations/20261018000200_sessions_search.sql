@@ -0,0 +1,119 @@
+-- Busca textual das sessões (GET /sessions/search), com dicionário em português
+--
+-- O vetor fica em uma tabela à parte, mantida por trigger, para não voltar em cada
+-- `select *` e em cada resposta de insert/update da tabela sessions. Pesos: resumo (A),
+-- contexto (B) e transcrição (C).
+create table if not exists public.session_search (
+    session_id uuid primary key references public.sessions (id) on delete cascade,
+    search_vector tsvector not null
+);
+
+create index if not exists session_search_vector_idx on public.session_search using gin (search_vector);
+
+-- Sem políticas: só a chave service role (que ignora o RLS) e o trigger abaixo acessam o índice
+alter table public.session_search enable row level security;
+
+create or replace function public.session_search_vector(
+    transcription text,
+    full_summary text,
+    context text
+) returns tsvector
+language sql
+immutable
+as $$
+    select
+        setweight(to_tsvector('portuguese', coalesce(full_summary, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(context, '')), 'B') ||
+        setweight(to_tsvector('portuguese', coalesce(transcription, '')), 'C');
+$$;
+
+-- security definer: o trigger mantém o índice mesmo quando a sessão é gravada por um papel sem
+-- acesso à tabela session_search
+create or replace function public.sync_session_search() returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into public.session_search (session_id, search_vector)
+    values (new.id, public.session_search_vector(new.transcription, new.full_summary, new.context))
+    on conflict (session_id) do update set search_vector = excluded.search_vector;
+    return new;
+end;
+$$;
+
+drop trigger if exists sessions_search_sync on public.sessions;
+create trigger sessions_search_sync
+    after insert or update of transcription, full_summary, context on public.sessions
+    for each row execute function public.sync_session_search();
+
+-- Sessões já existentes
+insert into public.session_search (session_id, search_vector)
+select id, public.session_search_vector(transcription, full_summary, context)
+from public.sessions
+on conflict (session_id) do update set search_vector = excluded.search_vector;
+
+-- Resultados ordenados por relevância (rank desc, id desc), paginados por cursor
+-- (after_rank, after_id). Os trechos destacados só são gerados para as linhas da página; os
+-- termos encontrados ficam entre chr(2) e chr(3), removidos antes do texto original, e a API
+-- escapa o HTML do trecho antes de trocá-los por <mark> e </mark>.
+create or replace function public.search_sessions(
+    search_query text,
+    filter_psychologist_id uuid default null,
+    filter_patient_id uuid default null,
+    max_results integer default 20,
+    after_rank real default null,
+    after_id uuid default null
+) returns table (
+    id uuid,
+    psychologist_id uuid,
+    patient_id uuid,
+    created_at timestamptz,
+    rank real,
+    highlights jsonb
+)
+language sql
+stable
+as $$
+    with query as (
+        -- Aceita "frases entre aspas", OR e -exclusão
+        select websearch_to_tsquery('portuguese', search_query) as q
+    ),
+    page as (
+        select s.id, s.psychologist_id, s.patient_id, s.created_at, ts_rank_cd(ss.search_vector, query.q, 32) as rank
+        from public.session_search ss
+        join public.sessions s on s.id = ss.session_id
+        cross join query
+        where ss.search_vector @@ query.q
+            and (filter_psychologist_id is null or s.psychologist_id = filter_psychologist_id)
+            and (filter_patient_id is null or s.patient_id = filter_patient_id)
+            and (after_rank is null or (ts_rank_cd(ss.search_vector, query.q, 32), s.id) < (after_rank, after_id))
+        order by rank desc, s.id desc
+        limit max_results
+    )
+    select
+        page.id,
+        page.psychologist_id,
+        page.patient_id,
+        page.created_at,
+        page.rank,
+        jsonb_strip_nulls(jsonb_build_object(
+            'full_summary', case when to_tsvector('portuguese', coalesce(s.full_summary, '')) @@ query.q
+                then ts_headline('portuguese', translate(s.full_summary, chr(2) || chr(3), ''), query.q, options.value) end,
+            'context', case when to_tsvector('portuguese', coalesce(s.context, '')) @@ query.q
+                then ts_headline('portuguese', translate(s.context, chr(2) || chr(3), ''), query.q, options.value) end,
+            'transcription', case when to_tsvector('portuguese', coalesce(s.transcription, '')) @@ query.q
+                then ts_headline('portuguese', translate(s.transcription, chr(2) || chr(3), ''), query.q, options.value) end
+        )) as highlights
+    from page
+    join public.sessions s on s.id = page.id
+    cross join query
+    cross join (
+        select 'StartSel="' || chr(2) || '", StopSel="' || chr(3) || '", MaxFragments=3, MaxWords=30, MinWords=10, FragmentDelimiter=" … "' as value
+    ) options
+    order by page.rank desc, page.id desc;
+$$;
+
+-- A função lê as sessões de todos os psicólogos: só a API (chave service role) pode chamá-la
+revoke execute on function public.search_sessions(text, uuid, uuid, integer, real, uuid) from public, anon, authenticated;
+grant execute on function public.search_sessions(text, uuid, uuid, integer, real, uuid) to service_role;
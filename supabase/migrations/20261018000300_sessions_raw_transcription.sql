@@ -0,0 +1,5 @@
+-- Transcrição ainda não anonimizada (com os nomes reais). Só fica preenchida entre a
+-- transcrição e a anonimização: um reprocessamento após falha na anonimização não
+-- precisa transcrever o áudio de novo. É apagada quando a transcrição anonimizada é salva
+-- e nunca é retornada pela API.
+alter table public.sessions add column if not exists raw_transcription text;
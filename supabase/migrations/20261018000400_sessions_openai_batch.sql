@@ -0,0 +1,8 @@
+-- Lote da Batch API da OpenAI com as perguntas e análises da sessão (POST /sessions/batch).
+-- Preenchido quando o lote é enviado e apagado quando os resultados são salvos: se a API
+-- reiniciar no meio da espera, POST /sessions/batch/resume busca o mesmo lote em vez de
+-- criar (e pagar) outro. Os custom_id do lote são "{session_id}:{campo}".
+alter table public.sessions add column if not exists openai_batch_id text;
+
+create index if not exists sessions_openai_batch_id_idx on public.sessions (openai_batch_id)
+    where openai_batch_id is not null;
@@ -0,0 +1,7 @@
+# Configuração mínima para importar app.config sem um .env (os testes não acessam a rede)
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("API_KEY", "test-api-key")
@@ -0,0 +1,29 @@
+from app.services.anonymization_service import LocalAnonymizer
+
+def anonymize(text: str, *names: str) -> str:
+    return LocalAnonymizer().anonymize(text, names)
+
+def test_replaces_full_name_and_parts_with_initial():
+    text = "João Pedro Silva chegou. Depois o João Silva disse que o Silva não veio."
+    assert anonymize(text, "João Pedro Silva") == "J chegou. Depois o J disse que o J não veio."
+
+def test_matches_without_accents():
+    assert anonymize("Joao e JOÃO falaram com Inês", "João", "Ines Souza") == "J e J falaram com I"
+
+def test_matches_variable_spacing():
+    assert anonymize("Falei com Maria   Souza\nontem", "Maria Souza") == "Falei com M\nontem"
+
+def test_replaces_lowercase_names():
+    # Transcrições automáticas costumam vir com nomes em minúsculas
+    text = "a joão disse que a maria souza e a maria brigaram"
+    assert anonymize(text, "Maria Souza", "João Lima") == "a J disse que a M e a M brigaram"
+
+def test_keeps_lowercase_common_words():
+    text = "Rosa trouxe uma rosa e falou da luz da casa; rosa costa chegou"
+    assert anonymize(text, "Rosa Costa", "Luz") == "R trouxe uma rosa e falou da luz da casa; R chegou"
+
+def test_patient_initial_wins_on_shared_variant():
+    assert anonymize("Silva faltou", "Ana Silva", "Bruno Silva") == "A faltou"
+
+def test_no_names_returns_text_unchanged():
+    assert anonymize("sem nomes aqui", "", " ") == "sem nomes aqui"
@@ -0,0 +1,66 @@
+from app.utils.audio_chunking import plan_chunks, stitch_segments
+
+def test_short_audio_is_a_single_chunk():
+    assert plan_chunks(300, [], chunk_seconds=600, overlap=2) == [
+        {"index": 0, "cut_start": 0.0, "cut_end": 300, "start": 0.0, "end": 300}
+    ]
+
+def test_cuts_at_the_latest_silence_within_the_search_window():
+    # Silêncios com ponto médio em 490s (fora da janela de 20% = 120s), 530s e 590s
+    silences = [(480.0, 500.0), (529.0, 531.0), (589.0, 591.0), (1100.0, 1102.0)]
+    chunks = plan_chunks(1500, silences, chunk_seconds=600, overlap=2)
+    assert [(chunk["cut_start"], chunk["cut_end"]) for chunk in chunks] == [
+        (0.0, 590.0), (590.0, 1101.0), (1101.0, 1500)
+    ]
+    assert chunks[1]["start"] == 588.0 and chunks[1]["end"] == 1103.0
+    assert chunks[0]["start"] == 0.0 and chunks[-1]["end"] == 1500
+
+def test_cuts_at_the_target_without_nearby_silence():
+    chunks = plan_chunks(1300, [(100.0, 102.0)], chunk_seconds=600, overlap=2)
+    assert [chunk["cut_end"] for chunk in chunks] == [600.0, 1200.0, 1300]
+
+def test_chunks_cover_the_whole_audio_without_gaps():
+    silences = [(start, start + 1.5) for start in range(37, 3600, 53)]
+    chunks = plan_chunks(3600, silences, chunk_seconds=600, overlap=2)
+    assert chunks[0]["cut_start"] == 0.0 and chunks[-1]["cut_end"] == 3600
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous["cut_end"] == current["cut_start"]
+        assert current["cut_end"] - current["cut_start"] <= 600
+    assert [chunk["index"] for chunk in chunks] == list(range(len(chunks)))
+
+def test_stitch_uses_absolute_times_and_drops_overlap_duplicates():
+    chunks = [
+        # Segundo trecho chega antes: a ordem vem do índice
+        {"index": 1, "start": 98.0, "cut_start": 100.0, "cut_end": 200.0, "segments": [
+            {"start": 0.0, "end": 3.0, "text": "fim da frase"},     # 98-101: meio antes do corte
+            {"start": 3.0, "end": 8.0, "text": " começo novo "},    # 101-106
+            {"start": 8.0, "end": 8.0, "text": "   "},              # vazio
+        ]},
+        {"index": 0, "start": 0.0, "cut_start": 0.0, "cut_end": 100.0, "segments": [
+            {"start": 0.0, "end": 50.0, "text": "olá"},
+            {"start": 95.0, "end": 101.0, "text": "fim da frase"},  # meio 98 < 100
+            {"start": 101.0, "end": 102.0, "text": "além do corte"},  # pertence ao próximo trecho
+        ]},
+    ]
+    result = stitch_segments(chunks)
+    assert result["segments"] == [
+        {"start": 0.0, "end": 50.0, "text": "olá"},
+        {"start": 95.0, "end": 101.0, "text": "fim da frase"},
+        {"start": 101.0, "end": 106.0, "text": "começo novo"},
+    ]
+    assert result["text"] == "olá fim da frase começo novo"
+
+def test_stitch_skips_segment_repeated_across_the_cut():
+    chunks = [
+        {"index": 0, "start": 0.0, "cut_start": 0.0, "cut_end": 10.0, "segments": [
+            {"start": 7.0, "end": 10.8, "text": "mesma fala"}]},   # meio 8.9: fica no primeiro
+        {"index": 1, "start": 8.0, "cut_start": 10.0, "cut_end": 20.0, "segments": [
+            {"start": 1.5, "end": 3.5, "text": "mesma fala"},      # 9.5-11.5, meio 10.5; 65% coberto
+            {"start": 4.0, "end": 6.0, "text": "seguinte"}]},
+    ]
+    assert stitch_segments(chunks)["text"] == "mesma fala seguinte"
+
+def test_stitch_keeps_tail_of_last_chunk():
+    chunks = [{"index": 0, "start": 0.0, "cut_start": 0.0, "cut_end": 30.0, "segments": [
+        {"start": 29.0, "end": 32.0, "text": "última"}]}]
+    assert stitch_segments(chunks)["segments"] == [{"start": 29.0, "end": 32.0, "text": "última"}]
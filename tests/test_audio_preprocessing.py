@@ -0,0 +1,84 @@
+from app.utils import audio_chunking, audio_preprocessing
+from app.utils.audio_preprocessing import preprocess_audio, shift_segments, speech_bounds
+import asyncio
+import pytest
+
+# Saída do filtro silencedetect: o último silêncio vai até o fim e não tem silence_end
+SILENCEDETECT_STDERR = """Input #0, mp3, from 'sessao.mp3':
+  Duration: 00:01:00.00, start: 0.000000, bitrate: 128 kb/s
+[silencedetect @ 0x55d0c8a3c240] silence_start: 0
+[silencedetect @ 0x55d0c8a3c240] silence_end: 4.2 | silence_duration: 4.2
+[silencedetect @ 0x55d0c8a3c240] silence_start: 20.5
+[silencedetect @ 0x55d0c8a3c240] silence_end: 22.75 | silence_duration: 2.25
+[silencedetect @ 0x55d0c8a3c240] silence_start: 51.3
+size=N/A time=00:01:00.00 bitrate=N/A speed= 612x
+"""
+
+def fake_tools(monkeypatch, duration="60.000000", silences=SILENCEDETECT_STDERR, output_bytes=1000):
+    """Substitui ffmpeg/ffprobe por respostas fixas; registra os comandos executados"""
+    commands = []
+
+    async def run_tool(*args):
+        commands.append(args)
+        if args[0] == "ffprobe":
+            return 0, duration, ""
+        if "silencedetect" in " ".join(args):
+            return 0, "", silences
+        with open(args[-1], "wb") as output:
+            output.write(b"\0" * output_bytes)
+        return 0, "", ""
+
+    monkeypatch.setattr(audio_chunking, "run_tool", run_tool)
+    monkeypatch.setattr(audio_preprocessing, "run_tool", run_tool)
+    return commands
+
+def test_detect_silences_closes_trailing_silence_at_duration(monkeypatch):
+    fake_tools(monkeypatch)
+    silences = asyncio.run(audio_chunking.detect_silences("sessao.mp3", -50, 1.0, duration=60.0))
+    assert silences == [(0.0, 4.2), (20.5, 22.75), (51.3, 60.0)]
+
+def test_detect_silences_without_duration_drops_open_silence(monkeypatch):
+    fake_tools(monkeypatch)
+    silences = asyncio.run(audio_chunking.detect_silences("sessao.mp3", -50, 1.0))
+    assert silences == [(0.0, 4.2), (20.5, 22.75)]
+
+def test_speech_bounds_trims_only_edge_silences():
+    assert speech_bounds([(0.0, 4.2), (20.5, 22.75), (51.3, 60.0)], 60.0, 0.3) == pytest.approx((3.9, 51.6))
+    # Silêncio no meio não é cortado
+    assert speech_bounds([(20.5, 22.75)], 60.0, 0.3) == (0.0, 60.0)
+    # Áudio todo em silêncio é mantido inteiro
+    assert speech_bounds([(0.0, 60.0)], 60.0, 0.3) == (0.0, 60.0)
+
+def test_preprocess_trims_and_converts_to_opus(monkeypatch, tmp_path):
+    commands = fake_tools(monkeypatch)
+    source = tmp_path / "sessao.mp3"
+    source.write_bytes(b"\1" * 5000)
+    output = tmp_path / "audio.ogg"
+
+    result = asyncio.run(preprocess_audio(str(source), str(output), 16000, "24k", -50, 1.0, 0.3))
+
+    assert result.path == str(output)
+    assert result.offset == pytest.approx(3.9)
+    assert result.duration == pytest.approx(47.7)
+    assert (result.input_bytes, result.output_bytes) == (5000, 1000)
+    convert = commands[-1]
+    assert convert[convert.index("-ss") + 1] == "3.900"
+    assert convert[convert.index("-t") + 1] == "47.700"
+    assert convert[convert.index("-ar") + 1] == "16000"
+    assert convert[convert.index("-c:a") + 1] == "libopus"
+
+def test_preprocess_returns_none_when_output_is_not_smaller(monkeypatch, tmp_path):
+    fake_tools(monkeypatch, output_bytes=5000)
+    source = tmp_path / "sessao.ogg"
+    source.write_bytes(b"\1" * 5000)
+    assert asyncio.run(preprocess_audio(str(source), str(tmp_path / "audio.ogg"), 16000, "24k", -50, 1.0, 0.3)) is None
+
+def test_shift_segments_restores_original_timeline():
+    result = {"text": "oi tudo bem", "segments": [
+        {"start": 0.0, "end": 1.5, "text": "oi"},
+        {"start": 1.5, "end": 3.25, "text": "tudo bem"}
+    ]}
+    shifted = shift_segments(result, 3.9)
+    assert [(segment["start"], segment["end"]) for segment in shifted["segments"]] == [(3.9, 5.4), (5.4, 7.15)]
+    assert shifted["text"] == "oi tudo bem"
+    assert shift_segments(result, 0.0) is result
@@ -0,0 +1,126 @@
+from app.config import settings
+from app.services import batch_service
+from app.services.batch_service import LocalBatchBackend, SessionBatchService
+from app.services.cache_service import CacheService
+from app.services.openai_service import OpenAIService
+import asyncio
+import os
+import pytest
+
+# Texto gerado por operação; com "erro" a chamada falha
+CONTENTS = {
+    "session_questions": "Como foi a semana?\nO que mudou no trabalho?",
+    "full_summary": "resumo",
+    "anonymous_summary": "resumo anônimo",
+    "patient_demand": "erro",
+    "context": "contexto",
+    "ia_analysis": "análise"
+}
+
+class FakePipeline:
+    async def transcribe_session(self, session_id, audio_path, filename, patient_name, psychologist_name, **kwargs):
+        return {"transcription": f"transcrição de {filename}"}
+
+class FakeSupabase:
+    def __init__(self):
+        self.rows = []
+        self.batch_ids = []
+
+    async def set_sessions_batch_async(self, session_ids, openai_batch_id):
+        self.batch_ids.append((session_ids, openai_batch_id))
+
+    async def update_sessions_async(self, rows):
+        self.rows.extend(rows)
+        return rows
+
+def make_service(contents, monkeypatch):
+    openai_service = OpenAIService(cache=CacheService(None, 0), async_client=object())
+
+    async def complete_async(request):
+        content = contents[request["operation"]]
+        if content == "erro":
+            raise RuntimeError("falha na OpenAI")
+        return content
+
+    monkeypatch.setattr(openai_service, "complete_async", complete_async)
+    supabase = FakeSupabase()
+    service = SessionBatchService(FakePipeline(), openai_service, supabase, LocalBatchBackend(openai_service), None)
+    return service, supabase
+
+def make_items(tmp_path, count):
+    items = []
+    for index in range(count):
+        audio_path = tmp_path / f"sessao{index}.mp3"
+        audio_path.write_bytes(b"audio")
+        items.append({
+            "session_id": f"s{index}",
+            "psychologist_id": "psi",
+            "patient_id": f"p{index}",
+            "patient_name": "Maria",
+            "psychologist_name": "João",
+            "filename": audio_path.name,
+            "audio_path": str(audio_path),
+            "audio_url": None
+        })
+    return items
+
+def test_run_maps_results_and_reports_partial_failures(tmp_path, monkeypatch):
+    service, supabase = make_service(CONTENTS, monkeypatch)
+    items = make_items(tmp_path, 2)
+    # Terceira sessão com áudio no Storage, cujo download falha
+    items.append({**items[0], "session_id": "s2", "audio_path": None, "audio_url": "https://x.supabase.co/storage/v1/object/a.mp3"})
+
+    async def download_to_tempfile(*args, **kwargs):
+        raise ValueError("download falhou")
+
+    monkeypatch.setattr(batch_service, "download_to_tempfile", download_to_tempfile)
+    stages, statuses = [], {}
+    failed = asyncio.run(service.run(
+        items,
+        on_stage=lambda stage, status: stages.append((stage, status)),
+        on_item=lambda session_id, status, error: statuses.setdefault(session_id, status)
+    ))
+
+    assert failed["s2"] == "download falhou"
+    assert failed["s0"] == failed["s1"] == "patient_demand: falha na OpenAI"
+    assert statuses == {"s0": "failed", "s1": "failed", "s2": "failed"}
+    assert ("saving", "completed") in stages
+
+    rows = {row["id"]: row for row in supabase.rows}
+    assert set(rows) == {"s0", "s1"}
+    assert rows["s0"]["questions"] == ["Como foi a semana?", "O que mudou no trabalho?"]
+    assert rows["s0"]["answers"] is None
+    assert rows["s0"]["full_summary"] == "resumo"
+    assert rows["s0"]["analise_da_ia"] == "análise"
+    assert rows["s0"]["openai_batch_id"] is None
+    assert "patient_demand" not in rows["s0"]
+    assert rows["s1"]["patient_id"] == "p1"
+    # O executor local não cria lote na OpenAI
+    assert supabase.batch_ids == []
+    assert not any(os.path.exists(item["audio_path"]) for item in items[:2])
+
+def test_run_reports_parse_errors_and_cleans_up_on_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "openai_analysis_mode", "combined")
+    service, supabase = make_service({"combined_analysis": "não é JSON"}, monkeypatch)
+    items = make_items(tmp_path, 1)
+
+    failed = asyncio.run(service.run(items))
+
+    assert failed["s0"].startswith("combined: Resposta do modo combinado não é um JSON válido")
+    assert supabase.rows == [{"id": "s0", "psychologist_id": "psi", "patient_id": "p0", "openai_batch_id": None}]
+    assert not os.path.exists(items[0]["audio_path"])
+
+def test_run_removes_audio_when_saving_fails(tmp_path, monkeypatch):
+    service, supabase = make_service(CONTENTS, monkeypatch)
+    items = make_items(tmp_path, 1)
+
+    async def update_sessions_async(rows):
+        raise RuntimeError("banco indisponível")
+
+    supabase.update_sessions_async = update_sessions_async
+    stages = []
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.run(items, on_stage=lambda stage, status: stages.append((stage, status))))
+
+    assert stages[-1] == ("saving", "failed")
+    assert not os.path.exists(items[0]["audio_path"])
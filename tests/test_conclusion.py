@@ -0,0 +1,36 @@
+from app.config import settings
+from app.services.cache_service import CacheService
+from app.services.openai_service import OpenAIService
+import asyncio
+
+TRANSCRIPTION = " ".join(
+    f"Trecho {index}: o paciente falou sobre o trabalho, a família e o sono." for index in range(400)
+)
+
+def make_service():
+    return OpenAIService(cache=CacheService(None, 0), async_client=object())
+
+def fitted_request(service, monkeypatch):
+    async def fitted_request_async(build, transcription):
+        return {"full": True}
+
+    monkeypatch.setattr(service, "_fitted_request_async", fitted_request_async)
+    return asyncio.run(service._fitted_conclusion_request_async(
+        TRANSCRIPTION, "contexto", "ansiedade no trabalho", "análise", ["dorme mal"], ["Como está o sono?"], "compact"
+    ))
+
+def test_compact_conclusion_uses_excerpts_within_budget(monkeypatch):
+    monkeypatch.setattr(settings, "conclusion_max_input_tokens", 2000)
+    request = fitted_request(make_service(), monkeypatch)
+    assert "full" not in request
+    assert "[Trecho " in request["messages"][-1]["content"]
+
+def test_compact_conclusion_falls_back_when_prompt_exceeds_budget(monkeypatch):
+    # O prompt sem trechos já passa do teto: o orçamento negativo vira 0 e a conclusão usa o modo "full"
+    monkeypatch.setattr(settings, "conclusion_max_input_tokens", 10)
+    service = make_service()
+    build = lambda text: service._conclusion_request(
+        text, "contexto", "ansiedade", "análise", ["dorme mal"], ["Como está o sono?"], excerpts=True
+    )
+    assert service._conclusion_excerpts(build, TRANSCRIPTION, ["sono"]) is None
+    assert fitted_request(service, monkeypatch) == {"full": True}
@@ -0,0 +1,35 @@
+from app.config import settings
+from app.services.live_transcription import LiveStreamLimitError, LiveTranscription
+import asyncio
+import pytest
+
+class FakeAudio:
+    async def transcribe_audio_segments_async(self, audio, filename, backend=None):
+        await asyncio.sleep(0.01)
+        return {"text": filename}
+
+class FakeAnonymization:
+    async def anonymize_async(self, text, patient_name, psychologist_name):
+        return text
+
+class FakeSupabase:
+    async def update_session_async(self, session_id, updates):
+        return updates
+
+def test_pending_segments_are_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "live_max_pending_segments", 2)
+
+    async def stream():
+        live = LiveTranscription({"id": "s1"}, FakeAudio(), FakeAnonymization(), FakeSupabase(), "Maria", "João")
+        async with live:
+            live.add_segment(b"audio", "a")
+            live.add_segment(b"audio", "b")
+            with pytest.raises(LiveStreamLimitError):
+                live.add_segment(b"audio", "c")
+            session = await live.finish()
+        return live, session
+
+    live, session = asyncio.run(stream())
+    # O segmento recusado não entra na transcrição nem na contagem
+    assert live.segments == 2
+    assert session["transcription"] == "a b"
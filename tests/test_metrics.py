@@ -0,0 +1,12 @@
+from app.utils.metrics import _postgrest_labels
+import httpx
+
+def test_postgrest_labels_by_table_and_operation():
+    request = httpx.Request("POST", "https://x.supabase.co/rest/v1/sessions", headers={"Prefer": "resolution=merge-duplicates"})
+    assert _postgrest_labels(request) == ("sessions", "upsert")
+    assert _postgrest_labels(httpx.Request("POST", "https://x.supabase.co/rest/v1/rpc/search_sessions")) == ("search_sessions", "insert")
+    assert _postgrest_labels(httpx.Request("GET", "https://x.supabase.co/rest/v1/patients?id=eq.1")) == ("patients", "select")
+
+def test_storage_downloads_are_not_labeled():
+    request = httpx.Request("GET", "https://x.supabase.co/storage/v1/object/audios/3f1c-sessao.mp3")
+    assert _postgrest_labels(request) is None
@@ -0,0 +1,66 @@
+from app.services.cache_service import CacheService
+from app.services.openai_service import OpenAIService
+from app.services.rate_limiter import OpenAIScheduler
+from types import SimpleNamespace
+import asyncio
+import pytest
+
+def chunk(text):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+class FakeStream:
+    def __init__(self, texts, on_chunk):
+        self.texts = texts
+        self.on_chunk = on_chunk
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for text in self.texts:
+            await asyncio.sleep(0)
+            self.on_chunk()
+            yield chunk(text)
+
+    async def close(self):
+        self.closed = True
+
+def test_streaming_call_holds_the_scheduler_slot_while_reading(monkeypatch):
+    scheduler = OpenAIScheduler(max_concurrency=4, max_retries=0)
+    in_flight = []
+    streams = []
+
+    async def create(**params):
+        assert params["stream"] is True
+        stream = FakeStream(["Olá", ", ", "mundo"], lambda: in_flight.append(scheduler.limiter(params["model"]).active))
+        streams.append(stream)
+        return SimpleNamespace(headers={}, parse=lambda: stream)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(with_raw_response=SimpleNamespace(create=create))))
+    service = OpenAIService(cache=CacheService(None, 0), async_client=client, scheduler=scheduler)
+
+    async def consume():
+        return [part async for part in service._astream([{"role": "user", "content": "oi"}], 0.3, model="gpt-test")]
+
+    assert asyncio.run(consume()) == ["Olá", ", ", "mundo"]
+    assert in_flight == [1, 1, 1]
+    assert scheduler.limiter("gpt-test").active == 0
+    assert streams[0].closed
+
+def test_sync_wrapper_runs_the_async_method_and_warns(monkeypatch):
+    service = OpenAIService(cache=CacheService(None, 0), async_client=SimpleNamespace(), scheduler=None)
+
+    async def summary(transcription):
+        return f"resumo: {transcription}"
+
+    monkeypatch.setattr(service, "generate_full_summary_async", summary)
+    with pytest.warns(DeprecationWarning, match="generate_full_summary_async"):
+        assert service.generate_full_summary("sessão") == "resumo: sessão"
+
+    async def inside_loop():
+        with pytest.raises(RuntimeError, match="generate_full_summary_async"):
+            service.generate_full_summary("sessão")
+
+    with pytest.warns(DeprecationWarning):
+        asyncio.run(inside_loop())
@@ -0,0 +1,59 @@
+from app.models.patient import PatientPartial, PatientResponse
+from app.utils.pagination import (
+    _encode, build_page, decode_cursor, decode_rank_cursor, encode_cursor, encode_rank_cursor, keyset_filter
+)
+from fastapi import HTTPException
+import pytest
+
+ROW_ID = "550e8400-e29b-41d4-a716-446655440000"
+
+def test_cursor_round_trip_builds_keyset_filter():
+    cursor = encode_cursor({"created_at": "2024-12-14T16:07:32.368883+00:00", "id": ROW_ID})
+    assert decode_cursor(cursor) == ("2024-12-14T16:07:32.368883+00:00", ROW_ID)
+    assert keyset_filter(cursor) == (
+        'created_at.lt."2024-12-14T16:07:32.368883+00:00",'
+        f'and(created_at.eq."2024-12-14T16:07:32.368883+00:00",id.lt.{ROW_ID})'
+    )
+
+@pytest.mark.parametrize("values", [
+    # Tentativas de fechar as aspas/parênteses e acrescentar termos ao filtro
+    ['2024-01-01T00:00:00+00:00",psychologist_id.neq.x,created_at.lt."3000-01-01', ROW_ID],
+    ["2024-01-01T00:00:00+00:00", f"{ROW_ID}),or(id.neq.0"],
+    ["ontem", ROW_ID],
+    ["2024-01-01T00:00:00+00:00"],
+    {"created_at": "2024-01-01"},
+])
+def test_rejects_crafted_cursors(values):
+    with pytest.raises(HTTPException) as error:
+        keyset_filter(_encode(values))
+    assert error.value.status_code == 400
+
+def test_rejects_garbage_cursor():
+    with pytest.raises(HTTPException):
+        decode_cursor("%%%não-é-base64")
+
+def test_rank_cursor_round_trip_and_validation():
+    assert decode_rank_cursor(encode_rank_cursor({"rank": 0.0607927, "id": ROW_ID})) == (0.0607927, ROW_ID)
+    with pytest.raises(HTTPException):
+        decode_rank_cursor(_encode([0.5, "x"]))
+
+def test_build_page_sets_cursor_only_when_there_are_more_rows():
+    rows = [{"created_at": f"2024-01-0{day}T00:00:00+00:00", "id": ROW_ID} for day in (3, 2, 1)]
+    page = build_page(rows, 2)
+    assert page["items"] == rows[:2]
+    assert decode_cursor(page["next_cursor"])[0] == "2024-01-02T00:00:00+00:00"
+    assert build_page(rows[:2], 2)["next_cursor"] is None
+
+def test_build_page_validates_rows_with_the_response_model():
+    rows = [
+        {"id": ROW_ID, "name": "Maria", "created_at": "2024-12-14T16:07:32+00:00", "updated_at": "2024-12-14T16:07:32+00:00"},
+        {"id": ROW_ID, "name": "Ana", "created_at": "2024-12-13T16:07:32+00:00", "updated_at": "2024-12-13T16:07:32+00:00"}
+    ]
+    page = build_page(rows, 1, model=PatientResponse)
+    assert isinstance(page["items"][0], PatientResponse)
+    assert page["next_cursor"] == encode_cursor(rows[0])
+
+    sparse = build_page([{"id": ROW_ID, "created_at": "2024-12-14T16:07:32+00:00"}], 1, model=PatientPartial)
+    assert sparse["items"][0].model_dump(exclude_unset=True).keys() == {"id", "created_at"}
+    with pytest.raises(ValueError):
+        build_page([{"id": ROW_ID, "created_at": "2024-12-14T16:07:32+00:00"}], 1, model=PatientResponse)
@@ -0,0 +1,90 @@
+from app.services.pipeline_service import SessionPipeline
+import asyncio
+import pytest
+
+ANALYSES = {
+    "full_summary": "resumo",
+    "anonymous_summary": "resumo anônimo",
+    "patient_demand": "demanda",
+    "context": "contexto",
+    "analise_da_ia": "análise"
+}
+
+class FakeAudio:
+    def __init__(self):
+        self.calls = 0
+
+    async def transcribe_audio_file_async(self, audio_path, filename, backend=None):
+        self.calls += 1
+        return "Maria falou com João"
+
+class FakeAnonymization:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    async def anonymize_async(self, text, patient_name, psychologist_name):
+        if self.fail:
+            raise RuntimeError("falha na anonimização")
+        return text.replace(patient_name, "P").replace(psychologist_name, "T")
+
+class FakeOpenAI:
+    async def generate_session_questions_async(self, transcription, patient_name, psychologist_name):
+        return ["pergunta"]
+
+    async def process_session_async(self, transcription, fields, on_result):
+        for field in fields:
+            await on_result(field, ANALYSES[field])
+
+class FakeSupabase:
+    def __init__(self):
+        self.session = {"id": "s1"}
+        self.updates = []
+
+    async def update_session_async(self, session_id, updates):
+        self.updates.append(dict(updates))
+        self.session.update(updates)
+        return dict(self.session)
+
+    async def get_session_async(self, session_id):
+        return dict(self.session)
+
+def make_pipeline(anonymization):
+    audio, supabase = FakeAudio(), FakeSupabase()
+    pipeline = SessionPipeline(audio, FakeOpenAI(), supabase, anonymization)
+    return pipeline, audio, supabase
+
+def test_raw_transcription_checkpointed_before_anonymization():
+    pipeline, audio, supabase = make_pipeline(FakeAnonymization(fail=True))
+    with pytest.raises(RuntimeError):
+        asyncio.run(pipeline.run("s1", "/tmp/a.mp3", "a.mp3", "Maria", "João"))
+
+    assert supabase.session["raw_transcription"] == "Maria falou com João"
+    assert "transcription" not in supabase.session
+    assert SessionPipeline.pending_stages(supabase.session) == ["anonymization", "questions", "analyses"]
+
+def test_resume_skips_transcription_and_clears_raw():
+    pipeline, audio, supabase = make_pipeline(FakeAnonymization())
+    supabase.session["raw_transcription"] = "Maria falou com João"
+    stages = []
+
+    result = asyncio.run(pipeline.run(
+        "s1", None, None, "Maria", "João",
+        on_stage=lambda stage, status: stages.append((stage, status)),
+        session=dict(supabase.session)
+    ))
+
+    assert audio.calls == 0
+    assert ("transcription", "skipped") in stages
+    assert ("anonymization", "completed") in stages
+    assert result["transcription"] == "P falou com T"
+    assert result["raw_transcription"] is None
+    assert SessionPipeline.pending_stages(result) == []
+
+def test_full_run_clears_raw_transcription():
+    pipeline, audio, supabase = make_pipeline(FakeAnonymization())
+    result = asyncio.run(pipeline.run("s1", "/tmp/a.mp3", "a.mp3", "Maria", "João"))
+
+    assert audio.calls == 1
+    assert supabase.updates[0] == {"raw_transcription": "Maria falou com João"}
+    assert result["raw_transcription"] is None
+    assert result["questions"] == ["pergunta"]
@@ -0,0 +1,187 @@
+from app.services.rate_limiter import (
+    BATCH, INTERACTIVE, ModelLimiter, OpenAIScheduler, parse_reset_duration, parse_retry_after
+)
+from email.utils import formatdate
+import asyncio
+import httpx
+import openai
+import pytest
+import time
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+def status_error(status: int, headers=None, body=None) -> openai.APIStatusError:
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    error_class = openai.RateLimitError if status == 429 else openai.InternalServerError
+    return error_class("erro", response=response, body=body)
+
+def test_parse_reset_duration():
+    assert parse_reset_duration("1s") == 1.0
+    assert parse_reset_duration("6m0s") == 360.0
+    assert parse_reset_duration("20ms") == pytest.approx(0.02)
+    assert parse_reset_duration("1h2m3.5s") == pytest.approx(3723.5)
+    assert parse_reset_duration("") is None
+    assert parse_reset_duration("logo") is None
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert parse_retry_after({"retry-after": "2"}) == 2.0
+    assert parse_retry_after({"retry-after": formatdate(time.time() + 30, usegmt=True)}) == pytest.approx(30, abs=2)
+    assert parse_retry_after({"retry-after": formatdate(time.time() - 30, usegmt=True)}) == 0.0
+    assert parse_retry_after({"retry-after": "amanhã"}) is None
+    assert parse_retry_after({}) is None
+    assert parse_retry_after(None) is None
+
+def test_aimd_halves_on_rate_limit_and_grows_additively():
+    limiter = ModelLimiter("test-aimd", 8)
+    limiter.on_rate_limited(0)
+    assert limiter.limit == 4.0
+    for _ in range(3):
+        limiter.on_rate_limited(0)
+    assert limiter.limit == 1.0  # nunca abaixo de uma vaga
+    limiter.on_success()
+    assert limiter.limit == 2.0
+    for _ in range(200):
+        limiter.on_success()
+    assert limiter.limit == 8.0  # nunca acima do máximo configurado
+
+def test_rate_limit_blocks_model_until_retry_after():
+    limiter = ModelLimiter("test-block", 4)
+    limiter.on_rate_limited(5)
+    assert 4.5 < limiter._budget_wait(0) <= 5
+
+def test_budget_from_headers():
+    limiter = ModelLimiter("test-budget", 4)
+    limiter.update_from_headers({
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "2s",
+        "x-ratelimit-remaining-tokens": "100",
+        "x-ratelimit-reset-tokens": "1s"
+    })
+    assert 1.5 < limiter._budget_wait(10) <= 2
+    limiter.remaining_requests = 5
+    assert limiter._budget_wait(50) <= 0
+    assert 0.5 < limiter._budget_wait(500) <= 1
+
+def test_interactive_calls_jump_the_queue_and_same_priority_is_fifo():
+    async def scenario():
+        limiter = ModelLimiter("test-priority", 1)
+        await limiter.acquire(BATCH, 0)  # ocupa a única vaga
+        order = []
+
+        async def call(name, priority):
+            await limiter.acquire(priority, 0)
+            order.append(name)
+            limiter.release()
+
+        tasks = [asyncio.create_task(call(name, priority)) for name, priority in
+                 [("b0", BATCH), ("b1", BATCH), ("i0", INTERACTIVE), ("b2", BATCH), ("i1", INTERACTIVE)]]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["i0", "i1", "b0", "b1", "b2"]
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        limiter = ModelLimiter("test-cancel", 1)
+        await limiter.acquire(BATCH, 0)
+        waiter = asyncio.create_task(limiter.acquire(BATCH, 0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        limiter.release()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.wait_for(limiter.acquire(BATCH, 0), 1)
+        return limiter.active
+
+    assert asyncio.run(scenario()) == 1
+
+def scheduler(max_retries: int = 2) -> OpenAIScheduler:
+    return OpenAIScheduler(max_concurrency=4, max_retries=max_retries, base_delay=0.001, max_delay=0.05)
+
+def flaky(errors):
+    calls = []
+
+    async def call():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    return call, calls
+
+def test_retries_429_after_retry_after_and_halves_the_limit():
+    agenda = scheduler()
+    call, calls = flaky([status_error(429, {"retry-after-ms": "30"})])
+    assert asyncio.run(agenda.run("test-retry", call)) == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.025
+    limiter = agenda.limiter("test-retry")
+    assert limiter.active == 0
+    assert limiter.limit == 2.5  # 4 / 2 após o 429, + 1/2 após o sucesso
+
+def test_retry_after_is_capped_by_max_delay():
+    agenda = scheduler()
+    error = status_error(503, {"retry-after": "3600"})
+    assert 0.05 <= agenda._retry_delay(error, 0) <= 0.051
+
+def test_gives_up_after_max_retries():
+    agenda = scheduler(max_retries=1)
+    call, calls = flaky([status_error(500), status_error(500), status_error(500)])
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(agenda.run("test-give-up", call))
+    assert len(calls) == 2
+
+def test_does_not_retry_insufficient_quota_or_client_errors():
+    agenda = scheduler()
+    call, calls = flaky([status_error(429, body={"code": "insufficient_quota"})])
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(agenda.run("test-quota", call))
+    assert len(calls) == 1
+    assert agenda.limiter("test-quota").limit == 4.0
+    bad_request = openai.BadRequestError("erro", response=httpx.Response(400, request=REQUEST), body=None)
+    assert agenda._retry_delay(bad_request, 0) is None
+
+def test_stream_holds_the_slot_until_the_stream_is_consumed():
+    agenda = scheduler()
+    limiter = agenda.limiter("test-stream")
+    in_flight = []
+
+    async def chunks():
+        for chunk in ("a", "b", "c"):
+            await asyncio.sleep(0)
+            in_flight.append(limiter.active)
+            yield chunk
+
+    async def call():
+        return chunks()
+
+    async def consume():
+        async with agenda.stream("test-stream", call) as stream:
+            return [chunk async for chunk in stream]
+
+    assert asyncio.run(consume()) == ["a", "b", "c"]
+    assert in_flight == [1, 1, 1]
+    assert limiter.active == 0
+
+def test_rate_limit_in_the_middle_of_a_stream_reaches_the_limiter():
+    agenda = scheduler()
+
+    async def chunks():
+        yield "a"
+        raise status_error(429, {"retry-after-ms": "10"})
+
+    async def call():
+        return chunks()
+
+    async def consume():
+        async with agenda.stream("test-stream-429", call) as stream:
+            async for _ in stream:
+                pass
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(consume())
+    limiter = agenda.limiter("test-stream-429")
+    assert limiter.active == 0
+    assert limiter.limit == 2.0
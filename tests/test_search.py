@@ -0,0 +1,14 @@
+from app.routes.sessions import _escape_highlight
+
+def test_highlight_delimiters_become_mark_tags():
+    snippet = "tenho \x02trabalhado\x03 até tarde … desde que mudei de \x02trabalho\x03"
+    assert _escape_highlight(snippet) == (
+        "tenho <mark>trabalhado</mark> até tarde … desde que mudei de <mark>trabalho</mark>"
+    )
+
+def test_html_in_session_text_is_escaped():
+    # Marcações digitadas no texto da sessão não viram HTML, nem mesmo <mark>
+    snippet = "<mark>falso</mark> <script>alert(1)</script> e \x02trabalho\x03 & família"
+    assert _escape_highlight(snippet) == (
+        "&lt;mark&gt;falso&lt;/mark&gt; &lt;script&gt;alert(1)&lt;/script&gt; e <mark>trabalho</mark> &amp; família"
+    )
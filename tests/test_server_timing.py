@@ -0,0 +1,24 @@
+from app.utils import metrics
+
+def test_covered_seconds_merges_overlapping_intervals():
+    assert metrics.covered_seconds([]) == 0.0
+    # Quatro análises simultâneas de 10s e uma chamada depois de um intervalo ocioso
+    intervals = [(0.0, 10.0), (0.5, 9.0), (1.0, 10.0), (2.0, 8.0), (12.0, 13.0)]
+    assert metrics.covered_seconds(intervals) == 11.0
+
+def test_header_never_exceeds_wall_clock_for_concurrent_calls():
+    timings = metrics.start_server_timing()
+    try:
+        for _ in range(4):
+            metrics.record_timing("openai", 2.0)
+        metrics.record_timing("supabase", 0.25)
+    finally:
+        metrics.stop_server_timing()
+    entries = dict(entry.split(";dur=") for entry in metrics.server_timing_header(timings, 2.5).split(", "))
+    assert float(entries["total"]) == 2500.0
+    assert 2000.0 <= float(entries["openai"]) < 2010.0
+    assert float(entries["supabase"]) == 250.0
+
+def test_record_timing_outside_a_request_is_ignored():
+    metrics.stop_server_timing()
+    metrics.record_timing("openai", 1.0)
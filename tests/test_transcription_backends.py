@@ -0,0 +1,34 @@
+from app.services.transcription_backends import OpenAIWhisperBackend
+from types import SimpleNamespace
+import asyncio
+import pytest
+
+class FakeTranscriptions:
+    def __init__(self, transcript):
+        self.transcript = transcript
+
+    async def create(self, file, **params):
+        return self.transcript
+
+def transcribe(transcript, tmp_path):
+    audio_path = tmp_path / "sessao.mp3"
+    audio_path.write_bytes(b"audio")
+    client = SimpleNamespace(audio=SimpleNamespace(transcriptions=FakeTranscriptions(transcript)))
+    return asyncio.run(OpenAIWhisperBackend(client).transcribe(str(audio_path), "sessao.mp3"))
+
+@pytest.mark.parametrize("segment", [
+    # openai<1.55 converte a resposta em Transcription e deixa os segmentos como dicts
+    lambda start, end, text: {"id": 0, "start": start, "end": end, "text": text},
+    lambda start, end, text: SimpleNamespace(start=start, end=end, text=text)
+])
+def test_whisper_segments_as_dicts_or_objects(segment, tmp_path):
+    transcript = SimpleNamespace(
+        text="Bom dia. Como vai?",
+        segments=[segment(0, 1.5, "Bom dia."), segment(1.5, 3, " Como vai?")],
+        duration=3.0
+    )
+    assert transcribe(transcript, tmp_path) == {
+        "text": "Bom dia. Como vai?",
+        "segments": [{"start": 0.0, "end": 1.5, "text": "Bom dia."}, {"start": 1.5, "end": 3.0, "text": " Como vai?"}],
+        "duration": 3.0
+    }